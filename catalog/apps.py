@@ -4,3 +4,34 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalog"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_save
+        from utils.cache import register_cache_invalidation
+        from . import signals
+
+        register_cache_invalidation(
+            self.get_model("Category"),
+            self.get_model("Product"),
+            self.get_model("Variant"),
+            self.get_model("CartItem"),
+            self.get_model("Discount"),
+            self.get_model("ProductDiscount"),
+        )
+
+        variant = self.get_model("Variant")
+        uid = "catalog:variant-aggregates"
+        pre_save.connect(signals.remember_variant_product, sender=variant, dispatch_uid=uid)
+        post_save.connect(signals.refresh_variant_aggregates, sender=variant, dispatch_uid=uid)
+        post_delete.connect(signals.refresh_variant_aggregates, sender=variant, dispatch_uid=uid)
+
+        for model in (self.get_model("Product"), variant):
+            uid = f"catalog:image-derivatives:{model._meta.label}"
+            pre_save.connect(signals.remember_image, sender=model, dispatch_uid=uid)
+            post_save.connect(signals.queue_image_derivatives, sender=model, dispatch_uid=uid)
+
+        post_save.connect(
+            signals.evict_discounted_products,
+            sender=self.get_model("Discount"),
+            dispatch_uid="catalog:discount-products",
+        )
@@ -0,0 +1,166 @@
+"""
+Cart writes and totals.
+
+Batched writes validate every variant in one query and apply the change as
+one upsert on the unique (cart, variant) line.
+
+Line subtotals and cart totals are computed by the database alongside the
+lines themselves, so a cart is summed in one query however many items it
+holds. Summaries are cached per cart under ``cart_summary:detail:<cart id>``
+and evicted by CartItem's ``cache_detail_fields`` whenever the cart's items
+change, or rebuilt when the discounts change (see catalog.discounts); price
+and stock changes show up within ``CART_SUMMARY_TIMEOUT``.
+"""
+from collections import Counter
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Window
+from utils.cache import detail_key, get_generation
+from .discounts import PREFIX as DISCOUNTS_PREFIX, current_index
+from .models import Cart, CartItem, Variant
+
+SUMMARY_PREFIX = "cart_summary"
+LINE_AMOUNT = DecimalField(max_digits=10, decimal_places=2)
+
+
+class CartError(Exception):
+    pass
+
+
+def user_cart(user):
+    cart = Cart.objects.filter(user=user).order_by("pk").first()
+    return cart or Cart.objects.create(user=user)
+
+
+def _prices(quantities):
+    for variant, quantity in quantities.items():
+        if quantity <= 0:
+            raise CartError(f"Quantity for variant {variant} must be positive.")
+    prices = dict(Variant.objects.filter(pk__in=list(quantities)).values_list("pk", "price"))
+    missing = sorted(set(quantities) - set(prices))
+    if missing:
+        raise CartError("Unknown variants " + ", ".join(map(str, missing)))
+    return prices
+
+
+def _upsert(cart, quantities, prices):
+    return CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, variant_id=variant, quantity=quantity, price=prices[variant])
+            for variant, quantity in quantities.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["cart", "variant"],
+        update_fields=["quantity", "price"],
+    )
+
+
+def add_items(cart, quantities):
+    """
+    Add ``{variant id: quantity}`` to the cart, on top of what it already
+    holds. Raises CartError, changing nothing, for unknown variants or
+    quantities below one.
+    """
+    if not quantities:
+        return []
+    prices = _prices(quantities)
+    with transaction.atomic():
+        # Locking the cart keeps concurrent adds from losing each other's
+        # quantities, including on lines that do not exist yet.
+        Cart.objects.select_for_update().filter(pk=cart.pk).values_list("pk").first()
+        current = dict(
+            CartItem.objects.filter(cart=cart, variant_id__in=list(quantities))
+            .values_list("variant_id", "quantity")
+        )
+        return _upsert(
+            cart,
+            {variant: current.get(variant, 0) + quantity for variant, quantity in quantities.items()},
+            prices,
+        )
+
+
+def set_quantities(cart, quantities):
+    """
+    Set the quantity of each ``{variant id: quantity}`` line, adding missing
+    lines; a quantity of 0 removes the line.
+    """
+    removed = [variant for variant, quantity in quantities.items() if quantity == 0]
+    kept = {variant: quantity for variant, quantity in quantities.items() if quantity != 0}
+    prices = _prices(kept) if kept else {}
+    with transaction.atomic():
+        if removed:
+            remove_items(cart, removed)
+        return _upsert(cart, kept, prices) if kept else []
+
+
+def remove_items(cart, variant_ids):
+    return CartItem.objects.filter(cart=cart, variant_id__in=list(variant_ids)).delete()[0]
+
+
+def cart_lines(cart):
+    """
+    The cart's items with their variant, ``line_price``, ``line_subtotal``
+    and the cart-wide ``order_total`` and ``item_count``, all computed by
+    the database in one query.
+    """
+    subtotal = ExpressionWrapper(F("variant__price") * F("quantity"), output_field=LINE_AMOUNT)
+    return (
+        CartItem.objects.filter(cart=cart, quantity__gt=0)
+        .select_related("variant")
+        .annotate(
+            line_price=F("variant__price"),
+            line_subtotal=subtotal,
+            order_total=Window(Sum(subtotal)),
+            item_count=Window(Sum("quantity")),
+        )
+        .order_by("pk")
+    )
+
+
+def build_summary(cart):
+    lines = list(cart_lines(cart))
+    subtotal = lines[0].order_total if lines else Decimal("0")
+
+    requested = Counter()
+    stock = {}
+    for line in lines:
+        requested[line.variant_id] += line.quantity
+        stock[line.variant_id] = line.variant.stock
+
+    index = current_index()
+    discounts = index.evaluate_cart(
+        (line.variant.product_id, line.line_subtotal) for line in lines
+    )
+    discount_total = discounts[0]["amount"] if discounts else Decimal("0")
+
+    return {
+        "cart": cart.pk,
+        "line_count": len(lines),
+        "item_count": lines[0].item_count if lines else 0,
+        "subtotal": subtotal,
+        # Best first; only the first one is applied.
+        "discounts": discounts,
+        "discount_total": discount_total,
+        "total": subtotal - discount_total,
+        "discount_generation": index.generation,
+        "stock_warnings": [
+            {"variant": variant, "requested": quantity, "available": stock[variant]}
+            for variant, quantity in requested.items()
+            if quantity > stock[variant]
+        ],
+    }
+
+
+def cart_summary(cart):
+    """
+    Item count, subtotal, applicable discounts, total and stock warnings
+    for ``cart``, from the cache when possible.
+    """
+    key = detail_key(SUMMARY_PREFIX, cart.pk)
+    summary = cache.get(key)
+    if summary is None or summary["discount_generation"] != get_generation(DISCOUNTS_PREFIX):
+        summary = build_summary(cart)
+        cache.set(key, summary, settings.CART_SUMMARY_TIMEOUT)
+    return summary
@@ -0,0 +1,206 @@
+"""
+The discount engine.
+
+Active discounts are compiled into an in-memory index of rules keyed by
+product id. Each process keeps one index and reloads it, in one query,
+when the ``discounts`` cache generation moves: any write to Discount or
+ProductDiscount bumps it, and so does refresh_windows() when a discount
+starts or ends. Evaluating a product is a dict lookup, and a cart is
+evaluated in one pass over its lines.
+
+Discounts do not stack: a cart gets the one discount worth the most.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from utils.cache import detail_key, evict_details, get_generation, invalidate_prefixes
+from .models import Discount, ProductDiscount
+
+PREFIX = "discounts"
+WINDOWS_CHECKED_KEY = "discounts:windows-checked"
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: int
+    code: str
+    description: str
+    discount_type: str
+    value: Decimal
+    minimum_purchase: Decimal
+    maximum_discount: Decimal
+    start_date: datetime | None
+    end_date: datetime | None
+
+    def is_live(self, now):
+        return (self.start_date is None or self.start_date <= now) and (
+            self.end_date is None or now < self.end_date
+        )
+
+    def amount(self, base):
+        """
+        What the rule takes off ``base``, capped at ``maximum_discount``
+        (when set) and at ``base`` itself.
+        """
+        if self.discount_type == Discount.DiscountType.PERCENTAGE:
+            amount = base * self.value / 100
+        else:
+            amount = self.value
+        if self.maximum_discount:
+            amount = min(amount, self.maximum_discount)
+        return min(amount, base).quantize(CENT, ROUND_HALF_UP)
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "code": self.code,
+            "description": self.description,
+            "discount_type": self.discount_type,
+            "value": self.value,
+            "minimum_purchase": self.minimum_purchase,
+            "maximum_discount": self.maximum_discount,
+            "end_date": self.end_date,
+        }
+
+
+class DiscountIndex:
+    def __init__(self, generation, rules):
+        self.generation = generation
+        # {product id: (Rule, ...)}
+        self.rules = rules
+
+    @classmethod
+    def load(cls, generation):
+        now = timezone.now()
+        links = (
+            ProductDiscount.objects.filter(discount__is_active=True)
+            .filter(Q(discount__end_date__isnull=True) | Q(discount__end_date__gt=now))
+            .select_related("discount")
+            .order_by("product_id", "discount_id")
+        )
+        compiled = {}
+        rules = {}
+        for link in links:
+            discount = link.discount
+            if discount.pk not in compiled:
+                compiled[discount.pk] = Rule(
+                    id=discount.pk,
+                    code=discount.code,
+                    description=discount.description,
+                    discount_type=discount.discount_type,
+                    value=discount.value,
+                    minimum_purchase=discount.minimum_purchase,
+                    maximum_discount=discount.maximum_discount,
+                    start_date=discount.start_date,
+                    end_date=discount.end_date,
+                )
+            rules.setdefault(link.product_id, []).append(compiled[discount.pk])
+        return cls(generation, {product: tuple(found) for product, found in rules.items()})
+
+    def for_product(self, product_id, now=None):
+        now = now or timezone.now()
+        return [rule for rule in self.rules.get(product_id, ()) if rule.is_live(now)]
+
+    def evaluate_cart(self, lines, now=None):
+        """
+        Evaluate ``(product id, line subtotal)`` pairs.
+
+        A discount applies to the lines of its products once their subtotal
+        reaches its ``minimum_purchase``. Returns the applicable discounts,
+        best first, each with the ``products`` it covers and its ``amount``.
+        """
+        now = now or timezone.now()
+        bases = {}
+        products = {}
+        for product_id, subtotal in lines:
+            for rule in self.rules.get(product_id, ()):
+                if rule.is_live(now):
+                    bases[rule] = bases.get(rule, 0) + subtotal
+                    products.setdefault(rule, set()).add(product_id)
+
+        applicable = [
+            {
+                "id": rule.id,
+                "code": rule.code,
+                "description": rule.description,
+                "products": sorted(products[rule]),
+                "amount": rule.amount(base),
+            }
+            for rule, base in bases.items()
+            if base >= rule.minimum_purchase
+        ]
+        applicable.sort(key=lambda discount: (-discount["amount"], discount["id"]))
+        return applicable
+
+
+_index = None
+
+
+def current_index():
+    """
+    This process's index, reloaded when the discounts generation moved.
+    """
+    global _index
+    generation = get_generation(PREFIX)
+    index = _index
+    if index is None or index.generation != generation:
+        index = _index = DiscountIndex.load(generation)
+    return index
+
+
+def product_discounts(product_id, index=None):
+    """
+    The discounts running on a product. Pass the ``index`` when listing
+    many products, since current_index() checks the generation in the cache.
+    """
+    index = index or current_index()
+    return [rule.as_dict() for rule in index.for_product(product_id)]
+
+
+def request_index(request):
+    """
+    current_index(), resolved once per request.
+    """
+    index = getattr(request, "_discount_index", None)
+    if index is None:
+        index = request._discount_index = current_index()
+    return index
+
+
+def evict_discount_products(discount_ids):
+    """
+    Drop the cached detail responses of the products the discounts cover.
+    """
+    product_ids = (
+        ProductDiscount.objects.filter(discount_id__in=list(discount_ids))
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+    evict_details(detail_key("products", product) for product in product_ids)
+
+
+def refresh_windows(now=None):
+    """
+    Invalidate discounts, product and category responses and cart
+    summaries when a discount started or ended since the last check. Returns the ids of
+    those discounts.
+    """
+    now = now or timezone.now()
+    since = cache.get(WINDOWS_CHECKED_KEY)
+    cache.set(WINDOWS_CHECKED_KEY, now, None)
+    if since is None:
+        return []
+
+    crossed = list(
+        Discount.objects.filter(
+            Q(start_date__gt=since, start_date__lte=now) | Q(end_date__gt=since, end_date__lte=now)
+        ).values_list("pk", flat=True)
+    )
+    if crossed:
+        invalidate_prefixes(Discount.cache_prefixes)
+        evict_discount_products(crossed)
+    return crossed
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from io import BytesIO
+import hashlib
+
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def _widths(original):
+    widths = [width for width in settings.IMAGE_DERIVATIVE_WIDTHS if width < original]
+    # Never upscale; an image narrower than every width still gets one copy.
+    return widths or [original]
+
+
+def _encode(image, fmt):
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif fmt == "webp" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    buffer = BytesIO()
+    image.save(buffer, **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def build_derivatives(field_file, storage=None):
+    """
+    Resize ``field_file`` to each of ``IMAGE_DERIVATIVE_WIDTHS`` in every
+    format of ``IMAGE_DERIVATIVE_FORMATS`` and store the results.
+
+    Files are named after a hash of their content, so they can be cached
+    forever and identical uploads share them. Returns
+    ``{format: [{"width": ..., "name": ...}, ...]}``, narrowest first.
+    """
+    storage = storage or default_storage
+    with field_file.open("rb") as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+
+    derivatives = {fmt: [] for fmt in settings.IMAGE_DERIVATIVE_FORMATS}
+    for width in _widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in derivatives:
+            content = _encode(resized, fmt)
+            digest = hashlib.sha256(content).hexdigest()[:20]
+            name = f"derivatives/{digest}-{width}w.{'jpg' if fmt == 'jpeg' else fmt}"
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            derivatives[fmt].append({"width": width, "name": name})
+    return derivatives
+
+
+def srcset(derivatives, fmt, storage=None):
+    """
+    The ``srcset`` attribute for one format, or None before the
+    derivatives exist.
+    """
+    storage = storage or default_storage
+    entries = (derivatives or {}).get(fmt)
+    if not entries:
+        return None
+    return ", ".join(f"{storage.url(entry['name'])} {entry['width']}w" for entry in entries)
@@ -0,0 +1,267 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from django.db import DatabaseError, transaction
+from itertools import islice
+from .inventory import levels, record_movements
+from .models import Category, InventoryMovement, Product, Variant
+from .reservations import InsufficientStock
+import csv
+import json
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f"}
+
+PRODUCT_FIELDS = ["category", "name", "description", "price", "brand", "is_active"]
+VARIANT_FIELDS = ["product", "variant_name", "price"]
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(line number, dict)`` from a CSV (with header) or JSONL stream,
+    one line at a time.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, RowError(f"invalid JSON: {exc}")
+            continue
+        yield number, row if isinstance(row, dict) else RowError("expected a JSON object")
+
+
+def _text(row, name, required=False, max_length=None):
+    value = row.get(name)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"{name} is required")
+    if max_length and len(value) > max_length:
+        raise RowError(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def _decimal(row, name, required=False):
+    value = _text(row, name, required)
+    if not value:
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"{name} is not a number: {value!r}")
+    if number < 0 or number >= Decimal("1e8"):
+        raise RowError(f"{name} is out of range: {value}")
+    return number.quantize(Decimal("0.01"))
+
+
+def _int(row, name):
+    value = _text(row, name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{name} is not an integer: {value!r}")
+    if number < 0:
+        raise RowError(f"{name} cannot be negative")
+    return number
+
+
+def _bool(row, name, default=True):
+    value = _text(row, name).lower()
+    if not value:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"{name} is not a boolean: {value!r}")
+
+
+def parse_row(row):
+    """
+    Validate one feed row. Every row describes a product; rows with a
+    ``variant_sku`` also describe one of its variants.
+    """
+    parsed = {
+        "sku": _text(row, "sku", required=True, max_length=80),
+        "category": _text(row, "category", required=True, max_length=45),
+        "name": _text(row, "name", required=True, max_length=45),
+        "description": _text(row, "description") or None,
+        "price": _decimal(row, "price", required=True),
+        "brand": _text(row, "brand", required=True, max_length=45),
+        "is_active": _bool(row, "is_active"),
+        "variant_sku": _text(row, "variant_sku", max_length=80),
+    }
+    if parsed["variant_sku"]:
+        variant_price = _decimal(row, "variant_price")
+        parsed.update(
+            variant_name=_text(row, "variant_name", required=True, max_length=45),
+            # 0 is a valid price; only a missing one falls back to the product's.
+            variant_price=parsed["price"] if variant_price is None else variant_price,
+            stock=_int(row, "stock") or 0,
+        )
+    return parsed
+
+
+class CatalogImporter:
+    """
+    Upserts products, variants and inventory by SKU from a stream of rows.
+    Stock changes go through the inventory ledger as adjustments.
+
+    Rows are handled in chunks of ``batch_size``: one transaction per chunk,
+    one lookup query per model and bulk inserts/updates. Memory use only
+    depends on the chunk size and the number of categories. Invalid rows
+    are reported through ``on_error(line, message)`` and skipped; if a
+    chunk fails in the database its rows are retried one by one so only
+    the offending rows are lost. ``dry_run`` rolls everything back.
+    """
+
+    def __init__(self, batch_size=1000, create_categories=False, dry_run=False, on_error=None):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.on_error = on_error or (lambda line, message: None)
+        self.stats = Counter()
+        self._categories = {}
+
+    def run(self, rows):
+        if not self.dry_run:
+            return self._run(rows)
+
+        with transaction.atomic():
+            self._run(rows)
+            transaction.set_rollback(True)
+        return self.stats
+
+    def _run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                return self.stats
+            self.import_chunk(chunk)
+
+    def error(self, line, message):
+        self.stats["errors"] += 1
+        self.on_error(line, message)
+
+    def category(self, name):
+        if name not in self._categories:
+            category = Category.objects.filter(name=name).order_by("pk").first()
+            if category is None:
+                if not self.create_categories:
+                    raise RowError(f"unknown category {name!r}")
+                category = Category.objects.create(name=name)
+                self.stats["categories created"] += 1
+            self._categories[name] = category
+        return self._categories[name]
+
+    def import_chunk(self, chunk):
+        parsed = []
+        for line, row in chunk:
+            self.stats["rows"] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                values = parse_row(row)
+                values["category"] = self.category(values["category"])
+            except RowError as exc:
+                self.error(line, str(exc))
+                continue
+            parsed.append((line, values))
+
+        if not parsed:
+            return
+        try:
+            self.write(parsed)
+        except (DatabaseError, InsufficientStock) as exc:
+            if len(parsed) == 1:
+                self.error(parsed[0][0], self.describe(exc))
+                return
+            for item in parsed:
+                try:
+                    self.write([item])
+                except (DatabaseError, InsufficientStock) as exc:
+                    self.error(item[0], self.describe(exc))
+
+    def describe(self, exc):
+        if isinstance(exc, InsufficientStock):
+            return "stock cannot drop below what checkouts currently hold"
+        return f"database error: {exc}"
+
+    def write(self, parsed):
+        stats = Counter()
+        with transaction.atomic():
+            products = self.upsert_products([values for _, values in parsed], stats)
+            self.upsert_variants([values for _, values in parsed], products, stats)
+        self.stats.update(stats)
+
+    def upsert_products(self, rows, stats):
+        wanted = {}
+        for values in rows:
+            wanted[values["sku"]] = values
+
+        existing = {}
+        for product in Product.objects.filter(sku__in=list(wanted)).order_by("-pk"):
+            existing[product.sku] = product
+
+        created, updated = [], []
+        for sku, values in wanted.items():
+            product = existing.get(sku) or Product(sku=sku)
+            for field in PRODUCT_FIELDS:
+                setattr(product, field, values[field])
+            (updated if product.pk else created).append(product)
+
+        Product.objects.bulk_create(created)
+        Product.objects.bulk_update(updated, PRODUCT_FIELDS)
+        stats["products created"] += len(created)
+        stats["products updated"] += len(updated)
+        return {product.sku: product for product in created + updated}
+
+    def upsert_variants(self, rows, products, stats):
+        wanted = {}
+        for values in rows:
+            if values["variant_sku"]:
+                wanted[values["variant_sku"]] = values
+        if not wanted:
+            return
+
+        existing = {}
+        for variant in Variant.objects.filter(sku__in=list(wanted)).order_by("-pk"):
+            existing[variant.sku] = variant
+
+        created, updated = [], []
+        for sku, values in wanted.items():
+            variant = existing.get(sku) or Variant(sku=sku)
+            variant.product = products[values["sku"]]
+            variant.variant_name = values["variant_name"]
+            variant.price = values["variant_price"]
+            (updated if variant.pk else created).append(variant)
+
+        Variant.objects.bulk_create(created)
+        Variant.objects.bulk_update(updated, VARIANT_FIELDS)
+        stats["variants created"] += len(created)
+        stats["variants updated"] += len(updated)
+        self.upsert_inventory(
+            {variant.pk: wanted[variant.sku]["stock"] for variant in created + updated}, stats
+        )
+
+    def upsert_inventory(self, targets, stats):
+        # The feed's stock is what is on hand; the ledger records the difference.
+        current = levels(targets)
+        changes = {pk: stock - current[pk] for pk, stock in targets.items()}
+        movements = record_movements(
+            changes, InventoryMovement.Kind.ADJUSTMENT, reference="import"
+        )
+        stats["stock adjustments"] += len(movements)
@@ -0,0 +1,126 @@
+"""
+The inventory ledger.
+
+Every stock change is an InventoryMovement. Inventory holds one snapshot
+per variant and the compactor folds movements into it on a schedule, so
+the level on hand is always the snapshot plus a short tail of movements,
+read in one statement. Variant.stock follows the ledger as the units
+available to sell: on hand minus what checkouts hold (catalog.reservations).
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Inventory, InventoryMovement, Variant
+from .reservations import InsufficientStock, return_stock, take_stock
+
+Kind = InventoryMovement.Kind
+
+
+def tail_quantity():
+    """
+    Subquery summing the movements of ``OuterRef("variant")`` that are not
+    in its snapshot yet.
+    """
+    return Coalesce(
+        Subquery(
+            InventoryMovement.objects.filter(variant=OuterRef("variant"), compacted=False)
+            .order_by()
+            .values("variant")
+            .annotate(total=Sum("quantity"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def with_levels(queryset):
+    """
+    Annotate Inventory rows with ``on_hand`` (snapshot plus tail) and
+    ``available`` (Variant.stock).
+    """
+    return queryset.annotate(
+        on_hand=F("quantity") + tail_quantity(),
+        available=F("variant__stock"),
+    )
+
+
+def levels(variant_ids):
+    """
+    ``{variant id: units on hand}``; variants without a ledger count as 0.
+    """
+    rows = with_levels(Inventory.objects.filter(variant_id__in=list(variant_ids)))
+    found = dict(rows.values_list("variant_id", "on_hand"))
+    return {variant: found.get(variant, 0) for variant in variant_ids}
+
+
+def record_movements(quantities, kind, reference="", adjust_stock=True):
+    """
+    Append one movement per ``{variant id: signed quantity}`` entry.
+
+    With ``adjust_stock`` Variant.stock moves by the same amounts, and
+    nothing is recorded (InsufficientStock) if a decrease would take more
+    than is available. Sales of reserved stock pass ``adjust_stock=False``
+    since the reservation already took it.
+    """
+    quantities = {variant: quantity for variant, quantity in quantities.items() if quantity}
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        if adjust_stock:
+            taken = {variant: -quantity for variant, quantity in quantities.items() if quantity < 0}
+            if taken and not take_stock(taken):
+                available = dict(
+                    Variant.objects.filter(pk__in=list(taken)).values_list("pk", "stock")
+                )
+                raise InsufficientStock({
+                    variant: available.get(variant, 0)
+                    for variant, quantity in taken.items()
+                    if available.get(variant, 0) < quantity
+                })
+            return_stock({variant: quantity for variant, quantity in quantities.items() if quantity > 0})
+
+        Inventory.objects.bulk_create(
+            [Inventory(variant_id=variant) for variant in quantities], ignore_conflicts=True
+        )
+        return InventoryMovement.objects.bulk_create([
+            InventoryMovement(variant_id=variant, kind=kind, quantity=quantity, reference=reference)
+            for variant, quantity in quantities.items()
+        ])
+
+
+def compact(batch_size=5000):
+    """
+    Fold up to ``batch_size`` movements into their snapshots. Movements
+    locked by a concurrent compaction or not committed yet are left for the
+    next run. Returns the number of movements compacted.
+    """
+    with transaction.atomic():
+        movements = list(
+            InventoryMovement.objects.filter(compacted=False)
+            .select_for_update(skip_locked=True)
+            .order_by("pk")
+            .values_list("pk", "variant_id", "quantity")[:batch_size]
+        )
+        if not movements:
+            return 0
+
+        totals = Counter()
+        for _, variant, quantity in movements:
+            totals[variant] += quantity
+        totals = {variant: total for variant, total in totals.items() if total}
+        if totals:
+            Inventory.objects.filter(variant_id__in=list(totals)).update(
+                quantity=F("quantity") + Case(
+                    *[When(variant_id=variant, then=Value(total)) for variant, total in totals.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+        InventoryMovement.objects.filter(pk__in=[pk for pk, _, _ in movements]).update(
+            compacted=True
+        )
+    return len(movements)
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from catalog.importer import CatalogImporter, read_rows
+import os
+import sys
+
+FORMATS = ("csv", "jsonl")
+
+
+class Command(BaseCommand):
+    help = "Upsert products, variants and inventory by SKU from a CSV or JSONL feed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Feed file, or - to read from stdin.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Feed format. Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows per transaction."
+        )
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Create categories that do not exist instead of rejecting the row.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate and write everything, then roll it back.",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=100,
+            help="Stop printing row errors after this many (they are still counted).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lstrip(".").lower()
+            fmt = "jsonl" if extension in ("jsonl", "ndjson") else extension
+        if fmt not in FORMATS:
+            raise CommandError("Cannot tell the feed format, pass --format.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        printed = 0
+
+        def on_error(line, message):
+            nonlocal printed
+            if printed < options["max_errors"]:
+                self.stderr.write(f"line {line}: {message}")
+            printed += 1
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"],
+            create_categories=options["create_categories"],
+            dry_run=options["dry_run"],
+            on_error=on_error,
+        )
+
+        if path == "-":
+            stats = importer.run(read_rows(sys.stdin, fmt))
+        else:
+            try:
+                stream = open(path, newline="", encoding="utf-8-sig")
+            except OSError as exc:
+                raise CommandError(f"Cannot open {path}: {exc}")
+            with stream:
+                stats = importer.run(read_rows(stream, fmt))
+
+        summary = ", ".join(f"{name}: {count}" for name, count in sorted(stats.items()))
+        if options["dry_run"]:
+            summary += " (dry run, nothing saved)"
+        style = self.style.WARNING if stats["errors"] else self.style.SUCCESS
+        self.stdout.write(style(summary or "Nothing to import."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compare the stored variant price range and stock on products with their variants."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair", action="store_true", help="Rewrite the aggregates of drifted products."
+        )
+        parser.add_argument(
+            "--show", type=int, default=20, help="Drifted products to list."
+        )
+
+    def handle(self, *args, **options):
+        drifted = Product.objects.with_aggregate_drift().order_by("pk")
+        product_ids = []
+        for product in drifted.iterator(chunk_size=2000):
+            if len(product_ids) < options["show"]:
+                self.stdout.write(
+                    f"product {product.pk}: "
+                    f"min {product.min_variant_price} != {product.computed_min_price}, "
+                    f"max {product.max_variant_price} != {product.computed_max_price}, "
+                    f"stock {product.total_variant_stock} != {product.computed_stock}"
+                )
+            product_ids.append(product.pk)
+
+        if not product_ids:
+            self.stdout.write(self.style.SUCCESS("Variant aggregates are up to date."))
+            return
+
+        if not options["repair"]:
+            self.stdout.write(
+                self.style.WARNING(f"{len(product_ids)} products drifted; rerun with --repair.")
+            )
+            return
+
+        repaired = 0
+        for start in range(0, len(product_ids), 1000):
+            repaired += Product.objects.filter(
+                pk__in=product_ids[start:start + 1000]
+            ).refresh_variant_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} products."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from catalog.tasks import warm_catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Rebuild the most requested catalog cache entries ahead of traffic."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages", type=int, default=3, help="Pages to warm per list params set."
+        )
+        parser.add_argument(
+            "--top", type=int, default=50, help="Most requested lists/lookups to warm."
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="run_async",
+            help="Queue the warm-up on Celery instead of running it here.",
+        )
+
+    def handle(self, *args, **options):
+        if options["run_async"]:
+            warm_catalog_cache.delay(pages=options["pages"], top=options["top"])
+            self.stdout.write(self.style.SUCCESS("Cache warm-up queued."))
+            return
+
+        requests = warm_catalog_cache(pages=options["pages"], top=options["top"])
+        self.stdout.write(self.style.SUCCESS(f"Cache warmed with {requests} requests."))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    categories = list(Category.objects.only("id", "parent_id"))
+    by_parent = {}
+    for category in categories:
+        by_parent.setdefault(category.parent_id_id, []).append(category)
+
+    # Walk down from the roots so every parent has its path first.
+    pending = [(category, "", 0) for category in by_parent.get(None, [])]
+    while pending:
+        category, prefix, depth = pending.pop()
+        category.path = f"{prefix}{category.pk}/"
+        category.depth = depth
+        pending.extend(
+            (child, category.path, depth + 1) for child in by_parent.get(category.pk, [])
+        )
+
+    Category.objects.bulk_update(categories, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_alter_discount_is_active_alter_variant_stock"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["path"],
+                name="catalog_category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:48
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=["search_vector"], name="catalog_product_search_idx"
+)
+
+CREATE_TRIGGERS = """
+CREATE FUNCTION catalog_product_search_vector(
+    product_id bigint, name text, brand text, description text
+) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(brand, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(variant_name, ' ') FROM catalog_variant
+             WHERE catalog_variant.product_id = $1), ''
+        )), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION catalog_product_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := catalog_product_search_vector(
+        NEW.id, NEW.name, NEW.brand, NEW.description
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER catalog_product_search_update
+    BEFORE INSERT OR UPDATE OF name, brand, description ON catalog_product
+    FOR EACH ROW EXECUTE FUNCTION catalog_product_search_trigger();
+
+CREATE FUNCTION catalog_variant_search_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE catalog_product SET search_vector = catalog_product_search_vector(
+            id, name, brand, description
+        ) WHERE id = OLD.product_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE catalog_product SET search_vector = catalog_product_search_vector(
+            id, name, brand, description
+        ) WHERE id = NEW.product_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER catalog_variant_search_update
+    AFTER INSERT OR DELETE OR UPDATE OF variant_name, product_id ON catalog_variant
+    FOR EACH ROW EXECUTE FUNCTION catalog_variant_search_trigger();
+
+UPDATE catalog_product SET search_vector = catalog_product_search_vector(
+    id, name, brand, description
+);
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS catalog_variant_search_update ON catalog_variant;
+DROP FUNCTION IF EXISTS catalog_variant_search_trigger();
+DROP TRIGGER IF EXISTS catalog_product_search_update ON catalog_product;
+DROP FUNCTION IF EXISTS catalog_product_search_trigger();
+DROP FUNCTION IF EXISTS catalog_product_search_vector(bigint, text, text, text);
+"""
+
+
+def create_search_index(apps, schema_editor):
+    # tsvector triggers and GIN indexes only exist on PostgreSQL; other
+    # databases keep an empty column and search falls back to icontains.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_TRIGGERS)
+    schema_editor.add_index(apps.get_model("catalog", "Product"), SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.remove_index(apps.get_model("catalog", "Product"), SEARCH_INDEX)
+    schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_category_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="product", index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index),
+            ],
+        ),
+    ]
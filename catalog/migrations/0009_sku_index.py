@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(db_index=True, max_length=80),
+        ),
+        migrations.AlterField(
+            model_name="variant",
+            name="sku",
+            field=models.CharField(db_index=True, max_length=80),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Variant = apps.get_model("catalog", "Variant")
+    in_stock = (
+        Variant.objects.filter(product=OuterRef("pk"), stock__gt=0)
+        .order_by()
+        .values("product")
+    )
+    Product.objects.update(
+        min_variant_price=Subquery(in_stock.annotate(value=Min("price")).values("value")),
+        max_variant_price=Subquery(in_stock.annotate(value=Max("price")).values("value")),
+        total_variant_stock=Coalesce(
+            Subquery(in_stock.annotate(value=Sum("stock")).values("value")), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_sku_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="max_variant_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_variant_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="total_variant_stock",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["min_variant_price"], name="catalog_product_min_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["total_variant_stock"], name="catalog_product_stock_idx"
+            ),
+        ),
+    ]
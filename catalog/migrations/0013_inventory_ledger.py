@@ -0,0 +1,105 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def rebuild_snapshots(apps, schema_editor):
+    # Inventory rows were never kept up to date; restart them as one
+    # snapshot per variant holding what is on hand: the available stock
+    # plus whatever checkouts currently hold.
+    Inventory = apps.get_model("catalog", "Inventory")
+    Variant = apps.get_model("catalog", "Variant")
+    StockReservation = apps.get_model("catalog", "StockReservation")
+
+    keep = Inventory.objects.values("variant").annotate(first=Min("pk")).values("first")
+    Inventory.objects.exclude(pk__in=keep).delete()
+
+    missing = Variant.objects.exclude(pk__in=Inventory.objects.values("variant"))
+    Inventory.objects.bulk_create(
+        [Inventory(variant_id=pk) for pk in missing.values_list("pk", flat=True).iterator()],
+        batch_size=1000,
+    )
+
+    held = (
+        StockReservation.objects.filter(variant=OuterRef("variant"), status="held")
+        .order_by()
+        .values("variant")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    stock = Variant.objects.filter(pk=OuterRef("variant")).values("stock")
+    Inventory.objects.update(
+        quantity=Subquery(stock) + Coalesce(Subquery(held), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_stock_reservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("receipt", "Receipt"),
+                            ("sale", "Sale"),
+                            ("return", "Return"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                ("reference", models.CharField(blank=True, max_length=80)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("compacted", models.BooleanField(default=False, editable=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="inventory",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(rebuild_snapshots, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="inventorymovement",
+            name="variant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="movements",
+                to="catalog.variant",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventorymovement",
+            index=models.Index(
+                fields=["variant", "-id"], name="catalog_movement_variant_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventorymovement",
+            index=models.Index(
+                condition=models.Q(("compacted", False)),
+                fields=["variant"],
+                name="catalog_movement_tail_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0013 so PostgreSQL does not alter a table with pending
+    # trigger events from the snapshot rebuild.
+
+    dependencies = [
+        ("catalog", "0013_inventory_ledger"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="inventory",
+            constraint=models.UniqueConstraint(
+                fields=("variant",), name="catalog_inventory_variant_uniq"
+            ),
+        ),
+    ]
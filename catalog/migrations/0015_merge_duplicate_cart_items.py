@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # Fold repeated lines of a variant into the cart's first one.
+    CartItem = apps.get_model("catalog", "CartItem")
+    duplicated = (
+        CartItem.objects.values("cart", "variant")
+        .annotate(lines=Count("pk"), first=Min("pk"), total=Sum("quantity"))
+        .filter(lines__gt=1)
+        .order_by()
+    )
+    for row in duplicated.iterator():
+        CartItem.objects.filter(pk=row["first"]).update(quantity=row["total"])
+        CartItem.objects.filter(cart=row["cart"], variant=row["variant"]).exclude(
+            pk=row["first"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_inventory_variant_unique"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+    ]
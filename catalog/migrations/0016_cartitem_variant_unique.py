@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0015 so PostgreSQL does not alter a table with pending
+    # trigger events from the merge.
+
+    dependencies = [
+        ("catalog", "0015_merge_duplicate_cart_items"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "variant"), name="catalog_cartitem_variant_uniq"
+            ),
+        ),
+    ]
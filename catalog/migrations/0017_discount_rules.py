@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+def clear_dates(apps, schema_editor):
+    # The dates were auto_now, so they only recorded the last save; leave
+    # existing discounts open-ended instead of expired.
+    apps.get_model("catalog", "Discount").objects.update(start_date=None, end_date=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0016_cartitem_variant_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="discount",
+            name="value",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name="discount",
+            name="discount_type",
+            field=models.CharField(
+                choices=[("percentage", "Percentage"), ("fixed", "Fixed amount")],
+                default="percentage",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="discount",
+            name="end_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="discount",
+            name="start_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def derive_stock_quantity(apps, schema_editor):
+    apps.get_model("catalog", "Product").objects.update(stock_quantity=F("total_variant_stock"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0017_discount_rules"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="stock_quantity",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(derive_stock_quantity, migrations.RunPython.noop),
+    ]
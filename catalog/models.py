@@ -1,11 +1,126 @@
+from collections import defaultdict
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import CharField, Count, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.conf import settings
+from utils.cache import (
+    CacheInvalidatingQuerySet,
+    detail_key,
+    evict_details,
+    invalidate_model,
+    invalidate_prefixes,
+)
+
+
+class CategoryQuerySet(CacheInvalidatingQuerySet):
+    """
+    Tree lookups over the materialized ``Category.path``.
+
+    Each one is a single query on the path index (prefix ``LIKE``) or on
+    primary keys, whatever the depth of the tree.
+    """
+
+    def descendants(self, category, include_self=False):
+        queryset = self.filter(path__startswith=category.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=category.pk)
+        return queryset
+
+    def ancestors(self, category, include_self=False):
+        ids = category.ancestor_ids
+        if include_self:
+            ids = ids + [category.pk]
+        return self.filter(pk__in=ids).order_by("depth")
+
+    def with_product_stats(self):
+        """
+        Annotate each category with figures about its own active products:
+        ``active_product_count``, ``min_price``, ``max_price`` and
+        ``in_stock_variant_count``.
+
+        Correlated subqueries keep one row per category, unlike joins,
+        and each is answered from the product/variant foreign key indexes.
+        Stock writes invalidate the "categories" prefix through
+        ProductQuerySet.refresh_variant_aggregates().
+        """
+        products = (
+            Product.objects.filter(category=OuterRef("pk"), is_active=True)
+            .order_by()
+            .values("category")
+        )
+        variants = (
+            Variant.objects.filter(
+                product__category=OuterRef("pk"), product__is_active=True, stock__gt=0
+            )
+            .order_by()
+            .values("product__category")
+        )
+        price = models.DecimalField(max_digits=10, decimal_places=2)
+
+        return self.annotate(
+            active_product_count=Coalesce(
+                Subquery(products.annotate(count=Count("pk")).values("count")), 0
+            ),
+            min_price=Subquery(
+                products.annotate(value=Min("price")).values("value"), output_field=price
+            ),
+            max_price=Subquery(
+                products.annotate(value=Max("price")).values("value"), output_field=price
+            ),
+            in_stock_variant_count=Coalesce(
+                Subquery(variants.annotate(count=Count("pk")).values("count")), 0
+            ),
+        )
+
+    def attach_subtrees(self, categories, *prefetch):
+        """
+        Load every descendant of ``categories`` in one query and fill the
+        ``children`` prefetch cache of each node, so recursive serializers
+        and resolvers walk the tree without further queries.
+
+        ``prefetch`` lookups (e.g. "products") are applied to all nodes.
+        """
+        categories = list(categories)
+        prefixes = []
+        for path in sorted({category.path for category in categories if category.path}):
+            if not any(path.startswith(prefix) for prefix in prefixes):
+                prefixes.append(path)
+        if not prefixes:
+            return categories
+
+        condition = Q()
+        for prefix in prefixes:
+            condition |= Q(path__startswith=prefix)
+
+        nodes = {node.pk: node for node in self.filter(condition).order_by("pk")}
+        nodes.update((category.pk, category) for category in categories)
+
+        children = defaultdict(list)
+        for node in sorted(nodes.values(), key=lambda node: node.pk):
+            children[node.parent_id_id].append(node)
+
+        for node in nodes.values():
+            queryset = node.children.all()
+            queryset._result_cache = children[node.pk]
+            queryset._prefetch_done = True
+            node.__dict__.setdefault("_prefetched_objects_cache", {})["children"] = queryset
+
+        if prefetch:
+            models.prefetch_related_objects(list(nodes.values()), *prefetch)
+        return categories
 
 
 class Category(models.Model):
     """
     Represents a product category with an optional parent category.
     Supports hierarchical organization through self-referencing.
+
+    ``path`` holds the ids from the root down to the category itself
+    ("1/5/12/") and ``depth`` its distance from the root; both are kept
+    up to date by save(), including when a subtree is moved.
     """
 
     name = models.CharField(max_length=45)
@@ -14,10 +129,165 @@ class Category(models.Model):
         "self", on_delete=models.CASCADE, related_name="children", blank=True, null=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    path = models.CharField(max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
+    cache_prefixes = ("categories",)
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL use the index for
+            # "path LIKE 'prefix%'" whatever the database collation.
+            models.Index(
+                fields=["path"],
+                name="catalog_category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
 
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.split("/")[:-2]]
+
+    def _path_from_parent(self):
+        parent = self.parent_id
+        if parent is None:
+            return f"{self.pk}/", 0
+        if self.path and parent.path.startswith(self.path):
+            raise ValidationError("A category cannot be moved under itself.")
+        return f"{parent.path}{self.pk}/", parent.depth + 1
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "parent_id" not in update_fields:
+            return super().save(*args, **kwargs)
+
+        old_path, old_depth = self.path, self.depth
+        if self.pk is not None:
+            self.path, self.depth = self._path_from_parent()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "path", "depth"}
+        super().save(*args, **kwargs)
+
+        if not self.path:
+            # New row: the path needs the primary key it just got.
+            self.path, self.depth = self._path_from_parent()
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        elif old_path and old_path != self.path:
+            # Moved: rewrite the prefix of the whole subtree in one statement.
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(
+                    Value(self.path),
+                    Substr("path", len(old_path) + 1),
+                    output_field=CharField(),
+                ),
+                depth=F("depth") + (self.depth - old_depth),
+            )
+
+    def get_ancestors(self, include_self=False):
+        return Category.objects.ancestors(self, include_self)
+
+    def get_descendants(self, include_self=False):
+        return Category.objects.descendants(self, include_self)
+
+    def get_subtree_products(self):
+        return Product.objects.filter(category__path__startswith=self.path)
+
+
+VARIANT_AGGREGATE_FIELDS = (
+    "min_variant_price", "max_variant_price", "total_variant_stock", "stock_quantity",
+)
+
+
+class ProductQuerySet(CacheInvalidatingQuerySet):
+    def variant_aggregates(self):
+        """
+        Annotate ``computed_min_price``, ``computed_max_price`` and
+        ``computed_stock`` straight from the variant rows.
+        """
+        in_stock = Variant.objects.filter(product=OuterRef("pk"), stock__gt=0).order_by()
+        price = models.DecimalField(max_digits=10, decimal_places=2)
+        return self.annotate(
+            computed_min_price=Subquery(
+                in_stock.values("product").annotate(value=Min("price")).values("value"),
+                output_field=price,
+            ),
+            computed_max_price=Subquery(
+                in_stock.values("product").annotate(value=Max("price")).values("value"),
+                output_field=price,
+            ),
+            computed_stock=Coalesce(
+                Subquery(
+                    in_stock.values("product").annotate(value=Sum("stock")).values("value"),
+                    output_field=models.IntegerField(),
+                ),
+                0,
+            ),
+        )
+
+    def with_aggregate_drift(self):
+        """
+        Products whose stored variant aggregates disagree with their variants.
+        """
+        return self.variant_aggregates().exclude(
+            Q(min_variant_price=F("computed_min_price"), min_variant_price__isnull=False)
+            | Q(min_variant_price__isnull=True, computed_min_price__isnull=True),
+            Q(max_variant_price=F("computed_max_price"), max_variant_price__isnull=False)
+            | Q(max_variant_price__isnull=True, computed_max_price__isnull=True),
+            total_variant_stock=F("computed_stock"),
+        )
+
+    def refresh_variant_aggregates(self):
+        """
+        Recompute the stored variant aggregates of these products with one
+        UPDATE. Returns the number of products touched.
+
+        This runs on every stock write, so it skips the prefix bumps of
+        CacheInvalidatingQuerySet: the products' detail entries are always
+        evicted, but lists are only invalidated when one of the aggregates
+        they show, filter or sort on actually changed.
+        """
+        def listed(queryset):
+            return {
+                pk: (low, high, stock)
+                for pk, low, high, stock in queryset.values_list(
+                    "pk", "min_variant_price", "max_variant_price", "total_variant_stock"
+                )
+            }
+
+        products = self.order_by()
+        before = listed(products)
+        if not before:
+            return 0
+
+        in_stock = Variant.objects.filter(product=OuterRef("pk"), stock__gt=0).order_by()
+        stock = Coalesce(
+            Subquery(in_stock.values("product").annotate(value=Sum("stock")).values("value")),
+            0,
+        )
+        rows = models.QuerySet.update(
+            Product.objects.filter(pk__in=list(before)),
+            min_variant_price=Subquery(
+                in_stock.values("product").annotate(value=Min("price")).values("value")
+            ),
+            max_variant_price=Subquery(
+                in_stock.values("product").annotate(value=Max("price")).values("value")
+            ),
+            total_variant_stock=stock,
+            stock_quantity=stock,
+        )
+
+        evict_details(detail_key("products", pk) for pk in before)
+        # A variant selling out or coming back always moves its product's
+        # total, so this also covers the categories' in_stock_variant_count.
+        if listed(Product.objects.filter(pk__in=list(before))) != before:
+            invalidate_prefixes(Product.cache_prefixes)
+        return rows
+
 
 class Product(models.Model):
     """
@@ -31,16 +301,111 @@ class Product(models.Model):
     name = models.CharField(max_length=45)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    stock_quantity = models.PositiveIntegerField(default=0)
-    sku = models.CharField(max_length=80)
+    # Derived from the variants, like total_variant_stock; kept for clients
+    # that still read it.
+    stock_quantity = models.PositiveIntegerField(default=0, editable=False)
+    sku = models.CharField(max_length=80, db_index=True)
     date_added = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True, null=False)
     image_url = models.ImageField(upload_to="product/", blank=True, null=True)
+    # Resized copies of image_url, written by catalog.tasks.generate_image_derivatives.
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     brand = models.CharField(max_length=45)
+    # Maintained by database triggers on PostgreSQL (see migration 0008):
+    # name, brand, variant names and description, weighted in that order.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Price range and stock of the in-stock variants, kept current by
+    # VariantQuerySet and the signals in catalog.signals. NULL prices mean
+    # nothing is in stock.
+    min_variant_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False
+    )
+    max_variant_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False
+    )
+    total_variant_stock = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+    cache_prefixes = ("products", "categories")
+    cache_detail_fields = {"products": "id"}
+    search_config = "english"
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="catalog_product_search_idx"),
+            models.Index(fields=["min_variant_price"], name="catalog_product_min_price_idx"),
+            models.Index(fields=["total_variant_stock"], name="catalog_product_stock_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.price}"
 
+    def save(self, *args, **kwargs):
+        # The variant aggregates are only ever written by
+        # refresh_variant_aggregates; writing back the values loaded with
+        # this instance would undo stock changes made since. Deferred fields
+        # are left out as well, like Model.save() does on its own.
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in VARIANT_AGGREGATE_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class VariantQuerySet(CacheInvalidatingQuerySet):
+    """
+    ``update()`` and ``bulk_create()`` skip model signals, so they refresh
+    the variant aggregates of the products they touch themselves.
+    ``bulk_update()`` goes through ``update()``, and deletes send signals.
+    """
+
+    aggregate_fields = {"product", "product_id", "price", "stock"}
+
+    def _refresh_products(self, product_ids):
+        product_ids.discard(None)
+        if product_ids:
+            Product.objects.filter(pk__in=product_ids).refresh_variant_aggregates()
+
+    def update(self, **kwargs):
+        if not self.aggregate_fields.intersection(kwargs):
+            return super().update(**kwargs)
+
+        before = dict(self.order_by().values_list("pk", "product_id"))
+        rows = super().update(**kwargs)
+        if rows:
+            product_ids = set(before.values())
+            if "product" in kwargs or "product_id" in kwargs:
+                product_ids.update(
+                    self.model._base_manager.filter(pk__in=list(before))
+                    .values_list("product_id", flat=True)
+                )
+            self._refresh_products(product_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        self._refresh_products({variant.product_id for variant in created})
+        return created
+
+    def stock_changed(self):
+        """
+        Invalidate the caches and refresh the product aggregates of these
+        variants after their stock was written with a plain UPDATE, as
+        catalog.reservations does.
+        """
+        rows = list(self.values(*set(self.model.cache_detail_fields.values())))
+        invalidate_model(self.model, rows)
+        self._refresh_products({row["product_id"] for row in rows})
+
 
 class Variant(models.Model):
     """
@@ -52,44 +417,107 @@ class Variant(models.Model):
     variant_name = models.CharField(max_length=45)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.PositiveIntegerField(default=0)
-    sku = models.CharField(max_length=80)
+    sku = models.CharField(max_length=80, db_index=True)
     image_url = models.ImageField(upload_to="product/", blank=True, null=True)
+    # Resized copies of image_url, written by catalog.tasks.generate_image_derivatives.
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now_add=True)
 
+    objects = VariantQuerySet.as_manager()
+    cache_prefixes = ("variants",)
+    cache_detail_fields = {"variants": "sku", "products": "product_id"}
+
     def __str__(self):
         return f"{self.product.name} - {self.variant_name}"
 
 
 class Inventory(models.Model):
     """
-    Tracks current stock quantities for product variants.
-    Updates automatically whenever inventory changes occur.
+    Per-variant snapshot of the inventory ledger: the units on hand once
+    every compacted InventoryMovement is applied. The current level is this
+    plus the movements not compacted yet; see catalog.inventory.
     """
 
     variant = models.ForeignKey("Variant", on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["variant"], name="catalog_inventory_variant_uniq"),
+        ]
 
     def __str__(self):
         return f"Inventory for {self.variant.variant_name}: {self.quantity}"
 
 
+class InventoryMovement(models.Model):
+    """
+    One entry of the append-only inventory ledger. ``quantity`` is signed:
+    receipts and returns add stock, sales take it away, adjustments go
+    either way. ``compacted`` is set once the entry is folded into the
+    variant's Inventory snapshot.
+    """
+
+    class Kind(models.TextChoices):
+        RECEIPT = "receipt", "Receipt"
+        SALE = "sale", "Sale"
+        RETURN = "return", "Return"
+        ADJUSTMENT = "adjustment", "Adjustment"
+
+    variant = models.ForeignKey("Variant", on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    quantity = models.IntegerField()
+    reference = models.CharField(max_length=80, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    compacted = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["variant", "-id"], name="catalog_movement_variant_idx"),
+            # The tail that reads add to the snapshot, and the compactor's queue.
+            models.Index(
+                fields=["variant"],
+                name="catalog_movement_tail_idx",
+                condition=Q(compacted=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} of {self.variant_id}"
+
+
 class Discount(models.Model):
     """
     Represents a discount rule that applies within a date range.
     Supports percentage or fixed amount discounts with conditions.
+    Evaluated by catalog.discounts.
     """
 
+    class DiscountType(models.TextChoices):
+        PERCENTAGE = "percentage", "Percentage"
+        FIXED = "fixed", "Fixed amount"
+
     code = models.CharField(max_length=20)
     description = models.CharField(max_length=225)
-    discount_type = models.CharField(max_length=20)
+    discount_type = models.CharField(
+        max_length=20, choices=DiscountType.choices, default=DiscountType.PERCENTAGE
+    )
+    # Percent off for percentage discounts, amount off for fixed ones.
+    value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     minimum_purchase = models.DecimalField(max_digits=10, decimal_places=2)
+    # 0 means no cap.
     maximum_discount = models.DecimalField(max_digits=10, decimal_places=2)
-    start_date = models.DateTimeField(auto_now=True)
-    end_date = models.DateTimeField(auto_now=True)
+    # Open-ended when null.
+    start_date = models.DateTimeField(null=True, blank=True)
+    end_date = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    # Category responses embed products, and with them their discounts.
+    cache_prefixes = ("discounts", "products", "categories")
+
     def __str__(self):
         return f"Discount {self.code}"
 
@@ -103,6 +531,11 @@ class ProductDiscount(models.Model):
     discount = models.ForeignKey("Discount", on_delete=models.CASCADE)
     product = models.ForeignKey("Product", on_delete=models.CASCADE)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    # Category responses embed products, and with them their discounts.
+    cache_prefixes = ("discounts", "products", "categories")
+    cache_detail_fields = {"products": "product_id"}
+
     def __str__(self):
         return f"{self.discount.code} -> {self.product.name}"
 
@@ -162,5 +595,51 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    # Evicts the cart's summary (see catalog.carts).
+    cache_detail_fields = {"cart_summary": "cart_id"}
+
+    class Meta:
+        constraints = [
+            # One line per variant, so batched cart writes can upsert.
+            models.UniqueConstraint(fields=["cart", "variant"], name="catalog_cartitem_variant_uniq"),
+        ]
+
     def __str__(self):
         return f"{self.variant.variant_name} x {self.quantity}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a cart during checkout. Holding takes the quantity off
+    Variant.stock; releasing or expiring puts it back, confirming keeps it
+    sold. See catalog.reservations.
+    """
+
+    class Status(models.TextChoices):
+        HELD = "held", "Held"
+        CONFIRMED = "confirmed", "Confirmed"
+        RELEASED = "released", "Released"
+        EXPIRED = "expired", "Expired"
+
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="reservations")
+    variant = models.ForeignKey("Variant", on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cart", "status"], name="catalog_reservation_cart_idx"),
+            # The sweeper only ever looks at live holds.
+            models.Index(
+                fields=["expires_at"],
+                name="catalog_reservation_held_idx",
+                condition=Q(status="held"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.variant_id} for cart {self.cart_id} ({self.status})"
@@ -0,0 +1,231 @@
+"""
+Stock reservations for checkout.
+
+Stock is taken with conditional UPDATEs (``stock = stock - n WHERE
+stock >= n``) instead of row locks held across the request, so concurrent
+checkouts of a popular variant only ever wait for one short statement and
+can never oversell. Every variant in a cart is taken by a single UPDATE;
+if it matches fewer rows than there are variants, something ran out and the
+whole reservation rolls back. The product aggregates and caches are only
+refreshed once the transaction commits, so a checkout never locks the
+product row and checkouts of sibling variants do not queue behind it.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+from functools import reduce
+from utils.cache_stats import get_scores, increment_scores, top_scores
+from .models import CartItem, InventoryMovement, StockReservation, Variant
+import logging
+import operator
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationError(Exception):
+    pass
+
+
+class InsufficientStock(ReservationError):
+    def __init__(self, shortages):
+        # {variant id: units still available}
+        self.shortages = shortages
+        super().__init__("Not enough stock for variants " + ", ".join(map(str, shortages)))
+
+
+def contention_key(kind):
+    return f"reservations:contention:{kind}"
+
+
+def record_contention(kind, quantities):
+    try:
+        increment_scores(contention_key(kind), {str(variant): 1 for variant in quantities})
+    except Exception:
+        logger.warning("Could not record reservation %s", kind, exc_info=True)
+
+
+def contention_stats(limit=20):
+    """
+    The variants whose reservations fail most often, with their attempt and
+    expiry counts.
+    """
+    conflicts = top_scores(contention_key("conflicts"), limit)
+    members = [member for member, _ in conflicts]
+    attempts = get_scores(contention_key("attempts"), members)
+    expired = get_scores(contention_key("expired"), members)
+    return [
+        {
+            "variant": int(member),
+            "attempts": attempts[member],
+            "conflicts": count,
+            "expired": expired[member],
+        }
+        for member, count in conflicts
+    ]
+
+
+def cart_quantities(cart):
+    """
+    ``{variant id: quantity}`` for the cart, lines of the same variant summed.
+    """
+    rows = (
+        CartItem.objects.filter(cart=cart, quantity__gt=0)
+        .values("variant")
+        .annotate(total=Sum("quantity"))
+        .order_by("variant")
+    )
+    return {row["variant"]: row["total"] for row in rows}
+
+
+def _per_variant(quantities):
+    return Case(
+        *[When(pk=variant, then=Value(quantity)) for variant, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _write_stock(queryset, variant_ids, stock):
+    # A plain UPDATE: VariantQuerySet.update() would refresh the product
+    # aggregates, and lock the product rows, inside the transaction.
+    rows = models.QuerySet.update(queryset, stock=stock)
+    if rows:
+        transaction.on_commit(Variant.objects.filter(pk__in=list(variant_ids)).stock_changed)
+    return rows
+
+
+def take_stock(quantities):
+    """
+    Take every quantity off Variant.stock in one UPDATE. Returns whether all
+    of them were available; the caller must roll back if not.
+    """
+    enough = reduce(
+        operator.or_,
+        [Q(pk=variant, stock__gte=quantity) for variant, quantity in quantities.items()],
+    )
+    updated = _write_stock(
+        Variant.objects.filter(enough), quantities, F("stock") - _per_variant(quantities)
+    )
+    return updated == len(quantities)
+
+
+def return_stock(quantities):
+    if quantities:
+        _write_stock(
+            Variant.objects.filter(pk__in=list(quantities)),
+            quantities,
+            F("stock") + _per_variant(quantities),
+        )
+
+
+def reserve_cart(cart, ttl=None):
+    """
+    Hold stock for everything in ``cart`` for ``ttl`` seconds (default
+    ``STOCK_RESERVATION_TTL``), replacing the cart's current holds. Raises
+    InsufficientStock, holding nothing, if any variant falls short.
+    """
+    quantities = cart_quantities(cart)
+    if not quantities:
+        raise ReservationError("The cart is empty.")
+
+    record_contention("attempts", quantities)
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    try:
+        with transaction.atomic():
+            finish_holds(cart.reservations.all(), StockReservation.Status.RELEASED)
+            if not take_stock(quantities):
+                raise InsufficientStock({})
+            return StockReservation.objects.bulk_create([
+                StockReservation(cart=cart, variant_id=variant, quantity=quantity, expires_at=expires_at)
+                for variant, quantity in quantities.items()
+            ])
+    except InsufficientStock:
+        available = dict(
+            Variant.objects.filter(pk__in=list(quantities)).values_list("pk", "stock")
+        )
+        shortages = {
+            variant: available.get(variant, 0)
+            for variant, quantity in quantities.items()
+            if available.get(variant, 0) < quantity
+        }
+        record_contention("conflicts", shortages)
+        raise InsufficientStock(shortages)
+
+
+def finish_holds(queryset, status, limit=None):
+    """
+    Move the live holds in ``queryset`` to ``status``, giving their stock
+    back unless they are being confirmed. Rows locked by another worker are
+    skipped. Returns ``{variant id: quantity}`` of the holds moved.
+    """
+    with transaction.atomic():
+        holds = (
+            queryset.filter(status=StockReservation.Status.HELD)
+            .select_for_update(skip_locked=True)
+            .order_by("expires_at", "pk")
+            .values_list("pk", "variant_id", "quantity")
+        )
+        if limit is not None:
+            holds = holds[:limit]
+        holds = list(holds)
+        if not holds:
+            return {}
+
+        quantities = Counter()
+        for _, variant, quantity in holds:
+            quantities[variant] += quantity
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in holds]).update(
+            status=status, updated_at=timezone.now()
+        )
+        if status != StockReservation.Status.CONFIRMED:
+            return_stock(quantities)
+    return dict(quantities)
+
+
+def release_cart(cart):
+    return finish_holds(cart.reservations.all(), StockReservation.Status.RELEASED)
+
+
+def confirm_cart(cart):
+    """
+    Turn the cart's holds into sales, recorded in the inventory ledger. A
+    hold past its TTL still counts as long as the sweeper has not returned
+    it yet. Raises ReservationError if the holds no longer match the cart.
+    """
+    from .inventory import record_movements
+
+    with transaction.atomic():
+        held = Counter()
+        for variant, quantity in (
+            cart.reservations.filter(status=StockReservation.Status.HELD)
+            .select_for_update()
+            .values_list("variant_id", "quantity")
+        ):
+            held[variant] += quantity
+        if dict(held) != cart_quantities(cart):
+            raise ReservationError("The cart changed since its stock was reserved.")
+        sold = finish_holds(cart.reservations.all(), StockReservation.Status.CONFIRMED)
+        record_movements(
+            {variant: -quantity for variant, quantity in sold.items()},
+            InventoryMovement.Kind.SALE,
+            reference=f"cart:{cart.pk}",
+            adjust_stock=False,
+        )
+        return sold
+
+
+def sweep_expired(batch_size=500):
+    """
+    Expire up to ``batch_size`` holds past their TTL and return their stock.
+    Returns ``{variant id: quantity}`` given back.
+    """
+    expired = finish_holds(
+        StockReservation.objects.filter(expires_at__lte=timezone.now()),
+        StockReservation.Status.EXPIRED,
+        limit=batch_size,
+    )
+    record_contention("expired", expired)
+    return expired
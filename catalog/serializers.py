@@ -1,4 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
+from .discounts import current_index, product_discounts
+from .images import srcset
+from .inventory import record_movements
+from .reservations import InsufficientStock
 from .models import (
     Product,
     Variant,
@@ -10,11 +15,37 @@ from .models import (
     Discount,
     ProductDiscount,
     Inventory,
+    InventoryMovement,
+    StockReservation,
 )
 
 
+class SrcsetField(serializers.ReadOnlyField):
+    """
+    ``{format: srcset}`` for the resized copies of an image; empty until
+    they have been generated.
+    """
+
+    def to_representation(self, value):
+        sets = {fmt: srcset(value, fmt) for fmt in value or {}}
+        return {fmt: attribute for fmt, attribute in sets.items() if attribute}
+
+
+class ProductDiscountRuleSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    code = serializers.CharField()
+    description = serializers.CharField()
+    discount_type = serializers.CharField()
+    value = serializers.DecimalField(max_digits=10, decimal_places=2)
+    minimum_purchase = serializers.DecimalField(max_digits=10, decimal_places=2)
+    maximum_discount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    end_date = serializers.DateTimeField(allow_null=True)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     """Serializer for the product model"""
+    image_srcset = SrcsetField(source="image_derivatives")
+    discounts = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -29,12 +60,30 @@ class ProductSerializer(serializers.ModelSerializer):
             "date_added",
             "is_active",
             "image_url",
+            "image_srcset",
             "brand",
+            "min_variant_price",
+            "max_variant_price",
+            "total_variant_stock",
+            "discounts",
         ]
+        read_only_fields = ["stock_quantity"]
+
+    def get_discounts(self, product):
+        # Shared by every product of a list, so the index is resolved once.
+        index = self.context.get("discount_index")
+        if index is None:
+            index = self.context["discount_index"] = current_index()
+        return ProductDiscountRuleSerializer(product_discounts(product.pk, index), many=True).data
 
 
 class VariantSerializer(serializers.ModelSerializer):
-    """Serializer for the variant model"""
+    """
+    Serializer for the variant model. Stock only changes through the
+    inventory ledger; ``initial_stock`` seeds it with a receipt on create.
+    """
+    image_srcset = SrcsetField(source="image_derivatives")
+    initial_stock = serializers.IntegerField(write_only=True, min_value=0, required=False)
 
     class Meta:
         model = Variant
@@ -46,9 +95,30 @@ class VariantSerializer(serializers.ModelSerializer):
             "price",
             "stock",
             "image_url",
+            "image_srcset",
             "created_at",
             "updated_at",
+            "initial_stock",
         ]
+        read_only_fields = ["stock"]
+
+    def validate_initial_stock(self, value):
+        if self.instance is not None:
+            raise serializers.ValidationError("Record an inventory movement instead.")
+        return value
+
+    def create(self, validated_data):
+        initial_stock = validated_data.pop("initial_stock", 0)
+        with transaction.atomic():
+            variant = super().create(validated_data)
+            if initial_stock:
+                record_movements(
+                    {variant.pk: initial_stock},
+                    InventoryMovement.Kind.RECEIPT,
+                    reference=f"variant:{variant.pk}",
+                )
+                variant.refresh_from_db(fields=["stock"])
+        return variant
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -61,11 +131,73 @@ class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ["id", "name", "description", "parent_id", "children", "products"]
+        fields = ["id", "name", "description", "parent_id", "depth", "children", "products"]
 
     def get_children(self, obj):
         return CategorySerializer(obj.children.all(), many=True).data
 
+    def validate_parent_id(self, value):
+        if value is not None and self.instance is not None:
+            if value.path.startswith(self.instance.path):
+                raise serializers.ValidationError("A category cannot be moved under itself.")
+        return value
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    """
+    Slim category listing with product figures aggregated in SQL.
+
+    ``products`` is only present when the view asks for it through the
+    ``include_products`` context flag; it then holds the prefetched
+    ``preview_products``. ``children`` needs ``include_children`` and the
+    subtrees attached by CategoryQuerySet.attach_subtrees().
+    """
+    active_product_count = serializers.IntegerField(read_only=True)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True, allow_null=True
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True, allow_null=True
+    )
+    in_stock_variant_count = serializers.IntegerField(read_only=True)
+    products = ProductSerializer(source="preview_products", many=True, read_only=True)
+    children = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = [
+            "id",
+            "name",
+            "description",
+            "parent_id",
+            "depth",
+            "active_product_count",
+            "min_price",
+            "max_price",
+            "in_stock_variant_count",
+            "children",
+            "products",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get("include_products"):
+            fields.pop("products")
+        if not self.context.get("include_children"):
+            fields.pop("children")
+        return fields
+
+    def get_children(self, obj):
+        return CategorySerializer(obj.children.all(), many=True).data
+
+
+class CategoryBreadcrumbSerializer(serializers.ModelSerializer):
+    """Compact category representation for breadcrumbs"""
+
+    class Meta:
+        model = Category
+        fields = ["id", "name", "depth"]
+
 
 class CartSerializer(serializers.ModelSerializer):
     """Serializer for the Cart model.."""
@@ -75,6 +207,41 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "created_at", "updated_at"]
 
 
+class CartDiscountSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    code = serializers.CharField()
+    description = serializers.CharField()
+    products = serializers.ListField(child=serializers.IntegerField())
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class StockWarningSerializer(serializers.Serializer):
+    variant = serializers.IntegerField()
+    requested = serializers.IntegerField()
+    available = serializers.IntegerField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """Totals of a cart, as built by catalog.carts.cart_summary."""
+
+    cart = serializers.IntegerField()
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discounts = CartDiscountSerializer(many=True)
+    discount_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock_warnings = StockWarningSerializer(many=True)
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    """Serializer for stock held by a cart."""
+
+    class Meta:
+        model = StockReservation
+        fields = ["id", "cart", "variant", "quantity", "status", "expires_at"]
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     """Serializer for items inside a cart."""
 
@@ -117,6 +284,7 @@ class DiscountSerializer(serializers.ModelSerializer):
             "code",
             "description",
             "discount_type",
+            "value",
             "minimum_purchase",
             "maximum_discount",
             "start_date",
@@ -134,8 +302,41 @@ class ProductDiscountSerializer(serializers.ModelSerializer):
 
 
 class InventorySerializer(serializers.ModelSerializer):
-    """Serializer for Variant inventory."""
+    """Serializer for Variant inventory levels."""
+    on_hand = serializers.IntegerField(read_only=True)
+    available = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Inventory
-        fields = ["id", "variant", "quantity", "updated_at"]
+        fields = ["id", "variant", "on_hand", "available", "updated_at"]
+
+
+class InventoryMovementSerializer(serializers.ModelSerializer):
+    """Serializer for inventory ledger entries."""
+
+    class Meta:
+        model = InventoryMovement
+        fields = ["id", "variant", "kind", "quantity", "reference", "created_at"]
+
+    def validate(self, attrs):
+        kind, quantity = attrs["kind"], attrs["quantity"]
+        if quantity == 0:
+            raise serializers.ValidationError({"quantity": "Cannot be zero."})
+        if kind in (InventoryMovement.Kind.RECEIPT, InventoryMovement.Kind.RETURN) and quantity < 0:
+            raise serializers.ValidationError({"quantity": f"A {kind} adds stock."})
+        if kind == InventoryMovement.Kind.SALE and quantity > 0:
+            raise serializers.ValidationError({"quantity": "A sale takes stock away."})
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            [movement] = record_movements(
+                {validated_data["variant"].pk: validated_data["quantity"]},
+                validated_data["kind"],
+                reference=validated_data.get("reference", ""),
+            )
+        except InsufficientStock as exc:
+            raise serializers.ValidationError(
+                {"quantity": f"Only {exc.shortages[validated_data['variant'].pk]} available."}
+            )
+        return movement
@@ -0,0 +1,69 @@
+from django.db import transaction
+from functools import partial
+from .discounts import evict_discount_products
+from .models import Product
+
+AGGREGATE_FIELDS = {"product", "price", "stock"}
+
+
+def remember_variant_product(sender, instance, update_fields=None, **kwargs):
+    # A variant moved to another product leaves the old one to refresh too.
+    if instance.pk is None:
+        return
+    if update_fields is not None and not AGGREGATE_FIELDS.intersection(update_fields):
+        return
+    instance._aggregate_product_before = (
+        sender._base_manager.filter(pk=instance.pk)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+
+
+def refresh_variant_aggregates(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not AGGREGATE_FIELDS.intersection(update_fields):
+        return
+    product_ids = {instance.product_id, instance.__dict__.pop("_aggregate_product_before", None)}
+    product_ids.discard(None)
+    Product.objects.filter(pk__in=product_ids).refresh_variant_aggregates()
+
+
+def remember_image(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and "image_url" not in update_fields:
+        return
+    instance._image_before = (
+        sender._base_manager.filter(pk=instance.pk)
+        .values_list("image_url", flat=True)
+        .first()
+    )
+
+
+def queue_image_derivatives(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Drop the derivatives of a replaced image and resize the new one after
+    the transaction commits, so the upload itself never waits on Pillow.
+    """
+    from .tasks import generate_image_derivatives
+
+    if update_fields is not None and "image_url" not in update_fields:
+        return
+    before = instance.__dict__.pop("_image_before", None) or ""
+    name = instance.image_url.name or ""
+    if name == before and not created:
+        return
+
+    if instance.image_derivatives:
+        sender.objects.filter(pk=instance.pk).update(image_derivatives={})
+        instance.image_derivatives = {}
+    if name:
+        transaction.on_commit(
+            partial(generate_image_derivatives.delay, sender._meta.label, instance.pk, name)
+        )
+
+
+def evict_discounted_products(sender, instance, created=False, **kwargs):
+    # Product responses embed their discounts; a new discount has no
+    # products yet, and links evict their product themselves.
+    if not created:
+        evict_discount_products([instance.pk])
@@ -0,0 +1,106 @@
+from celery import shared_task
+from django.apps import apps
+from django.urls import reverse
+from PIL import UnidentifiedImageError
+from utils.cache_stats import decay_hits, top_hits
+from utils.cache_warming import CacheWarmer
+from utils.mixins import CachedDetailMixin
+from .discounts import refresh_windows
+from .images import build_derivatives
+from .inventory import compact
+from .reservations import sweep_expired
+from .views import CategoryViewSet, ProductViewSet, VariantViewSet
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (viewset, router basename) pairs whose shared cache entries get warmed.
+WARM_TARGETS = [
+    (CategoryViewSet, "category"),
+    (ProductViewSet, "product"),
+    (VariantViewSet, "variant"),
+]
+
+
+def default_list_params(viewset):
+    """
+    The unfiltered list in its default order and in every allowed ordering.
+    """
+    params = [{}]
+    for field in viewset.ordering_fields:
+        params += [{"ordering": field}, {"ordering": f"-{field}"}]
+    return params
+
+
+@shared_task
+def warm_catalog_cache(pages=3, top=50):
+    """
+    Rebuild the most requested catalog list pages and detail entries.
+
+    Lists are the default orderings plus the ``top`` most requested
+    filter/ordering combinations, each warmed for its first ``pages`` pages.
+    Details are the ``top`` most requested lookups.
+    """
+    warmer = CacheWarmer()
+
+    for viewset, basename in WARM_TARGETS:
+        prefix = viewset.cache_prefix
+        path = reverse(f"{basename}-list")
+
+        params_list = default_list_params(viewset)
+        params_list += [p for p in top_hits(prefix, "list", top) if p not in params_list]
+        warmer.warm_list(viewset, path, params_list, pages)
+        decay_hits(prefix, "list")
+
+        if issubclass(viewset, CachedDetailMixin):
+            warmer.warm_details(viewset, path, top_hits(prefix, "detail", top))
+            decay_hits(prefix, "detail")
+
+    return warmer.requests
+
+
+@shared_task(ignore_result=True)
+def generate_image_derivatives(model_label, pk, name):
+    """
+    Resize the image ``name`` of a product or variant and record the
+    derivatives, unless the image was replaced in the meantime.
+    """
+    model = apps.get_model(model_label)
+    instance = model._base_manager.filter(pk=pk, image_url=name).first()
+    if instance is None:
+        return
+
+    try:
+        derivatives = build_derivatives(instance.image_url)
+    except (UnidentifiedImageError, FileNotFoundError):
+        logger.warning("Cannot resize %s for %s %s", name, model_label, pk)
+        return
+    model.objects.filter(pk=pk, image_url=name).update(image_derivatives=derivatives)
+
+
+@shared_task(ignore_result=True)
+def sweep_expired_reservations(batch_size=500, max_batches=20):
+    """
+    Give the stock of expired checkout holds back, a batch at a time.
+    """
+    for _ in range(max_batches):
+        if not sweep_expired(batch_size):
+            return
+
+
+@shared_task(ignore_result=True)
+def compact_inventory_ledger(batch_size=5000, max_batches=20):
+    """
+    Fold recent inventory movements into the per-variant snapshots.
+    """
+    for _ in range(max_batches):
+        if compact(batch_size) < batch_size:
+            return
+
+
+@shared_task(ignore_result=True)
+def refresh_discount_windows():
+    """
+    Refresh discounts and the responses showing them when one starts or ends.
+    """
+    refresh_windows()
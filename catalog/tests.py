@@ -1,18 +1,55 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.test import APIClient
+from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
+from io import BytesIO, StringIO
+from PIL import Image
+import json
+import os
+import tempfile
 from catalog.models import (
     Category,
     Product,
     Variant,
     Inventory,
+    InventoryMovement,
     Discount,
     ProductDiscount,
     Wishlist,
     WishlistItem,
     Cart,
-    CartItem
+    CartItem,
+    StockReservation,
 )
+from catalog.carts import CartError, add_items, cart_summary, set_quantities
+from catalog.discounts import current_index, refresh_windows
+from catalog.importer import CatalogImporter, read_rows
+from catalog.inventory import compact, levels, record_movements
+from catalog.reservations import (
+    InsufficientStock,
+    ReservationError,
+    confirm_cart,
+    contention_stats,
+    release_cart,
+    reserve_cart,
+    sweep_expired,
+)
+from catalog.tasks import generate_image_derivatives, warm_catalog_cache
+from utils.cache import get_generation
+from utils.cache_stats import top_hits
+from utils.pagination import ApproximateCountPagination, ApproximateCountPaginator
 
 User = get_user_model()
 
@@ -144,3 +181,1337 @@ class CatalogModelTests(TestCase):
     def test_cart_item_relationships(self):
         self.assertEqual(self.cart_item.cart, self.cart)
         self.assertEqual(self.cart_item.variant, self.variant)
+
+
+class CachedQuerysetInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="Laptop",
+            price=Decimal("1500.00"),
+            sku="LAP123",
+            brand="TechBrand"
+        )
+
+    def list_product_names(self):
+        response = self.client.get("/api/product/")
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_save_invalidates_cached_list(self):
+        self.assertEqual(self.list_product_names(), ["Laptop"])
+
+        self.product.name = "Notebook"
+        self.product.save()
+
+        self.assertEqual(self.list_product_names(), ["Notebook"])
+
+    def test_bulk_update_invalidates_cached_list(self):
+        self.assertEqual(self.list_product_names(), ["Laptop"])
+
+        Product.objects.filter(pk=self.product.pk).update(name="Notebook")
+
+        self.assertEqual(self.list_product_names(), ["Notebook"])
+
+    def test_write_bumps_dependent_prefixes(self):
+        before = get_generation("categories")
+
+        Product.objects.create(
+            category=self.category, name="Phone", price=Decimal("500.00"), brand="TechBrand"
+        )
+
+        self.assertGreater(get_generation("categories"), before)
+
+    def test_cached_list_answers_conditional_get(self):
+        first = self.client.get("/api/product/")
+        etag = first["ETag"]
+
+        second = self.client.get("/api/product/", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second["ETag"], etag)
+
+    def test_etag_changes_after_write(self):
+        etag = self.client.get("/api/product/")["ETag"]
+
+        self.product.name = "Notebook"
+        self.product.save()
+
+        response = self.client.get("/api/product/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class CachedDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        self.products = [
+            Product.objects.create(
+                category=self.category, name=name, price=Decimal("10.00"), sku=name, brand="TechBrand"
+            )
+            for name in ("Laptop", "Phone", "Tablet")
+        ]
+        self.variant = Variant.objects.create(
+            product=self.products[0], variant_name="16GB", sku="LAP-16", stock=3
+        )
+
+    def test_retrieve_is_served_from_cache(self):
+        url = f"/api/product/{self.products[0].id}/"
+        self.assertEqual(self.client.get(url).json()["name"], "Laptop")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["name"], "Laptop")
+
+    def test_variant_write_evicts_product_and_variant_detail(self):
+        product_url = f"/api/product/{self.products[0].id}/"
+        self.client.get(product_url)
+        self.client.get("/api/variant/LAP-16/")
+
+        self.variant.sku = "LAP-32"
+        self.variant.save()
+
+        self.assertIsNone(cache.get(f"products:detail:{self.products[0].id}"))
+        self.assertIsNone(cache.get("variants:detail:LAP-16"))
+        self.assertEqual(self.client.get("/api/variant/LAP-16/").status_code, 404)
+
+    def test_write_only_evicts_touched_object(self):
+        for product in self.products:
+            self.client.get(f"/api/product/{product.id}/")
+
+        Product.objects.filter(pk=self.products[1].pk).update(name="Smartphone")
+
+        self.assertIsNotNone(cache.get(f"products:detail:{self.products[0].id}"))
+        self.assertIsNone(cache.get(f"products:detail:{self.products[1].id}"))
+
+    def test_bulk_returns_requested_order_with_one_cache_round_trip(self):
+        ids = [self.products[2].id, self.products[0].id]
+        self.client.get(f"/api/product/{ids[0]}/")
+
+        url = "/api/product/bulk/?id=" + ",".join(str(pk) for pk in ids)
+        names = [row["name"] for row in self.client.get(url).json()]
+        self.assertEqual(names, ["Tablet", "Laptop"])
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_bulk_accepts_non_canonical_values(self):
+        product = self.products[0]
+        url = f"/api/product/bulk/?id=0{product.id},{product.id}"
+
+        self.assertEqual([row["name"] for row in self.client.get(url).json()], ["Laptop"])
+        self.assertIsNotNone(cache.get(f"products:detail:{product.id}"))
+        self.assertEqual(self.client.get("/api/product/bulk/?id=x").status_code, 400)
+
+
+class CacheStampedeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            category=self.category, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand"
+        )
+        self.url = f"/api/product/{self.product.id}/"
+        self.key = f"products:detail:{self.product.id}"
+
+    def expire_entry(self):
+        entry = cache.get(self.key)
+        entry["expires"] = 0
+        cache.set(self.key, entry)
+
+    def test_expired_entry_is_served_stale_while_locked(self):
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.expire_entry()
+        cache.add(f"{self.key}:lock", 1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(response.json()["name"], "Laptop")
+
+    def test_expired_entry_is_rebuilt_by_lock_holder(self):
+        self.client.get(self.url)
+        self.expire_entry()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertGreater(cache.get(self.key)["expires"], 0)
+        self.assertIsNone(cache.get(f"{self.key}:lock"))
+
+    def test_fresh_entry_is_a_hit(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+
+class CacheWarmingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            category=self.category, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand"
+        )
+        Variant.objects.create(product=self.product, variant_name="16GB", sku="LAP-16")
+
+    @override_settings(CACHE_STATS_SAMPLE_RATE=1)
+    def test_warms_default_and_most_requested_entries(self):
+        self.client.get("/api/product/", {"brand": "TechBrand"})
+        self.client.get("/api/variant/LAP-16/")
+        self.assertIn({"brand": "TechBrand"}, top_hits("products", "list", 5))
+        cache.clear()
+
+        warm_catalog_cache(pages=1, top=5)
+
+        self.assertEqual(self.client.get("/api/category/")["X-Cache"], "HIT")
+        self.assertEqual(self.client.get("/api/product/", {"ordering": "-price"})["X-Cache"], "HIT")
+        self.assertEqual(self.client.get("/api/product/", {"brand": "TechBrand"})["X-Cache"], "HIT")
+        self.assertEqual(self.client.get("/api/variant/LAP-16/")["X-Cache"], "HIT")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        # Equal prices force the id tie-breaker to decide the order.
+        for index in range(7):
+            Product.objects.create(
+                category=self.category,
+                name=f"Product {index}",
+                price=Decimal("10.00") if index % 2 else Decimal("20.00"),
+                sku=f"P{index}",
+                brand="TechBrand",
+            )
+
+    def walk(self, params):
+        names, url, pages = [], "/api/product/", 0
+        while url:
+            body = self.client.get(url, params).json()
+            names += [row["name"] for row in body["results"]]
+            url, params, pages = body["next"], None, pages + 1
+        return names, pages
+
+    def test_pages_follow_ordering_with_id_tie_breaker(self):
+        names, pages = self.walk({"ordering": "price", "page_size": 3, "cursor": ""})
+
+        expected = [
+            product.name
+            for product in Product.objects.order_by("price", "id")
+        ]
+        self.assertEqual(names, expected)
+        self.assertEqual(pages, 3)
+
+    def test_response_has_no_count_and_previous_link_goes_back(self):
+        first = self.client.get("/api/product/", {"ordering": "-price", "page_size": 3, "cursor": ""}).json()
+        self.assertNotIn("count", first)
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+
+        self.assertEqual(back["results"], first["results"])
+
+    def test_page_after_cursor_does_not_offset(self):
+        first = self.client.get("/api/product/", {"page_size": 3, "cursor": ""}).json()
+
+        cache.clear()
+        current_index()  # Loaded once per discount change, not per request.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first["next"])
+
+        # The product page and the variants prefetch; nothing is counted.
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn("COUNT(", query["sql"])
+            self.assertNotIn("OFFSET", query["sql"])
+        # The leading column is bounded on its own, so an index range applies.
+        self.assertIn('"catalog_product"."date_added" <=', queries[0]["sql"])
+
+    def test_page_numbers_and_count_stay_the_default(self):
+        body = self.client.get("/api/product/", {"page_size": 3, "page": 3}).json()
+
+        self.assertEqual(body["count"], 7)
+        self.assertEqual(len(body["results"]), 1)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get("/api/product/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+@mock.patch.object(ApproximateCountPagination, "count_cap", 2)
+class ApproximateCountPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Electronics")
+        product = Product.objects.create(
+            category=category, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand"
+        )
+        for index in range(5):
+            Variant.objects.create(product=product, variant_name=str(index), sku=f"LAP-{index}")
+
+    def test_count_is_capped_until_the_last_page(self):
+        first = self.client.get("/api/variant/", {"page_size": 2}).json()
+        self.assertEqual(first["count"], 2)
+        self.assertFalse(first["count_exact"])
+        self.assertIsNotNone(first["next"])
+
+        last = self.client.get("/api/variant/", {"page_size": 2, "page": 3}).json()
+        self.assertEqual(last["count"], 5)
+        self.assertTrue(last["count_exact"])
+        self.assertIsNone(last["next"])
+
+    def test_exact_count_on_request(self):
+        body = self.client.get("/api/variant/", {"page_size": 2, "exact_count": "true"}).json()
+
+        self.assertEqual(body["count"], 5)
+        self.assertTrue(body["count_exact"])
+
+    def test_cached_count_keeps_its_exactness(self):
+        variants = Variant.objects.filter(sku__in=["LAP-0", "LAP-1"]).order_by("pk")
+        self.assertTrue(ApproximateCountPaginator(variants, 1, cap=2).count_exact)
+
+        with self.assertNumQueries(0):
+            paginator = ApproximateCountPaginator(variants, 1, cap=2)
+            self.assertEqual(paginator.count, 2)
+            self.assertTrue(paginator.count_exact)
+
+        capped = Variant.objects.filter(sku__startswith="LAP").order_by("pk")
+        ApproximateCountPaginator(capped, 1, cap=2).count
+        self.assertFalse(ApproximateCountPaginator(capped, 1, cap=2).count_exact)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.root = Category.objects.create(name="Electronics")
+        self.computers = Category.objects.create(name="Computers", parent_id=self.root)
+        self.laptops = Category.objects.create(name="Laptops", parent_id=self.computers)
+        self.phones = Category.objects.create(name="Phones", parent_id=self.root)
+        self.laptop = Product.objects.create(
+            category=self.laptops, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand"
+        )
+        self.phone = Product.objects.create(
+            category=self.phones, name="Phone", price=Decimal("5.00"), sku="PHN", brand="TechBrand"
+        )
+
+    def test_path_and_depth_are_maintained(self):
+        self.assertEqual(self.laptops.path, f"{self.root.pk}/{self.computers.pk}/{self.laptops.pk}/")
+        self.assertEqual(self.laptops.depth, 2)
+
+    def test_moving_a_category_moves_its_subtree(self):
+        self.computers.parent_id = self.phones
+        self.computers.save()
+
+        self.laptops.refresh_from_db()
+        self.assertEqual(
+            self.laptops.path,
+            f"{self.root.pk}/{self.phones.pk}/{self.computers.pk}/{self.laptops.pk}/",
+        )
+        self.assertEqual(self.laptops.depth, 3)
+
+    def test_cannot_move_category_under_its_descendant(self):
+        response = self.client.get(f"/api/category/{self.root.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+        self.root.parent_id = self.laptops
+        with self.assertRaises(ValidationError):
+            self.root.save()
+
+    def test_retrieve_loads_whole_subtree_in_constant_queries(self):
+        # Category, subtree, and products for the root and for the subtree.
+        current_index()
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/category/{self.root.pk}/")
+
+        computers = response.json()["children"][0]
+        self.assertEqual(computers["children"][0]["name"], "Laptops")
+        self.assertEqual(computers["children"][0]["products"][0]["name"], "Laptop")
+
+    def test_ancestors_are_breadcrumbs_from_the_root(self):
+        response = self.client.get(f"/api/category/{self.laptops.pk}/ancestors/")
+
+        names = [row["name"] for row in response.json()]
+        self.assertEqual(names, ["Electronics", "Computers", "Laptops"])
+
+    def test_products_include_descendant_categories(self):
+        response = self.client.get(f"/api/category/{self.root.pk}/products/")
+        names = {row["name"] for row in response.json()["results"]}
+        self.assertEqual(names, {"Laptop", "Phone"})
+
+        response = self.client.get(f"/api/category/{self.computers.pk}/products/")
+        self.assertEqual([row["name"] for row in response.json()["results"]], ["Laptop"])
+
+
+class CategoryListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Electronics")
+        Category.objects.create(name="Toys")
+        for index, price in enumerate(["10.00", "30.00", "20.00"]):
+            product = Product.objects.create(
+                category=self.category,
+                name=f"Product {index}",
+                price=Decimal(price),
+                sku=f"P{index}",
+                brand="TechBrand",
+            )
+            Variant.objects.create(product=product, variant_name="Default", sku=f"P{index}-1", stock=index)
+        Product.objects.create(
+            category=self.category, name="Retired", price=Decimal("99.00"),
+            sku="OLD", brand="TechBrand", is_active=False,
+        )
+
+    def rows(self, params=None):
+        response = self.client.get("/api/category/", params or {})
+        return {row["name"]: row for row in response.json()["results"]}
+
+    def test_list_returns_aggregates_without_products(self):
+        with self.assertNumQueries(2):
+            rows = self.rows()
+
+        electronics = rows["Electronics"]
+        self.assertNotIn("products", electronics)
+        self.assertEqual(electronics["active_product_count"], 3)
+        self.assertEqual(electronics["min_price"], "10.00")
+        self.assertEqual(electronics["max_price"], "30.00")
+        self.assertEqual(electronics["in_stock_variant_count"], 2)
+        self.assertEqual(rows["Toys"]["active_product_count"], 0)
+        self.assertIsNone(rows["Toys"]["min_price"])
+
+    def test_in_stock_count_follows_variants_selling_out(self):
+        self.assertEqual(self.rows()["Electronics"]["in_stock_variant_count"], 2)
+
+        variant = Variant.objects.get(sku="P1-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movements({variant.id: -variant.stock}, InventoryMovement.Kind.SALE)
+        self.assertEqual(self.rows()["Electronics"]["in_stock_variant_count"], 1)
+
+        variant.stock = 3
+        variant.save()
+        self.assertEqual(self.rows()["Electronics"]["in_stock_variant_count"], 2)
+
+    def test_products_are_embedded_on_request_up_to_the_limit(self):
+        rows = self.rows({"include": "products", "products_limit": 2})
+
+        self.assertEqual(len(rows["Electronics"]["products"]), 2)
+        self.assertEqual(rows["Toys"]["products"], [])
+
+    def test_children_are_embedded_on_request(self):
+        phones = Category.objects.create(name="Phones", parent_id=self.category)
+        Category.objects.create(name="Cases", parent_id=phones)
+
+        self.assertNotIn("children", self.rows()["Electronics"])
+        rows = self.rows({"include": "children"})
+
+        (child,) = rows["Electronics"]["children"]
+        self.assertEqual(child["name"], "Phones")
+        self.assertEqual([node["name"] for node in child["children"]], ["Cases"])
+        self.assertEqual(rows["Toys"]["children"], [])
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name="Electronics")
+        laptop = Product.objects.create(
+            category=category, name="Laptop", description="Thin and light",
+            price=Decimal("10.00"), sku="LAP", brand="TechBrand",
+        )
+        Variant.objects.create(product=laptop, variant_name="Midnight Blue", sku="LAP-B")
+        Variant.objects.create(product=laptop, variant_name="Midnight Black", sku="LAP-K")
+        Product.objects.create(
+            category=category, name="Phone", description="Pocket sized",
+            price=Decimal("5.00"), sku="PHN", brand="OtherBrand",
+        )
+
+    def search(self, params):
+        response = self.client.get("/api/product/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_matches_product_and_variant_text_once(self):
+        self.assertEqual(self.search({"q": "midnight"}), ["Laptop"])
+        self.assertEqual(self.search({"q": "pocket"}), ["Phone"])
+
+    def test_existing_filters_apply(self):
+        self.assertEqual(self.search({"q": "brand", "brand": "OtherBrand"}), ["Phone"])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get("/api/product/search/").status_code, 400)
+
+    def test_list_and_detail_do_not_load_the_search_vector(self):
+        laptop = Product.objects.get(sku="LAP")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/product/")
+            self.client.get(f"/api/product/{laptop.id}/")
+
+        self.assertFalse(any("search_vector" in query["sql"] for query in queries))
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.phones = Category.objects.create(name="Phones")
+        self.laptops = Category.objects.create(name="Laptops")
+        for name, category, brand, price in [
+            ("Phone A", self.phones, "Acme", "20.00"),
+            ("Phone B", self.phones, "Globex", "80.00"),
+            ("Laptop A", self.laptops, "Acme", "900.00"),
+            ("Laptop B", self.laptops, "Acme", "1500.00"),
+        ]:
+            Product.objects.create(
+                category=category, name=name, price=Decimal(price), sku=name, brand=brand
+            )
+
+    def test_counts_by_brand_category_and_price_in_one_query(self):
+        with self.assertNumQueries(1):
+            body = self.client.get("/api/product/facets/").json()
+
+        self.assertEqual(body["total"], 4)
+        self.assertEqual(body["brand"], [{"value": "Acme", "count": 3}, {"value": "Globex", "count": 1}])
+        self.assertEqual(
+            {row["name"]: row["count"] for row in body["category"]},
+            {"Phones": 2, "Laptops": 2},
+        )
+        self.assertEqual(
+            body["price"],
+            [
+                {"value": "0-25", "count": 1},
+                {"value": "50-100", "count": 1},
+                {"value": "500-1000", "count": 1},
+                {"value": "1000+", "count": 1},
+            ],
+        )
+
+    def test_facets_follow_filters_and_are_cached_per_filter_set(self):
+        body = self.client.get("/api/product/facets/", {"brand": "Acme", "page": 2}).json()
+        self.assertEqual(body["total"], 3)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/product/facets/", {"brand": "Acme"})
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_product_write_refreshes_facets(self):
+        self.client.get("/api/product/facets/")
+        Product.objects.create(
+            category=self.phones, name="Phone C", price=Decimal("30.00"), sku="PC", brand="Initech"
+        )
+
+        body = self.client.get("/api/product/facets/").json()
+        self.assertEqual(body["total"], 5)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            category=category, name="Laptop", description="A long description",
+            price=Decimal("10.00"), sku="LAP", brand="TechBrand",
+        )
+
+    def test_fields_trim_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/product/", {"fields": "id,name,price,image_url"})
+
+        row = response.json()["results"][0]
+        self.assertEqual(set(row), {"id", "name", "price", "image_url"})
+        product_query = next(q["sql"] for q in queries if 'FROM "catalog_product"' in q["sql"])
+        self.assertNotIn('"catalog_product"."description"', product_query)
+
+    def test_omit_drops_fields(self):
+        row = self.client.get("/api/product/", {"omit": "description,brand"}).json()["results"][0]
+        self.assertNotIn("description", row)
+        self.assertIn("name", row)
+
+    def test_cache_key_uses_normalized_field_set(self):
+        self.client.get("/api/product/", {"fields": "name,id"})
+        response = self.client.get("/api/product/", {"fields": "id, name"})
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        full = self.client.get("/api/product/")
+        self.assertEqual(full["X-Cache"], "MISS")
+        self.assertIn("description", full.json()["results"][0])
+
+    def test_sparse_detail_is_refreshed_after_write(self):
+        url = f"/api/product/{self.product.id}/"
+        self.assertEqual(self.client.get(url, {"fields": "name"}).json(), {"name": "Laptop"})
+
+        self.product.name = "Notebook"
+        self.product.save()
+
+        self.assertEqual(self.client.get(url, {"fields": "name"}).json(), {"name": "Notebook"})
+        self.assertIn("description", self.client.get(url).json())
+
+
+class ImportCatalogTests(TestCase):
+    header = "sku,category,name,price,brand,variant_sku,variant_name,stock\n"
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+
+    def run_import(self, text, fmt="csv", **kwargs):
+        errors = []
+        importer = CatalogImporter(on_error=lambda line, message: errors.append((line, message)), **kwargs)
+        stats = importer.run(read_rows(StringIO(text), fmt))
+        return stats, errors
+
+    def test_csv_creates_then_updates_by_sku(self):
+        feed = self.header + (
+            "LAP,Electronics,Laptop,999.00,TechBrand,LAP-8,8GB,5\n"
+            "LAP,Electronics,Laptop,999.00,TechBrand,LAP-16,16GB,2\n"
+        )
+        stats, errors = self.run_import(feed, batch_size=1)
+        self.assertEqual(errors, [])
+        self.assertEqual(stats["products created"], 1)
+        self.assertEqual(stats["variants created"], 2)
+
+        feed = self.header + "LAP,Electronics,Laptop Pro,1099.00,TechBrand,LAP-8,8GB,7\n"
+        stats, errors = self.run_import(feed)
+        self.assertEqual(stats["products updated"], 1)
+        self.assertEqual(stats["variants updated"], 1)
+
+        product = Product.objects.get(sku="LAP")
+        self.assertEqual(product.name, "Laptop Pro")
+        self.assertEqual(Product.objects.count(), 1)
+        variant = Variant.objects.get(sku="LAP-8")
+        self.assertEqual(variant.stock, 7)
+        self.assertEqual(levels([variant.id]), {variant.id: 7})
+
+    def test_zero_variant_price_is_kept(self):
+        feed = (
+            "sku,category,name,price,brand,variant_sku,variant_name,variant_price,stock\n"
+            "LAP,Electronics,Laptop,999.00,TechBrand,LAP-FREE,Sample,0,1\n"
+            "LAP,Electronics,Laptop,999.00,TechBrand,LAP-8,8GB,,1\n"
+        )
+        stats, errors = self.run_import(feed)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Variant.objects.get(sku="LAP-FREE").price, Decimal("0.00"))
+        self.assertEqual(Variant.objects.get(sku="LAP-8").price, Decimal("999.00"))
+
+    def test_bad_rows_are_reported_without_aborting(self):
+        feed = self.header + (
+            "A,Electronics,Good,1.00,Brand,,,\n"
+            "B,Electronics,Bad price,abc,Brand,,,\n"
+            "C,Garden,Unknown category,1.00,Brand,,,\n"
+            "D,Electronics,Also good,2.00,Brand,,,\n"
+        )
+        stats, errors = self.run_import(feed)
+
+        self.assertEqual(stats["products created"], 2)
+        self.assertEqual([line for line, _ in errors], [3, 4])
+        self.assertIn("price", errors[0][1])
+        self.assertIn("Garden", errors[1][1])
+        self.assertEqual(set(Product.objects.values_list("sku", flat=True)), {"A", "D"})
+
+    def test_jsonl_and_created_categories(self):
+        feed = (
+            '{"sku": "T1", "category": "Toys", "name": "Kite", "price": "5", "brand": "Fly"}\n'
+            "\n"
+            "not json\n"
+        )
+        stats, errors = self.run_import(feed, fmt="jsonl", create_categories=True)
+
+        self.assertEqual(stats["categories created"], 1)
+        self.assertEqual(Product.objects.get(sku="T1").category.name, "Toys")
+        self.assertEqual(errors[0][0], 3)
+
+    def test_command_dry_run_saves_nothing(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as feed:
+            feed.write(self.header + "A,Electronics,Good,1.00,Brand,A-1,One,3\n")
+        self.addCleanup(os.remove, feed.name)
+
+        out = StringIO()
+        call_command("import_catalog", feed.name, "--dry-run", stdout=out, stderr=StringIO())
+
+        self.assertIn("products created: 1", out.getvalue())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Variant.objects.exists())
+
+
+class ProductExportTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Electronics")
+        laptop = Product.objects.create(
+            category=category, name="Laptop", price=Decimal("999.00"), sku="LAP", brand="TechBrand",
+        )
+        Variant.objects.create(product=laptop, variant_name="8GB", sku="LAP-8", price=Decimal("999.00"))
+        Variant.objects.create(product=laptop, variant_name="16GB", sku="LAP-16", price=Decimal("1199.00"))
+        Product.objects.create(
+            category=category, name="Mouse", price=Decimal("20.00"), sku="MOU", brand="Clicky",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username="boss", email="boss@example.com", password="x", role=User.Roles.ADMIN)
+        )
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_streams_products_with_variants(self):
+        response = self.client.get("/api/product/export/", {"brand": "TechBrand"})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row["sku"] for row in rows], ["LAP"])
+        self.assertEqual(rows[0]["category__name"], "Electronics")
+        self.assertEqual({v["sku"] for v in rows[0]["variants"]}, {"LAP-8", "LAP-16"})
+
+    def test_csv_has_one_line_per_variant(self):
+        response = self.client.get("/api/product/export/", {"export_format": "csv", "ordering": "name"})
+
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "sku"])
+        self.assertIn("variants.sku", lines[0])
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["LAP", "LAP", "MOU"])
+
+    def test_export_is_admin_only(self):
+        shopper = User.objects.create_user(username="shopper", email="shopper@example.com", password="x")
+        self.client.force_authenticate(shopper)
+        self.assertEqual(self.client.get("/api/product/export/").status_code, 403)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get("/api/product/export/", {"export_format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class VariantAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Electronics")
+        self.laptop = Product.objects.create(
+            category=category, name="Laptop", price=Decimal("999.00"), sku="LAP", brand="TechBrand",
+        )
+        self.mouse = Product.objects.create(
+            category=category, name="Mouse", price=Decimal("20.00"), sku="MOU", brand="Clicky",
+        )
+        self.small = Variant.objects.create(
+            product=self.laptop, variant_name="8GB", sku="LAP-8", price=Decimal("900.00"), stock=3,
+        )
+        self.large = Variant.objects.create(
+            product=self.laptop, variant_name="16GB", sku="LAP-16", price=Decimal("1200.00"), stock=2,
+        )
+
+    def assertAggregates(self, product, low, high, stock):
+        product.refresh_from_db()
+        self.assertEqual(
+            (product.min_variant_price, product.max_variant_price, product.total_variant_stock),
+            (low, high, stock),
+        )
+
+    def test_saves_and_deletes_keep_aggregates_current(self):
+        self.assertAggregates(self.laptop, Decimal("900.00"), Decimal("1200.00"), 5)
+
+        self.small.stock = 0
+        self.small.save()
+        self.assertAggregates(self.laptop, Decimal("1200.00"), Decimal("1200.00"), 2)
+
+        self.large.product = self.mouse
+        self.large.save()
+        self.assertAggregates(self.laptop, None, None, 0)
+        self.assertAggregates(self.mouse, Decimal("1200.00"), Decimal("1200.00"), 2)
+
+        self.large.delete()
+        self.assertAggregates(self.mouse, None, None, 0)
+
+    def test_bulk_writes_keep_aggregates_current(self):
+        Variant.objects.filter(product=self.laptop).update(stock=F("stock") + 1)
+        self.assertAggregates(self.laptop, Decimal("900.00"), Decimal("1200.00"), 7)
+
+        self.small.price = Decimal("850.00")
+        Variant.objects.bulk_update([self.small], ["price"])
+        self.assertAggregates(self.laptop, Decimal("850.00"), Decimal("1200.00"), 7)
+
+        Variant.objects.bulk_create([
+            Variant(product=self.mouse, variant_name="Black", sku="MOU-B", price=Decimal("19.00"), stock=4),
+        ])
+        self.assertAggregates(self.mouse, Decimal("19.00"), Decimal("19.00"), 4)
+
+    def test_stock_writes_only_invalidate_lists_when_an_aggregate_changes(self):
+        products = get_generation("products")
+        cache.set("products:detail:%s" % self.laptop.id, {"stale": True})
+
+        Variant.objects.filter(pk=self.small.pk).update(stock=F("stock"))
+        self.assertEqual(get_generation("products"), products)
+        self.assertIsNone(cache.get("products:detail:%s" % self.laptop.id))
+
+        Variant.objects.filter(pk=self.small.pk).update(stock=F("stock") - 1)
+        self.assertNotEqual(get_generation("products"), products)
+
+    def test_cached_list_shows_stock_after_a_sale(self):
+        client = APIClient()
+        url = "/api/product/?ordering=total_variant_stock"
+        rows = client.get(url).json()["results"]
+        self.assertEqual([row["total_variant_stock"] for row in rows], [0, 5])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movements({self.small.id: -1}, InventoryMovement.Kind.SALE)
+
+        rows = client.get(url).json()["results"]
+        self.assertEqual([row["total_variant_stock"] for row in rows], [0, 4])
+        self.assertEqual(rows[1]["stock_quantity"], 4)
+
+    def test_product_save_keeps_concurrent_aggregate_changes(self):
+        stale = Product.objects.get(pk=self.laptop.pk)
+        Variant.objects.filter(pk=self.large.pk).update(stock=0)
+
+        stale.name = "Laptop Pro"
+        stale.save()
+
+        self.assertAggregates(self.laptop, Decimal("900.00"), Decimal("900.00"), 3)
+        self.assertEqual(self.laptop.name, "Laptop Pro")
+
+    def test_list_filters_and_orders_by_aggregates(self):
+        Variant.objects.create(product=self.mouse, variant_name="Black", sku="MOU-B", price=Decimal("19.00"), stock=4)
+        client = APIClient()
+
+        rows = client.get("/api/product/", {"ordering": "min_variant_price"}).json()["results"]
+        self.assertEqual([row["sku"] for row in rows], ["MOU", "LAP"])
+        self.assertEqual(rows[1]["total_variant_stock"], 5)
+
+        rows = client.get("/api/product/", {"min_variant_price__gte": "100"}).json()["results"]
+        self.assertEqual([row["sku"] for row in rows], ["LAP"])
+
+    def test_verify_command_repairs_drift(self):
+        Product.objects.filter(pk=self.laptop.pk).update(total_variant_stock=99)
+
+        out = StringIO()
+        call_command("verify_variant_aggregates", stdout=out)
+        self.assertIn(f"product {self.laptop.pk}", out.getvalue())
+        self.assertAggregates(self.laptop, Decimal("900.00"), Decimal("1200.00"), 99)
+
+        call_command("verify_variant_aggregates", "--repair", stdout=StringIO())
+        self.assertAggregates(self.laptop, Decimal("900.00"), Decimal("1200.00"), 5)
+        self.assertFalse(Product.objects.with_aggregate_drift().exists())
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1280]))
+        # Run the task inline instead of going through the broker.
+        self.delay = self.enterContext(mock.patch(
+            "catalog.tasks.generate_image_derivatives.delay", side_effect=generate_image_derivatives
+        ))
+        self.category = Category.objects.create(name="Electronics")
+
+    def upload(self, width=800, height=400, name="laptop.png"):
+        buffer = BytesIO()
+        Image.new("RGBA", (width, height), (200, 10, 10, 255)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create_product(self):
+        return Product.objects.create(
+            category=self.category, name="Laptop", price=Decimal("10.00"), sku="LAP",
+            brand="TechBrand", image_url=self.upload(),
+        )
+
+    def test_upload_queues_resizing_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = self.create_product()
+        self.delay.assert_not_called()
+        self.assertEqual(product.image_derivatives, {})
+
+        for callback in callbacks:
+            callback()
+        self.delay.assert_called_once_with("catalog.Product", product.pk, product.image_url.name)
+
+    def test_derivatives_are_generated_and_exposed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create_product()
+
+        product.refresh_from_db()
+        self.assertEqual([entry["width"] for entry in product.image_derivatives["webp"]], [320, 640])
+        jpeg = product.image_derivatives["jpeg"][0]["name"]
+        self.assertRegex(jpeg, r"^derivatives/[0-9a-f]{20}-320w\.jpg$")
+        with Image.open(default_storage.open(jpeg)) as image:
+            self.assertEqual(image.size, (320, 160))
+
+        data = APIClient().get(f"/api/product/{product.id}/").json()
+        self.assertIn("320w, ", data["image_srcset"]["webp"])
+        self.assertTrue(data["image_srcset"]["jpeg"].endswith("640w"))
+
+    def test_replacing_the_image_drops_old_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create_product()
+        product.refresh_from_db()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.image_url = self.upload(width=200, height=200, name="small.png")
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_derivatives, {})
+
+        for callback in callbacks:
+            callback()
+        product.refresh_from_db()
+        self.assertEqual([entry["width"] for entry in product.image_derivatives["webp"]], [200])
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.dict("utils.cache_stats._local_stats", clear=True))
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            category=category, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand",
+        )
+        self.small = Variant.objects.create(product=self.product, variant_name="8GB", sku="LAP-8", stock=3)
+        self.large = Variant.objects.create(product=self.product, variant_name="16GB", sku="LAP-16", stock=1)
+        self.cart = self.cart_with({self.small: 2, self.large: 1})
+
+    def cart_with(self, quantities):
+        cart = Cart.objects.create(user=self.user)
+        for variant, quantity in quantities.items():
+            CartItem.objects.create(cart=cart, variant=variant, quantity=quantity, price=Decimal("10.00"))
+        return cart
+
+    def stock(self):
+        return dict(Variant.objects.values_list("sku", "stock"))
+
+    def test_reserve_takes_stock_and_release_gives_it_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            holds = reserve_cart(self.cart)
+
+        self.assertEqual(len(holds), 2)
+        self.assertEqual(self.stock(), {"LAP-8": 1, "LAP-16": 0})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_variant_stock, 1)
+
+        self.assertEqual(release_cart(self.cart), {self.small.id: 2, self.large.id: 1})
+        self.assertEqual(self.stock(), {"LAP-8": 3, "LAP-16": 1})
+        self.assertEqual(release_cart(self.cart), {})
+
+    def test_product_row_is_only_refreshed_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                reserve_cart(self.cart)
+
+        self.assertFalse([query for query in queries if '"catalog_product"' in query["sql"]])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_variant_stock, 4)
+
+        for callback in callbacks:
+            callback()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_variant_stock, 1)
+
+    def test_shortage_holds_nothing(self):
+        reserve_cart(self.cart)
+        other = self.cart_with({self.small: 1, self.large: 1})
+
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_cart(other)
+
+        self.assertEqual(raised.exception.shortages, {self.large.id: 0})
+        self.assertEqual(self.stock(), {"LAP-8": 1, "LAP-16": 0})
+        self.assertFalse(other.reservations.exists())
+        self.assertEqual(
+            contention_stats(),
+            [{"variant": self.large.id, "attempts": 2, "conflicts": 1, "expired": 0}],
+        )
+
+    def test_reserving_again_replaces_the_holds(self):
+        reserve_cart(self.cart)
+        CartItem.objects.filter(cart=self.cart, variant=self.small).update(quantity=3)
+
+        reserve_cart(self.cart)
+
+        self.assertEqual(self.stock(), {"LAP-8": 0, "LAP-16": 0})
+        self.assertEqual(self.cart.reservations.filter(status="held").count(), 2)
+
+    def test_confirm_keeps_stock_sold(self):
+        reserve_cart(self.cart)
+        confirm_cart(self.cart)
+
+        self.assertEqual(set(self.cart.reservations.values_list("status", flat=True)), {"confirmed"})
+        self.assertEqual(release_cart(self.cart), {})
+        self.assertEqual(self.stock(), {"LAP-8": 1, "LAP-16": 0})
+
+    def test_confirm_rejects_a_changed_cart(self):
+        reserve_cart(self.cart)
+        CartItem.objects.filter(cart=self.cart, variant=self.small).update(quantity=1)
+
+        with self.assertRaises(ReservationError):
+            confirm_cart(self.cart)
+
+    def test_sweeper_returns_expired_holds(self):
+        reserve_cart(self.cart, ttl=0)
+        live = self.cart_with({self.small: 1})
+        reserve_cart(live)
+
+        self.assertEqual(sweep_expired(), {self.small.id: 2, self.large.id: 1})
+        self.assertEqual(self.stock(), {"LAP-8": 2, "LAP-16": 1})
+        self.assertEqual(live.reservations.get().status, StockReservation.Status.HELD)
+
+    def test_reserve_and_release_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f"/api/cart/{self.cart.id}/reserve/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({row["status"] for row in response.json()}, {"held"})
+
+        other = self.cart_with({self.large: 1})
+        response = client.post(f"/api/cart/{other.id}/reserve/")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["available"], {str(self.large.id): 0})
+
+        response = client.post(f"/api/cart/{self.cart.id}/release/")
+        self.assertEqual(response.json()["released"], {str(self.small.id): 2, str(self.large.id): 1})
+
+
+class InventoryLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Electronics")
+        product = Product.objects.create(
+            category=category, name="Laptop", price=Decimal("10.00"), sku="LAP", brand="TechBrand",
+        )
+        self.variant = Variant.objects.create(product=product, variant_name="8GB", sku="LAP-8")
+        self.admin = User.objects.create_user(
+            username="stock", email="stock@example.com", password="x", role=User.Roles.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_movements_drive_stock_and_levels(self):
+        record_movements({self.variant.id: 10}, InventoryMovement.Kind.RECEIPT)
+        record_movements({self.variant.id: -3}, InventoryMovement.Kind.SALE)
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 7)
+        self.assertEqual(levels([self.variant.id]), {self.variant.id: 7})
+        self.assertEqual(Inventory.objects.get(variant=self.variant).quantity, 0)
+
+        with self.assertRaises(InsufficientStock):
+            record_movements({self.variant.id: -8}, InventoryMovement.Kind.ADJUSTMENT)
+        self.assertEqual(InventoryMovement.objects.count(), 2)
+
+    def test_variant_api_seeds_stock_through_the_ledger_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/variant/", {
+                "product": self.variant.product_id, "variant_name": "16GB", "sku": "LAP-16",
+                "price": "12.00", "stock": 99, "initial_stock": 5,
+            }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["stock"], 5)
+        variant = Variant.objects.get(sku="LAP-16")
+        self.assertEqual(levels([variant.id]), {variant.id: 5})
+        self.assertEqual(variant.product.stock_quantity, 5)
+
+        response = self.client.patch("/api/variant/LAP-16/", {"stock": 50}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Variant.objects.get(sku="LAP-16").stock, 5)
+        response = self.client.patch("/api/variant/LAP-16/", {"initial_stock": 50}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_compaction_folds_the_tail_into_the_snapshot(self):
+        record_movements({self.variant.id: 10}, InventoryMovement.Kind.RECEIPT)
+        record_movements({self.variant.id: -4}, InventoryMovement.Kind.ADJUSTMENT)
+
+        self.assertEqual(compact(batch_size=1), 1)
+        self.assertEqual(levels([self.variant.id]), {self.variant.id: 6})
+        self.assertEqual(compact(), 1)
+        self.assertEqual(compact(), 0)
+
+        snapshot = Inventory.objects.get(variant=self.variant)
+        self.assertEqual(snapshot.quantity, 6)
+        self.assertEqual(levels([self.variant.id]), {self.variant.id: 6})
+
+    def test_confirmed_checkout_is_recorded_as_a_sale(self):
+        record_movements({self.variant.id: 5}, InventoryMovement.Kind.RECEIPT)
+        cart = Cart.objects.create(user=self.admin)
+        CartItem.objects.create(cart=cart, variant=self.variant, quantity=2, price=Decimal("10.00"))
+
+        reserve_cart(cart)
+        self.assertEqual(levels([self.variant.id]), {self.variant.id: 5})
+        confirm_cart(cart)
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+        self.assertEqual(levels([self.variant.id]), {self.variant.id: 3})
+        sale = InventoryMovement.objects.latest("id")
+        self.assertEqual((sale.kind, sale.quantity), ("sale", -2))
+
+    def test_endpoints_record_movements_and_list_levels(self):
+        response = self.client.post("/api/inventory-movement/", {
+            "variant": self.variant.id, "kind": "receipt", "quantity": 4, "reference": "PO-1",
+        })
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post("/api/inventory-movement/", {
+            "variant": self.variant.id, "kind": "sale", "quantity": 2,
+        })
+        self.assertEqual(response.status_code, 400)
+
+        row = self.client.get("/api/inventory/").json()["results"][0]
+        self.assertEqual((row["on_hand"], row["available"]), (4, 4))
+
+        history = self.client.get("/api/inventory-movement/", {"variant": self.variant.id}).json()
+        self.assertEqual([entry["reference"] for entry in history["results"]], ["PO-1"])
+        self.assertEqual(
+            self.client.put(f"/api/inventory/{row['id']}/", {"quantity": 1}).status_code, 405
+        )
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="shopper", email="shopper@example.com", password="x")
+        category = Category.objects.create(name="Kitchen")
+        self.product = Product.objects.create(
+            category=category, name="Kettle", price=Decimal("30.00"), sku="KET", brand="Boil",
+        )
+        self.steel = Variant.objects.create(product=self.product, sku="KET-S", price=Decimal("30.00"), stock=5)
+        self.glass = Variant.objects.create(product=self.product, sku="KET-G", price=Decimal("45.50"), stock=1)
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, variant=self.steel, quantity=2, price=Decimal("30.00"))
+        CartItem.objects.create(cart=self.cart, variant=self.glass, quantity=3, price=Decimal("45.50"))
+        discount = Discount.objects.create(
+            code="KETTLE10", description="10% off kettles", discount_type="percentage",
+            minimum_purchase=Decimal("50.00"), maximum_discount=Decimal("20.00"),
+        )
+        ProductDiscount.objects.create(discount=discount, product=self.product)
+
+    def test_summary_totals_discounts_and_warnings(self):
+        summary = cart_summary(self.cart)
+
+        self.assertEqual(summary["item_count"], 5)
+        self.assertEqual(summary["line_count"], 2)
+        self.assertEqual(summary["subtotal"], Decimal("196.50"))
+        self.assertEqual([discount["code"] for discount in summary["discounts"]], ["KETTLE10"])
+        self.assertEqual(
+            summary["stock_warnings"], [{"variant": self.glass.id, "requested": 3, "available": 1}]
+        )
+
+    def test_summary_is_cached_until_the_cart_items_change(self):
+        cart_summary(self.cart)
+        with self.assertNumQueries(0):
+            cart_summary(self.cart)
+
+        CartItem.objects.filter(cart=self.cart, variant=self.glass).update(quantity=1)
+        self.assertEqual(cart_summary(self.cart)["subtotal"], Decimal("105.50"))
+
+        CartItem.objects.filter(cart=self.cart, variant=self.glass).delete()
+        self.assertEqual(cart_summary(self.cart)["item_count"], 2)
+
+    def test_rest_and_graphql_summaries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get(f"/api/cart/{self.cart.id}/summary/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["subtotal"], "196.50")
+
+        client.force_login(self.user)
+        response = client.post(
+            "/graphql/", {"query": "{ cart { summary { itemCount subtotal stockWarnings { variant } } } }"},
+            format="json",
+        )
+        summary = response.json()["data"]["cart"]["summary"]
+        self.assertEqual(summary["itemCount"], 5)
+        self.assertEqual(summary["stockWarnings"], [{"variant": self.glass.id}])
+
+
+class BatchedCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="bundler", email="bundler@example.com", password="x")
+        category = Category.objects.create(name="Office")
+        product = Product.objects.create(category=category, name="Pen", price=Decimal("2.00"), sku="PEN", brand="Ink")
+        self.variants = [
+            Variant.objects.create(product=product, sku=f"PEN-{n}", price=Decimal(n), stock=50)
+            for n in range(1, 7)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_login(self.user)
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list("variant__sku", "quantity"))
+
+    def graphql(self, query, **variables):
+        response = self.client.post("/graphql/", {"query": query, "variables": variables}, format="json")
+        return response.json()
+
+    def test_rest_rejects_a_second_line_for_the_same_variant(self):
+        first, second = self.variants[:2]
+        self.client.force_authenticate(self.user)
+        response = self.client.post("/api/cart-item/", {"variant": first.id, "quantity": 1, "price": "1.00"})
+        self.assertEqual(response.status_code, 201)
+        line = response.json()["id"]
+        self.client.post("/api/cart-item/", {"variant": second.id, "quantity": 1, "price": "2.00"})
+
+        response = self.client.post("/api/cart-item/", {"variant": first.id, "quantity": 2, "price": "1.00"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("variant", response.json())
+
+        response = self.client.patch(f"/api/cart-item/{line}/", {"variant": second.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {"PEN-1": 1, "PEN-2": 1})
+
+    def test_add_items_upserts_in_a_fixed_number_of_queries(self):
+        add_items(self.cart, {self.variants[0].id: 1})
+
+        with CaptureQueriesContext(connection) as few:
+            add_items(self.cart, {self.variants[0].id: 2, self.variants[1].id: 1})
+        with CaptureQueriesContext(connection) as many:
+            add_items(self.cart, {variant.id: 1 for variant in self.variants})
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(self.quantities(), {
+            "PEN-1": 4, "PEN-2": 2, "PEN-3": 1, "PEN-4": 1, "PEN-5": 1, "PEN-6": 1,
+        })
+
+    def test_unknown_variant_changes_nothing(self):
+        with self.assertRaises(CartError):
+            add_items(self.cart, {self.variants[0].id: 1, 999999: 1})
+        with self.assertRaises(CartError):
+            set_quantities(self.cart, {self.variants[0].id: -1})
+
+        self.assertEqual(self.quantities(), {})
+
+    def test_graphql_batched_mutations(self):
+        variant_ids = [variant.id for variant in self.variants[:3]]
+        added = self.graphql(
+            """mutation ($items: [CartItemInput!]!) {
+                addItemsToCart(items: $items) { summary { itemCount } }
+            }""",
+            items=[{"variantId": pk, "quantity": 2} for pk in variant_ids],
+        )
+        self.assertEqual(added["data"]["addItemsToCart"]["summary"]["itemCount"], 6)
+
+        self.graphql(
+            """mutation ($items: [CartItemInput!]!) { updateCartItems(items: $items) { id } }""",
+            items=[{"variantId": variant_ids[0], "quantity": 5}, {"variantId": variant_ids[1], "quantity": 0}],
+        )
+        self.assertEqual(self.quantities(), {"PEN-1": 5, "PEN-3": 2})
+
+        removed = self.graphql(
+            """mutation ($ids: [Int!]!) { removeCartItems(variantIds: $ids) { items { variantId } } }""",
+            ids=[variant_ids[2]],
+        )
+        self.assertEqual(removed["data"]["removeCartItems"]["items"], [{"variantId": variant_ids[0]}])
+
+
+class DiscountEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="saver", email="saver@example.com", password="x")
+        category = Category.objects.create(name="Audio")
+        self.speaker = Product.objects.create(
+            category=category, name="Speaker", price=Decimal("80.00"), sku="SPK", brand="Loud"
+        )
+        self.cable = Product.objects.create(
+            category=category, name="Cable", price=Decimal("5.00"), sku="CBL", brand="Loud"
+        )
+        self.speaker_variant = Variant.objects.create(
+            product=self.speaker, sku="SPK-1", price=Decimal("80.00"), stock=9
+        )
+        self.cable_variant = Variant.objects.create(product=self.cable, sku="CBL-1", price=Decimal("5.00"), stock=9)
+        self.percent = self.discount("AUDIO20", "percentage", "20", minimum="100.00", maximum="25.00")
+        self.fixed = self.discount("CABLE3", "fixed", "3", minimum="0")
+        ProductDiscount.objects.create(discount=self.percent, product=self.speaker)
+        ProductDiscount.objects.create(discount=self.percent, product=self.cable)
+        ProductDiscount.objects.create(discount=self.fixed, product=self.cable)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def discount(self, code, kind, value, minimum, maximum="0", **dates):
+        return Discount.objects.create(
+            code=code, description=code, discount_type=kind, value=Decimal(value),
+            minimum_purchase=Decimal(minimum), maximum_discount=Decimal(maximum), **dates,
+        )
+
+    def test_cart_gets_the_best_discount_above_its_minimum(self):
+        add_items(self.cart, {self.cable_variant.id: 2})
+        summary = cart_summary(self.cart)
+        self.assertEqual([d["code"] for d in summary["discounts"]], ["CABLE3"])
+        self.assertEqual(summary["total"], Decimal("7.00"))
+
+        add_items(self.cart, {self.speaker_variant.id: 1})
+        summary = cart_summary(self.cart)
+        # 20% of 90.00 is under the 100.00 minimum; a second speaker passes it and hits the cap.
+        self.assertEqual([d["code"] for d in summary["discounts"]], ["CABLE3"])
+
+        add_items(self.cart, {self.speaker_variant.id: 1})
+        summary = cart_summary(self.cart)
+        self.assertEqual(
+            [(d["code"], d["amount"]) for d in summary["discounts"]],
+            [("AUDIO20", Decimal("25.00")), ("CABLE3", Decimal("3.00"))],
+        )
+        self.assertEqual(summary["discount_total"], Decimal("25.00"))
+        self.assertEqual(summary["total"], Decimal("145.00"))
+
+    def test_discount_changes_reach_products_and_cached_summaries(self):
+        client = APIClient()
+        add_items(self.cart, {self.cable_variant.id: 1})
+        cart_summary(self.cart)
+        codes = [d["code"] for d in client.get(f"/api/product/{self.cable.id}/").json()["discounts"]]
+        self.assertEqual(codes, ["AUDIO20", "CABLE3"])
+        self.assertEqual(self.embedded_codes(client), ["AUDIO20", "CABLE3"])
+
+        self.fixed.is_active = False
+        self.fixed.save()
+
+        codes = [d["code"] for d in client.get(f"/api/product/{self.cable.id}/").json()["discounts"]]
+        self.assertEqual(codes, ["AUDIO20"])
+        self.assertEqual(self.embedded_codes(client), ["AUDIO20"])
+        self.assertEqual(cart_summary(self.cart)["discounts"], [])
+
+    def embedded_codes(self, client):
+        (category,) = client.get("/api/category/", {"include": "products"}).json()["results"]
+        cable = next(product for product in category["products"] if product["sku"] == "CBL")
+        return [discount["code"] for discount in cable["discounts"]]
+
+    def test_product_list_resolves_the_index_once(self):
+        with mock.patch("catalog.discounts.get_generation", wraps=get_generation) as generation:
+            rows = APIClient().get("/api/product/").json()["results"]
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(generation.call_count, 1)
+
+        with mock.patch("catalog.discounts.get_generation", wraps=get_generation) as generation:
+            body = APIClient().post(
+                "/graphql/", {"query": "{ products { discounts { code } } }"}, format="json"
+            ).json()
+
+        self.assertEqual(len(body["data"]["products"]), 2)
+        self.assertEqual(generation.call_count, 1)
+
+    def test_windows_limit_discounts_and_refresh_when_crossed(self):
+        now = timezone.now()
+        later = self.discount("SOON", "fixed", "1", minimum="0", start_date=now + timedelta(minutes=5))
+        ProductDiscount.objects.create(discount=later, product=self.speaker)
+        self.discount("OVER", "fixed", "1", minimum="0", end_date=now - timedelta(minutes=5))
+
+        self.assertEqual([rule.code for rule in current_index().for_product(self.speaker.id)], ["AUDIO20"])
+
+        refresh_windows(now)
+        generations = [get_generation("discounts"), get_generation("categories")]
+        self.assertEqual(refresh_windows(now + timedelta(minutes=1)), [])
+        self.assertEqual(refresh_windows(now + timedelta(minutes=6)), [later.id])
+        self.assertNotEqual(get_generation("discounts"), generations[0])
+        self.assertNotEqual(get_generation("categories"), generations[1])
+        self.assertEqual(
+            [rule.code for rule in current_index().for_product(self.speaker.id, now + timedelta(minutes=6))],
+            ["AUDIO20", "SOON"],
+        )
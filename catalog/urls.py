@@ -5,6 +5,7 @@ from .views import (
     ProductViewSet,
     VariantViewSet,
     InventoryViewSet,
+    InventoryMovementViewSet,
     DiscountViewSet,
     ProductDiscountViewSet,
     WishlistItemViewSet,
@@ -19,6 +20,7 @@ router.register(r"category", CategoryViewSet, basename="category")
 router.register(r"product", ProductViewSet, basename="product")
 router.register(r"variant", VariantViewSet, basename="variant")
 router.register(r"inventory", InventoryViewSet, basename="inventory")
+router.register(r"inventory-movement", InventoryMovementViewSet, basename="inventorymovement")
 router.register(r"discount", DiscountViewSet, basename="discount")
 router.register(r"product-discount", ProductDiscountViewSet, basename="productdiscount")
 router.register(r"wishlist", WishlistViewSet, basename="wishlist")
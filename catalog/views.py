@@ -1,44 +1,84 @@
-from rest_framework import viewsets
+from collections import Counter
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, CharField, Count, F, Prefetch, Q, Value, When
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
 from users.permissions import IsAdmin, IsCustomer, IsVendor
-from utils.mixins import AuthenticatedQuerysetMixin, CachedQuerysetMixin
-from utils.pagination import DefaultPagination
+from utils.cache import get_generation
+from utils.mixins import (
+    AuthenticatedQuerysetMixin,
+    CachedDetailMixin,
+    CachedQuerysetMixin,
+    SparseFieldsetMixin,
+    StreamingExportMixin,
+)
+from utils.pagination import (
+    ApproximateCountPagination,
+    DefaultPagination,
+    KeysetPagination,
+    OptionalKeysetPagination,
+)
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
 from .models import (
     Category, Product, Variant, Cart, CartItem, Wishlist,
-    WishlistItem, Discount, ProductDiscount, Inventory,
+    WishlistItem, Discount, ProductDiscount, Inventory, InventoryMovement,
+)
+from .carts import cart_summary, user_cart
+from .inventory import with_levels
+from .reservations import (
+    InsufficientStock,
+    ReservationError,
+    contention_stats,
+    release_cart,
+    reserve_cart,
 )
 from .serializers import (
+    CategoryBreadcrumbSerializer,
     CategorySerializer,
+    CategorySummarySerializer,
     ProductSerializer,
     VariantSerializer,
     CartSerializer,
     CartItemSerializer,
+    CartSummarySerializer,
     WishlistSerializer,
     WishlistItemSerializer,
     DiscountSerializer,
     ProductDiscountSerializer,
     InventorySerializer,
+    InventoryMovementSerializer,
+    StockReservationSerializer,
 )
+import hashlib
+import json
 
 
-class CategoryViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetMixin, CachedQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing product categories.
     Supports nested retrieval of child categories and related products.
+    Subtrees are loaded in one query through the materialized path.
+
+    The list is slim: product figures are aggregated in SQL and products
+    are only embedded with ``?include=products``, at most
+    ``products_limit`` (default 5, max 20) per category. ``?include=children``
+    adds each category's subtree, loaded through the materialized path.
     """
 
-    queryset = Category.objects.all().prefetch_related(
-        "children",
-        "products",
-        "products__variant_set",
-    )
+    queryset = Category.objects.all().prefetch_related("products")
     serializer_class = CategorySerializer
     pagination_class = DefaultPagination
+    sparse_required_fields = ("path", "parent_id")
+    products_preview_limit = 5
+    products_preview_max = 20
 
     cache_prefix = "categories"
-    cache_timeout = 60 * 30
+    cache_timeout = 60 * 60 * 12
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["parent_id", "name"]
@@ -46,53 +86,286 @@ class CategoryViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
     ordering = ["name"]
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "ancestors", "products"]:
             return [AllowAny()]
         return [IsAuthenticated(), IsAdmin()]
 
-
-class ProductViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
+    def includes(self, name):
+        include = self.request.query_params.get("include", "")
+        return name in include.split(",")
+
+    def products_limit(self):
+        try:
+            limit = int(self.request.query_params["products_limit"])
+        except (KeyError, ValueError):
+            return self.products_preview_limit
+        return max(1, min(limit, self.products_preview_max))
+
+    def get_queryset(self):
+        if self.action != "list":
+            return super().get_queryset()
+
+        queryset = Category.objects.with_product_stats()
+        if self.includes("products"):
+            # A sliced Prefetch keeps at most products_limit rows per category.
+            preview = Product.objects.filter(is_active=True).order_by("-date_added", "-id")
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "products",
+                    queryset=preview[: self.products_limit()],
+                    to_attr="preview_products",
+                )
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return CategorySummarySerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        listing = self.action == "list"
+        context["include_products"] = listing and self.includes("products")
+        context["include_children"] = listing and self.includes("children")
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.includes("children"):
+            Category.objects.attach_subtrees(page, "products")
+        return page
+
+    def get_object(self):
+        category = super().get_object()
+        if self.action == "retrieve":
+            Category.objects.attach_subtrees([category], "products")
+        return category
+
+    @action(detail=True, methods=["get"])
+    def ancestors(self, request, pk=None):
+        """
+        Breadcrumbs from the root down to this category.
+        """
+        def build():
+            ancestors = self.get_object().get_ancestors(include_self=True)
+            return CategoryBreadcrumbSerializer(
+                ancestors, many=True, context=self.get_serializer_context()
+            ).data
+
+        return self.cached_action_response(request, build)
+
+    @action(detail=True, methods=["get"])
+    def products(self, request, pk=None):
+        """
+        Products of this category and all of its descendants.
+        """
+        def build():
+            queryset = self.get_object().get_subtree_products()
+            paginator = KeysetPagination()
+            paginator.ordering = ["-date_added"]
+            page = paginator.paginate_queryset(queryset, request)
+            data = ProductSerializer(
+                page, many=True, context=self.get_serializer_context()
+            ).data
+            return paginator.get_paginated_response(data).data
+
+        return self.cached_action_response(request, build)
+
+
+class ProductViewSet(SparseFieldsetMixin, StreamingExportMixin, CachedDetailMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing products.
     Prefetches variants and selects related category for optimization.
+    Detail pages are cached per product id; see CachedDetailMixin.
+    Lists are paged by number, or with ``?cursor=`` by keyset, so deep
+    pages cost the same as the first.
+    Admins can stream the whole catalog with its variants from export/.
     """
 
     queryset = (
         Product.objects.all()
+        # The search vector is only ever used inside SQL; never load it.
+        .defer("search_vector")
         .select_related("category")
         .prefetch_related("variant_set")
     )
     serializer_class = ProductSerializer
-    pagination_class = DefaultPagination
+    pagination_class = OptionalKeysetPagination
     lookup_field = "id"
 
     cache_prefix = "products"
-    cache_timeout = 60 * 20
+    cache_timeout = 60 * 60 * 6
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ["category", "brand", "is_active"]
-    ordering_fields = ["price", "date_added", "name", "id"]
+    filterset_fields = {
+        "category": ["exact"],
+        "brand": ["exact"],
+        "is_active": ["exact"],
+        "min_variant_price": ["gte", "lte"],
+        "max_variant_price": ["gte", "lte"],
+        "total_variant_stock": ["gte", "lte"],
+    }
+    ordering_fields = [
+        "price", "date_added", "name", "id",
+        "min_variant_price", "max_variant_price", "total_variant_stock",
+    ]
     ordering = ["-date_added"]
+    facet_price_edges = [0, 25, 50, 100, 250, 500, 1000]
+
+    export_fields = [
+        "id", "sku", "name", "brand", "category_id", "category__name",
+        "price", "is_active", "date_added",
+    ]
+    export_children = ("variants", "variant_set", ["id", "sku", "variant_name", "price", "stock"])
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "bulk", "search", "facets"]:
             return [AllowAny()]
         return [IsAuthenticated(), IsAdmin()]
 
-
-class VariantViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
+    def search_queryset(self, queryset, terms, ranked=True):
+        if connection.vendor != "postgresql":
+            # No tsvector outside PostgreSQL; good enough for development.
+            matches = Q()
+            for term in terms.split():
+                matches &= (
+                    Q(name__icontains=term)
+                    | Q(description__icontains=term)
+                    | Q(brand__icontains=term)
+                    | Q(variant__variant_name__icontains=term)
+                )
+            return queryset.filter(pk__in=Product.objects.filter(matches).values("pk"))
+
+        query = SearchQuery(terms, config=Product.search_config, search_type="websearch")
+        queryset = queryset.filter(search_vector=query)
+        if ranked:
+            queryset = queryset.annotate(rank=SearchRank(F("search_vector"), query))
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Ranked full-text search over name, brand, variant names and description.
+
+        ``?q=`` uses web search syntax ("red shoes", -leather, "exact phrase");
+        the usual filters apply on top, and ``?ordering=`` overrides the rank.
+        """
+        terms = request.query_params.get("q", "").strip()
+        if not terms:
+            raise ValidationError({"q": "This parameter is required."})
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        queryset = self.search_queryset(queryset, terms)
+
+        ordering = OrderingFilter().get_ordering(request, queryset, self)
+        if "ordering" not in request.query_params and connection.vendor == "postgresql":
+            ordering = ["-rank", "-id"]
+        queryset = queryset.order_by(*ordering)
+
+        paginator = ApproximateCountPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def facet_filters(self, request):
+        """
+        The filters that shape facet counts, normalized so equivalent
+        requests share one cache entry.
+        """
+        filterset = DjangoFilterBackend().get_filterset_class(self, Product.objects.all())
+        filters = {}
+        for name in [*filterset.base_filters, "q"]:
+            value = request.query_params.get(name, "").strip()
+            if value:
+                filters[name] = " ".join(value.split()).lower() if name == "q" else value
+        return filters
+
+    def price_bucket(self):
+        edges = self.facet_price_edges
+        whens = [
+            When(price__lt=upper, then=Value(f"{lower}-{upper}"))
+            for lower, upper in zip(edges, edges[1:])
+        ]
+        return Case(*whens, default=Value(f"{edges[-1]}+"), output_field=CharField())
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """
+        Product counts by brand, category and price bucket for the current
+        filters (and ``?q=`` search), from a single grouped query.
+        """
+        filters = self.facet_filters(request)
+        raw = json.dumps(filters, sort_keys=True)
+        prefix = self.get_cache_prefix()
+        # Category names are part of the payload, so renames count too.
+        cache_key = (
+            f"{prefix}:{get_generation(prefix)}:{get_generation('categories')}:facets:"
+            f"{hashlib.md5(raw.encode()).hexdigest()}"
+        )
+
+        def build():
+            queryset = DjangoFilterBackend().filter_queryset(
+                request, Product.objects.all(), self
+            )
+            if "q" in filters:
+                queryset = self.search_queryset(queryset, filters["q"], ranked=False)
+
+            rows = (
+                queryset.annotate(price_bucket=self.price_bucket())
+                .values("brand", "category", "category__name", "price_bucket")
+                .annotate(count=Count("id"))
+                .order_by()
+            )
+
+            brands, categories, prices = Counter(), Counter(), Counter()
+            names = {}
+            for row in rows:
+                brands[row["brand"]] += row["count"]
+                categories[row["category"]] += row["count"]
+                prices[row["price_bucket"]] += row["count"]
+                names[row["category"]] = row["category__name"]
+
+            edges = self.facet_price_edges
+            labels = [f"{lower}-{upper}" for lower, upper in zip(edges, edges[1:])]
+            labels.append(f"{edges[-1]}+")
+            data = {
+                "filters": filters,
+                "total": sum(brands.values()),
+                "brand": [
+                    {"value": brand, "count": count}
+                    for brand, count in brands.most_common()
+                ],
+                "category": [
+                    {"id": category, "name": names[category], "count": count}
+                    for category, count in categories.most_common()
+                ],
+                "price": [
+                    {"value": label, "count": prices[label]}
+                    for label in labels
+                    if prices[label]
+                ],
+            }
+            return data, True
+
+        entry, status = self.get_cached_entry(cache_key, build)
+        return self.cached_response(request, entry, status)
+
+
+class VariantViewSet(SparseFieldsetMixin, CachedDetailMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing product variants.
     Selects related product to optimize queries.
+    Detail pages are cached per SKU; see CachedDetailMixin.
     """
 
     queryset = Variant.objects.all().select_related("product")
     serializer_class = VariantSerializer
-    pagination_class = DefaultPagination
+    pagination_class = ApproximateCountPagination
     lookup_field = "sku"
 
     cache_prefix = "variants"
-    cache_timeout = 60 * 10
+    cache_timeout = 60 * 60 * 6
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["product", "sku"]
@@ -100,20 +373,64 @@ class VariantViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
     ordering = ["-id"]
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "bulk"]:
             return [AllowAny()]
         return [IsAuthenticated(), IsAdmin()]
 
+    @action(detail=False, methods=["get"])
+    def contention(self, request):
+        """
+        Variants whose stock reservations fail most often.
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), 100)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        return Response(contention_stats(limit))
+
 
 class CartViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing user shopping carts.
+    summary/ returns the cart's totals; reserve/ and release/ hold and give
+    back stock for checkout.
     """
 
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None):
+        """
+        Item count, subtotal, applicable discounts and stock warnings.
+        """
+        return Response(CartSummarySerializer(cart_summary(self.get_object())).data)
+
+    @action(detail=True, methods=["post"])
+    def reserve(self, request, pk=None):
+        """
+        Hold stock for every item in the cart until ``expires_at``. Answers
+        409 with the units still available when something runs short.
+        """
+        try:
+            holds = reserve_cart(self.get_object())
+        except InsufficientStock as exc:
+            return Response(
+                {"detail": "Not enough stock.", "available": exc.shortages},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ReservationError as exc:
+            raise ValidationError({"detail": str(exc)})
+        return Response(
+            StockReservationSerializer(holds, many=True).data, status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=["post"])
+    def release(self, request, pk=None):
+        released = release_cart(self.get_object())
+        return Response({"released": released})
+
 
 class CartItemViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     """
@@ -131,9 +448,20 @@ class CartItemViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     ordering_fields = ["quantity", "price"]
     ordering = ["-created_at"]
 
+    def save_line(self, serializer, **kwargs):
+        # The unique (cart, variant) constraint is the only reliable check:
+        # a lookup first would race concurrent requests for the same line.
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise ValidationError({"variant": "Already in the cart; update its quantity instead."})
+
     def perform_create(self, serializer):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        serializer.save(cart=cart)
+        self.save_line(serializer, cart=user_cart(self.request.user))
+
+    def perform_update(self, serializer):
+        self.save_line(serializer)
 
 
 class WishlistViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
@@ -186,17 +514,44 @@ class ProductDiscountViewSet(viewsets.ModelViewSet):
 
 
 
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """
-    ViewSet for managing inventory of variants.
-    Selects related variant to optimize queries.
+    Current stock levels per variant, read from the ledger snapshot plus
+    its uncompacted tail. Changes go through inventory-movement/.
+    Admins can stream every level from export/.
     """
 
-    queryset = Inventory.objects.all().select_related("variant")
+    queryset = with_levels(Inventory.objects.all().select_related("variant"))
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated, (IsAdmin | IsVendor)]
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["variant"]
-    ordering_fields = ["quantity", "updated_at"]
+    ordering_fields = ["on_hand", "available", "updated_at"]
     ordering = ["-updated_at"]
+
+    export_fields = [
+        "id", "variant_id", "variant__sku", "variant__product_id", "on_hand", "available",
+        "updated_at",
+    ]
+
+
+class InventoryMovementViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    The append-only inventory ledger: movement history (keyset paginated,
+    newest first) and recording receipts, sales, returns and adjustments.
+    """
+
+    queryset = InventoryMovement.objects.all()
+    serializer_class = InventoryMovementSerializer
+    permission_classes = [IsAuthenticated, (IsAdmin | IsVendor)]
+    pagination_class = KeysetPagination
+
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["variant", "kind"]
+    ordering = ["-id"]
@@ -152,12 +152,53 @@ STATIC_URL = 'static/'
 STATIC_ROOT = str(BASE_DIR / 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+MEDIA_URL = os.getenv("MEDIA_URL", "/media/")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / 'media'))
+
+# Product and variant images are resized to these widths and formats in the
+# background (see catalog.images); the originals are left as uploaded.
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1280]
+IMAGE_DERIVATIVE_FORMATS = ["webp", "jpeg"]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 
+# ----- CACHE SETTINGS -----
+# Shared Redis tier with a small per-process LRU in front of it for the hot
+# catalog keys (see utils.cache_backends). Without REDIS_CACHE_URL each
+# process falls back to its own LocMemCache.
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL")
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "utils.cache_backends.TwoTierRedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+            "OPTIONS": {
+                "LOCAL_PREFIXES": ["categories:", "products:", "variants:"],
+                "LOCAL_MAX_ENTRIES": 256,
+                "LOCAL_TIMEOUT": 30,
+            },
+        }
+    }
+
+# Fraction of cached requests recorded for the cache warmer's hit statistics.
+CACHE_STATS_SAMPLE_RATE = float(os.getenv("CACHE_STATS_SAMPLE_RATE", "0.05"))
+
+# Seconds a checkout may hold stock before the sweeper gives it back.
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 15 * 60))
+
+# Seconds a cached cart summary may lag behind price and stock changes;
+# changes to the cart's own items evict it at once (see catalog.carts).
+CART_SUMMARY_TIMEOUT = int(os.getenv("CART_SUMMARY_TIMEOUT", 60))
+
+# Order numbers each process leases from the sequence at a time (see
+# order.numbering); unused numbers are lost when the process exits.
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv("ORDER_NUMBER_BLOCK_SIZE", 20))
+
 # ----- CELERY SETTINGS -----
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
@@ -176,6 +217,22 @@ CELERY_BEAT_SCHEDULE = {
         "task": "monitoring.tasks.run_all_checks",
         "schedule": crontab(minute="*/1")
     },
+    "warm-catalog-cache-every-15-minutes": {
+        "task": "catalog.tasks.warm_catalog_cache",
+        "schedule": crontab(minute="*/15"),
+    },
+    "sweep-expired-reservations-every-minute": {
+        "task": "catalog.tasks.sweep_expired_reservations",
+        "schedule": crontab(minute="*/1"),
+    },
+    "compact-inventory-ledger-every-5-minutes": {
+        "task": "catalog.tasks.compact_inventory_ledger",
+        "schedule": crontab(minute="*/5"),
+    },
+    "refresh-discount-windows-every-minute": {
+        "task": "catalog.tasks.refresh_discount_windows",
+        "schedule": crontab(minute="*/1"),
+    },
 }
 
 SWAGGER_SETTINGS = {
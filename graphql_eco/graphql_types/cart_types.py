@@ -1,5 +1,6 @@
 import strawberry
 from typing import List
+from catalog.carts import cart_summary
 from catalog.models import Cart, CartItem
 from strawberry import django as strawberry_django
 
@@ -12,10 +13,53 @@ class CartItemType:
     variant_id: int
 
 
+@strawberry.type
+class CartDiscountType:
+    id: int
+    code: str
+    description: str
+    products: List[int]
+    amount: float
+
+
+@strawberry.type
+class StockWarningType:
+    variant: int
+    requested: int
+    available: int
+
+
+@strawberry.type
+class CartSummaryType:
+    line_count: int
+    item_count: int
+    subtotal: float
+    discounts: List[CartDiscountType]
+    discount_total: float
+    total: float
+    stock_warnings: List[StockWarningType]
+
+
 @strawberry_django.type(Cart)
 class CartType:
     id: strawberry.ID
 
     @strawberry.field
     def items(self) -> List[CartItemType]:
-        return list(self.cartitem_set.all())
+        return list(CartItem.objects.filter(cart=self))
+
+    @strawberry.field
+    def summary(self) -> CartSummaryType:
+        summary = cart_summary(self)
+        return CartSummaryType(
+            line_count=summary["line_count"],
+            item_count=summary["item_count"],
+            subtotal=float(summary["subtotal"]),
+            discounts=[
+                CartDiscountType(**{**discount, "amount": float(discount["amount"])})
+                for discount in summary["discounts"]
+            ],
+            discount_total=float(summary["discount_total"]),
+            total=float(summary["total"]),
+            stock_warnings=[StockWarningType(**warning) for warning in summary["stock_warnings"]],
+        )
@@ -29,9 +29,9 @@ class OrderType:
     id: strawberry.ID
     user_id: int
     address_id: int
-    order_number: str
+    order_number: int
     total_amount: float
-    payment_status: str
+    status: str
     order_date: str
     shipped_date: Optional[str]
     payment_method: str
@@ -42,4 +42,4 @@ class OrderType:
 
     @strawberry.field
     def shipment(self) -> Optional[ShipmentType]:
-        return getattr(self, "shipment", None)
+        return next(iter(self.orders.all()), None)
@@ -1,6 +1,8 @@
 import strawberry
 from typing import List, Optional
 from strawberry import django as strawberry_django
+from catalog.discounts import product_discounts, request_index
+from catalog.images import srcset
 from catalog.models import Product, Variant, Category
 
 
@@ -13,17 +15,63 @@ class VariantType:
     stock: int
     image_url: Optional[str]
 
+    @strawberry.field
+    def image_srcset(self, format: str = "webp") -> Optional[str]:
+        """
+        ``srcset`` of the resized copies in ``format`` (webp or jpeg), null
+        until they have been generated.
+        """
+        return srcset(self.image_derivatives, format)
+
 
 @strawberry_django.type(Category)
 class CategoryType:
     id: strawberry.ID
     name: str
-    parent: Optional["CategoryType"]
+    depth: int
+
+    @strawberry.field
+    def parent(self) -> Optional["CategoryType"]:
+        return self.parent_id
 
     @strawberry.field
     def children(self) -> List["CategoryType"]:
         return list(self.children.all())
 
+    @strawberry.field
+    def ancestors(self) -> List["CategoryType"]:
+        """
+        Breadcrumbs from the root down to the parent of this category.
+        """
+        return list(self.get_ancestors())
+
+    @strawberry.field
+    def descendants(self) -> List["CategoryType"]:
+        return list(self.get_descendants().order_by("path"))
+
+    @strawberry.field
+    def subtree_products(self) -> List["ProductType"]:
+        """
+        Products of this category and all of its descendants.
+        """
+        return list(
+            self.get_subtree_products()
+            .select_related("category")
+            .prefetch_related("variant_set")
+        )
+
+
+@strawberry.type
+class ProductDiscountType:
+    id: int
+    code: str
+    description: str
+    discount_type: str
+    value: float
+    minimum_purchase: float
+    maximum_discount: float
+    end_date: Optional[str]
+
 
 @strawberry_django.type(Product)
 class ProductType:
@@ -34,7 +82,33 @@ class ProductType:
     brand: str
     image_url: Optional[str]
     category: CategoryType
+    min_variant_price: Optional[float]
+    max_variant_price: Optional[float]
+    total_variant_stock: int
+
+    @strawberry.field
+    def image_srcset(self, format: str = "webp") -> Optional[str]:
+        return srcset(self.image_derivatives, format)
 
     @strawberry.field
     def variants(self) -> List[VariantType]:
         return list(self.variant_set.all())
+
+    @strawberry.field
+    def discounts(self, info) -> List[ProductDiscountType]:
+        """
+        Discounts running on this product now.
+        """
+        return [
+            ProductDiscountType(
+                id=rule["id"],
+                code=rule["code"],
+                description=rule["description"],
+                discount_type=rule["discount_type"],
+                value=float(rule["value"]),
+                minimum_purchase=float(rule["minimum_purchase"]),
+                maximum_discount=float(rule["maximum_discount"]),
+                end_date=rule["end_date"].isoformat() if rule["end_date"] else None,
+            )
+            for rule in product_discounts(self.pk, request_index(info.context.request))
+        ]
@@ -1,5 +1,30 @@
 import strawberry
-from catalog.models import Cart, CartItem, Variant
+from collections import Counter
+from typing import List
+from catalog.carts import CartError, add_items, remove_items, set_quantities, user_cart
+from catalog.models import CartItem
+from graphql_eco.graphql_types.cart_types import CartType
+
+
+@strawberry.input
+class CartItemInput:
+    variant_id: int
+    quantity: int
+
+
+def current_cart(info):
+    user = info.context.request.user
+    if not user.is_authenticated:
+        raise Exception("Login required")
+    return user_cart(user)
+
+
+def apply(change, cart, *args):
+    try:
+        change(cart, *args)
+    except CartError as exc:
+        raise Exception(str(exc))
+    return cart
 
 
 @strawberry.type
@@ -7,26 +32,33 @@ class CartMutation:
 
     @strawberry.mutation
     def add_to_cart(self, info, variant_id: int, quantity: int) -> bool:
-        user = info.context.request.user
-        if not user.is_authenticated:
-            raise Exception("Login required")
-
-        cart, _ = Cart.objects.get_or_create(user=user)
-        variant = Variant.objects.get(id=variant_id)
+        apply(add_items, current_cart(info), {variant_id: quantity})
+        return True
 
-        item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            variant=variant,
-            defaults={"quantity": quantity, "price": variant.price},
-        )
+    @strawberry.mutation
+    def remove_cart_item(self, info, item_id: int) -> bool:
+        cart = current_cart(info)
+        CartItem.objects.filter(id=item_id, cart=cart).delete()
+        return True
 
-        if not created:
-            item.quantity += quantity
-            item.save()
+    @strawberry.mutation
+    def add_items_to_cart(self, info, items: List[CartItemInput]) -> CartType:
+        """
+        Add every item in one go; quantities add to what the cart holds.
+        """
+        quantities = Counter()
+        for item in items:
+            quantities[item.variant_id] += item.quantity
+        return apply(add_items, current_cart(info), dict(quantities))
 
-        return True
+    @strawberry.mutation
+    def update_cart_items(self, info, items: List[CartItemInput]) -> CartType:
+        """
+        Set the quantity of each item; 0 removes it.
+        """
+        quantities = {item.variant_id: item.quantity for item in items}
+        return apply(set_quantities, current_cart(info), quantities)
 
     @strawberry.mutation
-    def remove_cart_item(self, item_id: int) -> bool:
-        CartItem.objects.filter(id=item_id).delete()
-        return True
+    def remove_cart_items(self, info, variant_ids: List[int]) -> CartType:
+        return apply(remove_items, current_cart(info), variant_ids)
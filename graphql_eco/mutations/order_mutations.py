@@ -1,39 +1,41 @@
 import strawberry
-from order.models import Order, OrderItem, Shipment
-from users.models import User
+from catalog.reservations import InsufficientStock
+from order.services import checkout
 from graphql_eco.graphql_types.order_types import OrderType
 
+
+def checkout_cart(info, address_id, payment_method):
+    user = info.context.request.user
+    if not user.is_authenticated:
+        raise Exception("Authentication required")
+
+    try:
+        return checkout(user, address_id, payment_method)
+    except InsufficientStock as exc:
+        raise Exception(
+            "Not enough stock for variants " + ", ".join(map(str, exc.shortages))
+        )
+
+
 @strawberry.type
 class OrderMutation:
     @strawberry.mutation
-    def create_order(
+    def checkout(
         self,
         info,
         address_id: int,
         payment_method: str
     ) -> OrderType:
-        user = info.context["request"].user
-        if not user.is_authenticated:
-            raise Exception("Authentication required")
+        """
+        Place an order for everything in the user's cart, in one transaction.
+        """
+        return checkout_cart(info, address_id, payment_method)
 
-        order = Order.objects.create(
-            user=user,
-            address_id=address_id,
-            order_number=f"ORD-{user.id}-{Order.objects.count() + 1}",
-            total_amount=0.0, 
-            payment_status="PENDING",
-            payment_method=payment_method
-        )
-        return OrderType(
-            id=order.id,
-            user_id=order.user_id,
-            address_id=order.address_id,
-            order_number=order.order_number,
-            total_amount=float(order.total_amount),
-            payment_status=order.payment_status,
-            order_date=str(order.order_date),
-            shipped_date=None,
-            payment_method=order.payment_method,
-            items=[],
-            shipment=None
-        )
\ No newline at end of file
+    @strawberry.mutation(deprecation_reason="Use checkout, which also creates the items.")
+    def create_order(
+        self,
+        info,
+        address_id: int,
+        payment_method: str
+    ) -> OrderType:
+        return checkout_cart(info, address_id, payment_method)
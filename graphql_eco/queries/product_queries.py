@@ -1,5 +1,7 @@
 import strawberry
+from enum import Enum
 from typing import List, Optional
+from django.db.models import F
 from catalog.models import Product, Category, Variant
 from graphql_eco.graphql_types.product_types import (
     ProductType,
@@ -8,13 +10,30 @@ from graphql_eco.graphql_types.product_types import (
 )
 
 
+@strawberry.enum
+class ProductOrdering(Enum):
+    NEWEST = "-date_added"
+    CHEAPEST = "min_variant_price"
+    PRICIEST = "-max_variant_price"
+    MOST_STOCK = "-total_variant_stock"
+
+
 @strawberry.type
 class ProductQuery:
 
     @strawberry.field
-    def products(self, info, category_id: Optional[int] = None) -> List[ProductType]:
+    def products(
+        self,
+        info,
+        category_id: Optional[int] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        order_by: Optional[ProductOrdering] = None,
+    ) -> List[ProductType]:
         """
-        Fetch all products, optionally filtered by category.
+        Fetch all products, optionally filtered by category, by the price
+        range of their in-stock variants or by availability.
         """
         queryset = (
             Product.objects.all()
@@ -23,6 +42,21 @@ class ProductQuery:
         )
         if category_id:
             queryset = queryset.filter(category_id=category_id)
+        if min_price is not None:
+            queryset = queryset.filter(max_variant_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(min_variant_price__lte=max_price)
+        if in_stock is not None:
+            if in_stock:
+                queryset = queryset.filter(total_variant_stock__gt=0)
+            else:
+                queryset = queryset.filter(total_variant_stock=0)
+        if order_by is not None:
+            field = F(order_by.value.lstrip("-"))
+            if order_by.value.startswith("-"):
+                queryset = queryset.order_by(field.desc(nulls_last=True), "-id")
+            else:
+                queryset = queryset.order_by(field.asc(nulls_last=True), "-id")
         return queryset
 
     @strawberry.field
@@ -42,16 +76,18 @@ class ProductQuery:
     @strawberry.field
     def categories(self, info) -> List[CategoryType]:
         """
-        Fetch all categories.
+        Fetch all categories, with their children loaded in one query.
         """
-        return Category.objects.all()
+        return Category.objects.attach_subtrees(Category.objects.all())
 
     @strawberry.field
     def category(self, info, category_id: int) -> Optional[CategoryType]:
         """
-        Fetch a single category by ID.
+        Fetch a single category by ID, with its whole subtree.
         """
         try:
-            return Category.objects.get(id=category_id)
+            category = Category.objects.get(id=category_id)
         except Category.DoesNotExist:
             return None
+        Category.objects.attach_subtrees([category])
+        return category
@@ -0,0 +1,481 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, migrations, models, transaction
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from itertools import combinations
+from rest_framework.test import force_authenticate
+import hashlib
+import json
+import random
+import uuid
+
+SORT_NODES = ("Sort", "Incremental Sort")
+
+
+def registered_viewsets(patterns=None):
+    """
+    Return the viewsets routed with a ``list`` action, in URL order.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+
+    found = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            found.extend(
+                viewset
+                for viewset in registered_viewsets(pattern.url_patterns)
+                if viewset not in found
+            )
+        elif isinstance(pattern, URLPattern):
+            viewset = getattr(pattern.callback, "cls", None)
+            actions = getattr(pattern.callback, "actions", None) or {}
+            if (
+                actions.get("get") == "list"
+                and getattr(viewset, "queryset", None) is not None
+                and viewset not in found
+            ):
+                found.append(viewset)
+    return found
+
+
+class Probe:
+    """
+    One request to run against a viewset: an action plus query params.
+    """
+
+    def __init__(self, viewset, action="list", params=None, kwargs=None):
+        self.viewset = viewset
+        self.action = action
+        self.params = params or {}
+        self.kwargs = kwargs or {}
+
+    @property
+    def model(self):
+        return self.viewset.queryset.model
+
+    @property
+    def filters(self):
+        return {key: value for key, value in self.params.items() if key != "ordering"}
+
+    @property
+    def ordering(self):
+        if "ordering" in self.params:
+            return [self.params["ordering"]]
+        ordering = getattr(self.viewset, "ordering", None) or []
+        return [ordering] if isinstance(ordering, str) else list(ordering)
+
+    def __str__(self):
+        query = "&".join(f"{key}={value}" for key, value in self.params.items())
+        lookup = ",".join(str(value) for value in self.kwargs.values())
+        target = f"{self.action}({lookup})" if lookup else self.action
+        return f"{self.viewset.__name__}.{target}" + (f"?{query}" if query else "")
+
+
+def _sample(model, field):
+    value = (
+        model._default_manager.exclude(**{f"{field}__isnull": True})
+        .values_list(field, flat=True)
+        .first()
+    )
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return None if value is None else str(value)
+
+
+def probes_for(viewset, max_filters=2):
+    """
+    Build probes for the default list, every filter combination of up to
+    ``max_filters`` fields crossed with every ordering, and non-pk lookups.
+    """
+    model = viewset.queryset.model
+    filter_fields = list(getattr(viewset, "filterset_fields", None) or [])
+    ordering_fields = getattr(viewset, "ordering_fields", None)
+    if not isinstance(ordering_fields, (list, tuple)):
+        ordering_fields = []
+
+    samples = {field: _sample(model, field) for field in filter_fields}
+    filter_fields = [field for field in filter_fields if samples[field] is not None]
+
+    orderings = [None]
+    for field in ordering_fields:
+        orderings += [field, f"-{field}"]
+
+    probes = []
+    for size in range(max_filters + 1):
+        for fields in combinations(filter_fields, size):
+            for ordering in orderings:
+                params = {field: samples[field] for field in fields}
+                if ordering:
+                    params["ordering"] = ordering
+                probes.append(Probe(viewset, params=params))
+
+    lookup = getattr(viewset, "lookup_field", "pk")
+    if lookup not in ("pk", model._meta.pk.name):
+        value = _sample(model, lookup)
+        if value is not None:
+            kwarg = getattr(viewset, "lookup_url_kwarg", None) or lookup
+            probes.append(Probe(viewset, "retrieve", kwargs={kwarg: value}))
+    return probes
+
+
+def run_probe(probe, user, factory=None):
+    """
+    Run a probe through its viewset and return the SELECTs it issued.
+    """
+    factory = factory or RequestFactory()
+    request = factory.get("/", probe.params)
+    force_authenticate(request, user=user)
+    view = probe.viewset.as_view({"get": probe.action})
+
+    with CaptureQueriesContext(connection) as queries:
+        response = view(request, **probe.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    return [
+        query["sql"]
+        for query in queries.captured_queries
+        if query["sql"].lstrip().upper().startswith("SELECT")
+    ]
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from walk(child)
+
+
+def table_sizes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r'"
+        )
+        return dict(cursor.fetchall())
+
+
+def find_problems(plan, sizes, min_rows):
+    """
+    Return ``(node type, table, detail)`` for sequential scans of tables
+    with at least ``min_rows`` rows and for sorts fed by such tables.
+    """
+    problems = []
+    for node in walk(plan):
+        kind = node["Node Type"]
+        if kind == "Seq Scan":
+            table = node.get("Relation Name")
+            if sizes.get(table, 0) >= min_rows:
+                problems.append((kind, table, node.get("Filter", "")))
+        elif kind in SORT_NODES:
+            tables = [scan.get("Relation Name") for scan in walk(node)]
+            large = [table for table in tables if table and sizes.get(table, 0) >= min_rows]
+            if large:
+                problems.append((kind, large[0], ", ".join(node.get("Sort Key", ()))))
+    return problems
+
+
+class Proposal:
+    """
+    A candidate index on ``model``: equality columns first, then ordering
+    columns, optionally partial on boolean filters.
+    """
+
+    def __init__(self, model, fields, condition=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.condition = condition
+        self.reasons = []
+
+    @property
+    def key(self):
+        return (self.model._meta.label, self.fields, str(self.condition))
+
+    @property
+    def name(self):
+        digest = hashlib.md5(repr(self.key).encode()).hexdigest()[:8]
+        return f"{self.model._meta.model_name[:12]}_{digest}_idx"
+
+    def index(self):
+        kwargs = {"condition": self.condition} if self.condition else {}
+        return models.Index(fields=list(self.fields), name=self.name, **kwargs)
+
+    def __str__(self):
+        where = f" WHERE {self.condition}" if self.condition else ""
+        return f"{self.model._meta.label}({', '.join(self.fields)}){where}"
+
+
+def _local_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.concrete and not field.many_to_many else None
+
+
+def existing_indexes(model):
+    """
+    Column lists already indexed on ``model`` (full indexes only).
+    """
+    indexed = [(model._meta.pk.name,)]
+    for field in model._meta.concrete_fields:
+        if field.db_index or field.unique:
+            indexed.append((field.name,))
+    for index in model._meta.indexes:
+        if index.condition is None and index.fields:
+            indexed.append(tuple(name.lstrip("-") for name in index.fields))
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.condition is None:
+            indexed.append(tuple(constraint.fields))
+    for fields in model._meta.unique_together:
+        indexed.append(tuple(fields))
+    return indexed
+
+
+def is_covered(proposal):
+    wanted = tuple(name.lstrip("-") for name in proposal.fields)
+    return any(columns[: len(wanted)] == wanted for columns in existing_indexes(proposal.model))
+
+
+def propose(probe, max_columns=3):
+    """
+    Turn a flagged probe into an index proposal, or None if nothing fits.
+    """
+    model = probe.model
+    if probe.action == "retrieve":
+        lookup = next(iter(probe.kwargs), None)
+        field = _local_field(model, probe.viewset.lookup_field)
+        return Proposal(model, [field.name]) if lookup and field else None
+
+    fields, condition = [], models.Q()
+    for name, value in probe.filters.items():
+        field = _local_field(model, name)
+        if field is None:
+            continue
+        if isinstance(field, models.BooleanField):
+            condition &= models.Q(**{field.name: value.lower() in ("true", "1")})
+        else:
+            fields.append(field.name)
+
+    for term in probe.ordering:
+        field = _local_field(model, term.lstrip("-"))
+        if field is not None and field.name not in fields:
+            fields.append(("-" if term.startswith("-") else "") + field.name)
+
+    fields = fields[:max_columns]
+    if not fields:
+        return None
+    return Proposal(model, fields, condition or None)
+
+
+def advise(viewsets, user, min_rows=1000, stdout=None):
+    """
+    Run every probe of ``viewsets``, EXPLAIN its SELECTs and collect index
+    proposals for the ones that scan or sort large tables of their model.
+
+    Returns ``(findings, proposals)``, where findings are
+    ``(probe, sql, problems)`` tuples.
+    """
+    sizes = table_sizes()
+    factory = RequestFactory()
+    findings, proposals = [], {}
+
+    for viewset in viewsets:
+        for probe in probes_for(viewset):
+            try:
+                with transaction.atomic():
+                    statements = run_probe(probe, user, factory)
+            except Exception as exc:
+                if stdout:
+                    stdout.write(f"skipped {probe}: {exc}")
+                continue
+
+            table = probe.model._meta.db_table
+            for sql in statements:
+                with transaction.atomic():
+                    problems = find_problems(explain(sql), sizes, min_rows)
+                if not problems:
+                    continue
+
+                findings.append((probe, sql, problems))
+                if not any(problem[1] == table for problem in problems):
+                    continue
+
+                proposal = propose(probe)
+                if proposal is None or is_covered(proposal):
+                    continue
+                proposal = proposals.setdefault(proposal.key, proposal)
+                proposal.reasons.append(str(probe))
+
+    return findings, list(proposals.values())
+
+
+def build_migrations(proposals):
+    """
+    Return ``{app_label: MigrationWriter}`` adding the proposed indexes
+    after the latest migration of each app.
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    by_app = {}
+    for proposal in proposals:
+        by_app.setdefault(proposal.model._meta.app_label, []).append(proposal)
+
+    writers = {}
+    for app_label, app_proposals in by_app.items():
+        leaf = loader.graph.leaf_nodes(app_label)[0]
+        number = (MigrationAutodetector.parse_number(leaf[1]) or 0) + 1
+        migration = migrations.Migration(f"{number:04d}_advised_indexes", app_label)
+        migration.dependencies = [leaf]
+        migration.operations = [
+            migrations.AddIndex(
+                model_name=proposal.model._meta.model_name, index=proposal.index()
+            )
+            for proposal in app_proposals
+        ]
+        writers[app_label] = MigrationWriter(migration)
+    return writers
+
+
+def seed(count, rng=None):
+    """
+    Insert roughly ``count`` rows per main table and return an admin user.
+    Meant to run inside a transaction that is rolled back afterwards.
+    """
+    from catalog.models import Category, Inventory, Product, Variant
+    from monitoring.models import ServiceCheck
+    from order.models import Order, OrderItem, Shipment
+    from order.numbering import lease_order_numbers
+    from review.models import Review
+    from users.models import Address
+
+    rng = rng or random.Random(0)
+    tag = uuid.uuid4().hex[:8]
+    User = get_user_model()
+    batch = 1000
+
+    admin = User.objects.create_user(
+        username=f"advisor-{tag}", email=f"advisor-{tag}@example.com", role=User.Roles.ADMIN
+    )
+    users = [admin] + User.objects.bulk_create(
+        [
+            User(username=f"advisor-{tag}-{i}", email=f"advisor-{tag}-{i}@example.com", password="!")
+            for i in range(max(count // 50, 1))
+        ],
+        batch_size=batch,
+    )
+    addresses = Address.objects.bulk_create(
+        [
+            Address(user=user, street="1 Main St", city="City", region="RG", country="US", postal_code="00000")
+            for user in users
+        ],
+        batch_size=batch,
+    )
+
+    roots = Category.objects.bulk_create(
+        [Category(name=f"Root {i}") for i in range(max(count // 1000, 3))]
+    )
+    children = Category.objects.bulk_create(
+        [Category(name=f"Category {i}", parent_id=rng.choice(roots)) for i in range(max(count // 100, 5))]
+    )
+    for category in roots:
+        category.path, category.depth = f"{category.pk}/", 0
+    for category in children:
+        category.path, category.depth = f"{category.parent_id.path}{category.pk}/", 1
+    Category.objects.bulk_update(roots + children, ["path", "depth"], batch_size=batch)
+
+    brands = [f"Brand {i}" for i in range(20)]
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                category=rng.choice(children),
+                name=f"Product {i}",
+                price=Decimal(rng.randint(100, 200000)) / 100,
+                sku=f"{tag}-P{i}",
+                brand=rng.choice(brands),
+                is_active=rng.random() < 0.9,
+            )
+            for i in range(count)
+        ],
+        batch_size=batch,
+    )
+    variants = Variant.objects.bulk_create(
+        [
+            Variant(
+                product=product,
+                variant_name=f"Variant {j}",
+                price=product.price,
+                stock=rng.randint(0, 50),
+                sku=f"{product.sku}-{j}",
+            )
+            for product in products
+            for j in range(3)
+        ],
+        batch_size=batch,
+    )
+    Inventory.objects.bulk_create(
+        [Inventory(variant=variant, quantity=variant.stock) for variant in variants],
+        batch_size=batch,
+    )
+
+    statuses = ["pending", "paid", "shipped", "cancelled"]
+    orders = Order.objects.bulk_create(
+        [
+            Order(
+                user=address.user,
+                address=address,
+                order_number=number,
+                total_amount=Decimal(rng.randint(100, 100000)) / 100,
+                status=rng.choice(statuses),
+                payment_method="card",
+            )
+            for number, address in zip(
+                lease_order_numbers(count), (rng.choice(addresses) for _ in range(count))
+            )
+        ],
+        batch_size=batch,
+    )
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, variant=variant, quantity=1, price=variant.price, subtotal=variant.price)
+            for order in orders
+            for variant in rng.sample(variants, 2)
+        ],
+        batch_size=batch,
+    )
+    Shipment.objects.bulk_create(
+        [
+            Shipment(order=order, tracking_number=f"{tag}-T{order.pk}", carrier="UPS")
+            for order in orders
+        ],
+        batch_size=batch,
+    )
+
+    pairs = {(rng.choice(users).pk, rng.choice(products).pk) for _ in range(count)}
+    Review.objects.bulk_create(
+        [Review(user_id=user, product_id=product, rating=rng.randint(1, 5)) for user, product in pairs],
+        batch_size=batch,
+    )
+    ServiceCheck.objects.bulk_create(
+        [
+            ServiceCheck(service_name=f"service-{i % 5}", success=True, response_time_ms=rng.random() * 500)
+            for i in range(count)
+        ],
+        batch_size=batch,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return admin
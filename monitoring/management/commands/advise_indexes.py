@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from monitoring.index_advisor import advise, build_migrations, registered_viewsets, seed
+import os
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every list filter/ordering combination of the API viewsets, "
+        "EXPLAIN ANALYZE their queries and propose indexes as migrations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Insert about this many rows per main table first (rolled back at the end).",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Only flag scans and sorts of tables with at least this many rows.",
+        )
+        parser.add_argument(
+            "--viewset",
+            action="append",
+            default=[],
+            help="Only probe these viewsets (class name, repeatable).",
+        )
+        parser.add_argument(
+            "--write",
+            action="store_true",
+            help="Write the proposed migrations instead of printing them.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("advise_indexes needs PostgreSQL (EXPLAIN ANALYZE, BUFFERS).")
+
+        viewsets = registered_viewsets()
+        if options["viewset"]:
+            viewsets = [viewset for viewset in viewsets if viewset.__name__ in options["viewset"]]
+            if not viewsets:
+                raise CommandError("No matching viewsets.")
+
+        # Bypass the response cache so every probe reaches the database, and
+        # keep seeded rows (and anything EXPLAIN ANALYZE runs) out of the DB.
+        dummy_cache = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(CACHES=dummy_cache), transaction.atomic():
+            if options["seed"]:
+                self.stdout.write(f"Seeding about {options['seed']} rows per table...")
+                user = seed(options["seed"])
+            else:
+                User = get_user_model()
+                user = User.objects.filter(role=User.Roles.ADMIN).first()
+                if user is None:
+                    raise CommandError("No admin user to run the viewsets as; use --seed.")
+
+            findings, proposals = advise(
+                viewsets, user, min_rows=options["min_rows"], stdout=self.stdout
+            )
+            transaction.set_rollback(True)
+
+        for probe, sql, problems in findings:
+            self.stdout.write(self.style.WARNING(str(probe)))
+            for kind, table, detail in problems:
+                self.stdout.write(f"  {kind} on {table}" + (f": {detail}" if detail else ""))
+
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS("No missing indexes found."))
+            return
+
+        self.stdout.write("")
+        for proposal in proposals:
+            self.stdout.write(self.style.SUCCESS(f"Proposed index {proposal}"))
+            for reason in proposal.reasons[:3]:
+                self.stdout.write(f"  for {reason}")
+
+        for app_label, writer in build_migrations(proposals).items():
+            if options["write"]:
+                with open(writer.path, "w", encoding="utf-8") as handle:
+                    handle.write(writer.as_string())
+                self.stdout.write(f"Wrote {os.path.relpath(writer.path)}")
+            else:
+                self.stdout.write(f"\n# {os.path.relpath(writer.path)}\n{writer.as_string()}")
+
+        self.stdout.write(
+            "Review the migrations and add the same indexes to each model's "
+            "Meta.indexes so makemigrations stays in sync."
+        )
@@ -3,5 +3,6 @@ from .models import ServiceCheck
 
 class ServiceCheckSerializer(serializers.ModelSerializer):
     class Meta:
+        model = ServiceCheck
         fields = ["id","service_name","success","http_status_code","response_time_ms","checked_at"]
-        read_only_fields = ["id","checked_at"]
\ No newline at end of file
+        read_only_fields = ["id","checked_at"]
@@ -1,3 +1,97 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
 from django.test import TestCase
+from catalog.views import ProductViewSet, VariantViewSet
+from monitoring.index_advisor import (
+    Probe,
+    Proposal,
+    build_migrations,
+    find_problems,
+    is_covered,
+    probes_for,
+    propose,
+    registered_viewsets,
+    run_probe,
+    seed,
+)
+from catalog.models import Category, Product
+from order.models import Order
+from users.models import User
 
-# Create your tests here.
+
+class IndexAdvisorTests(TestCase):
+    def test_flags_seq_scans_and_sorts_of_large_tables_only(self):
+        plan = {
+            "Node Type": "Limit",
+            "Plans": [{
+                "Node Type": "Sort",
+                "Sort Key": ["date_added DESC"],
+                "Plans": [{
+                    "Node Type": "Seq Scan",
+                    "Relation Name": "catalog_product",
+                    "Filter": "is_active",
+                }],
+            }, {
+                "Node Type": "Seq Scan",
+                "Relation Name": "catalog_category",
+            }],
+        }
+        sizes = {"catalog_product": 50000, "catalog_category": 20}
+
+        problems = find_problems(plan, sizes, min_rows=1000)
+
+        self.assertEqual(problems, [
+            ("Sort", "catalog_product", "date_added DESC"),
+            ("Seq Scan", "catalog_product", "is_active"),
+        ])
+
+    def test_proposes_composite_partial_index_from_filters_and_ordering(self):
+        probe = Probe(ProductViewSet, params={"category": "1", "is_active": "True"})
+
+        proposal = propose(probe)
+
+        self.assertEqual(proposal.fields, ("category", "-date_added"))
+        self.assertEqual(proposal.condition, Q(is_active=True))
+
+    def test_proposes_lookup_index_for_retrieve(self):
+        proposal = propose(Probe(VariantViewSet, "retrieve", kwargs={"sku": "A-1"}))
+        self.assertEqual(proposal.fields, ("sku",))
+
+    def test_foreign_key_index_covers_single_column(self):
+        self.assertTrue(is_covered(Proposal(Product, ["category"])))
+        self.assertFalse(is_covered(Proposal(Product, ["category", "-date_added"])))
+
+    def test_migration_adds_proposed_indexes(self):
+        writers = build_migrations([Proposal(Product, ["brand", "-date_added"])])
+
+        source = writers["catalog"].as_string()
+        self.assertIn("migrations.AddIndex", source)
+        self.assertIn("-date_added", source)
+
+    def test_probes_cover_filter_and_ordering_combinations(self):
+        category = Category.objects.create(name="Electronics")
+        Product.objects.create(category=category, name="Laptop", price=1, sku="LAP", brand="Acme")
+        user = User.objects.create_user(username="admin", email="admin@example.com", role="admin")
+
+        probes = probes_for(ProductViewSet)
+        params = [probe.params for probe in probes]
+        self.assertIn({"category": str(category.pk), "brand": "Acme"}, params)
+        self.assertIn({"brand": "Acme", "ordering": "-price"}, params)
+
+        statements = run_probe(probes[0], user)
+        self.assertTrue(any("catalog_product" in sql for sql in statements))
+
+    def test_seed_takes_order_numbers_after_existing_orders(self):
+        seed(3)
+        seed(3)
+
+        numbers = list(Order.objects.order_by("order_number").values_list("order_number", flat=True))
+        self.assertEqual(numbers, [1, 2, 3, 4, 5, 6])
+
+    def test_discovers_routed_viewsets(self):
+        self.assertIn(ProductViewSet, registered_viewsets())
+
+    def test_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command("advise_indexes")
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "order"
+
+    def ready(self):
+        from utils.cache import register_cache_invalidation
+
+        register_cache_invalidation(
+            self.get_model("Order"),
+            self.get_model("OrderItem"),
+            self.get_model("Shipment"),
+        )
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:16
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+SEQUENCE = "order_number_seq"
+
+
+def renumber_duplicates(apps, schema_editor):
+    # Keep the first order with each number and move the others past the
+    # highest number so the unique index can be built.
+    Order = apps.get_model("order", "Order")
+    duplicated = (
+        Order.objects.values("order_number")
+        .annotate(orders=Count("pk"))
+        .filter(orders__gt=1)
+        .values_list("order_number", flat=True)
+    )
+    last = Order.objects.aggregate(last=Max("order_number"))["last"] or 0
+    for number in list(duplicated):
+        for pk in Order.objects.filter(order_number=number).order_by("pk").values_list("pk", flat=True)[1:]:
+            last += 1
+            Order.objects.filter(pk=pk).update(order_number=last)
+
+
+def create_sequence(apps, schema_editor):
+    # Other databases allocate from MAX(order_number); see order.numbering.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = schema_editor.quote_name(apps.get_model("order", "Order")._meta.db_table)
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}")
+    schema_editor.execute(
+        f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(order_number) FROM {table}), 0) + 1, false)"
+    )
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0003_alter_shipment_order"),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="order",
+            name="order_number",
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from utils.cache import CacheInvalidatingQuerySet
 
 
 class Order(models.Model):
@@ -10,13 +11,17 @@ class Order(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     address = models.ForeignKey("users.Address", on_delete=models.CASCADE)
-    order_number = models.IntegerField()
+    # Allocated by order.numbering.
+    order_number = models.IntegerField(unique=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=45)
     order_date = models.DateTimeField(auto_now_add=True)
     shipped_date = models.DateTimeField(auto_now_add=True)
     payment_method = models.CharField(max_length=45)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    cache_prefixes = ("order", "shipment")
+
     def __str__(self):
         return f"Order #{self.order_number} - {self.status}"
 
@@ -33,6 +38,9 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    cache_prefixes = ("order_item",)
+
     def __str__(self):
         return (
             f"{self.quantity} x {self.variant.product.name} ({self.order.order_number})"
@@ -65,5 +73,8 @@ class Shipment(models.Model):
     shipped_at = models.DateTimeField(auto_now_add=True)
     delivered_at = models.DateTimeField(auto_now=True)
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    cache_prefixes = ("shipment",)
+
     def __str__(self):
         return f"{self.tracking_number} - {self.status}"
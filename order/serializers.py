@@ -21,6 +21,15 @@ class OrderSerializer(serializers.ModelSerializer):
             "shipped_date",
             "payment_method",
         ]
+        # Allocated by order.numbering.
+        read_only_fields = ["order_number"]
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Input for checking out the current user's cart."""
+
+    address = serializers.IntegerField()
+    payment_method = serializers.CharField(max_length=45)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -0,0 +1,62 @@
+from catalog.carts import cart_lines
+from catalog.models import Cart, CartItem
+from catalog.reservations import ReservationError, confirm_cart, reserve_cart
+from django.db import transaction
+from users.models import Address
+from .models import Order, OrderItem
+from .numbering import next_order_number
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def checkout(user, address_id, payment_method):
+    """
+    Turn the user's cart into an order in one transaction: sell its stock
+    (confirming the cart's reservation, or reserving now), create the
+    order with its total and items, and empty the cart.
+
+    The number of queries does not depend on how many items the cart has.
+    Raises CheckoutError for an empty cart or a foreign address and
+    catalog.reservations.InsufficientStock when stock runs short.
+    """
+    with transaction.atomic():
+        # Locking the cart serializes concurrent checkouts of the same cart.
+        cart = Cart.objects.select_for_update().filter(user=user).order_by("pk").first()
+        if cart is None:
+            raise CheckoutError("The cart is empty.")
+        if not Address.objects.filter(pk=address_id, user=user).exists():
+            raise CheckoutError("Unknown address.")
+
+        lines = list(cart_lines(cart))
+        if not lines:
+            raise CheckoutError("The cart is empty.")
+
+        try:
+            confirm_cart(cart)
+        except ReservationError:
+            # No (or an outdated) reservation: take the stock right away.
+            reserve_cart(cart)
+            confirm_cart(cart)
+
+        order = Order.objects.create(
+            user=user,
+            address_id=address_id,
+            order_number=next_order_number(),
+            total_amount=lines[0].order_total,
+            status="pending",
+            payment_method=payment_method,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                variant=line.variant,
+                quantity=line.quantity,
+                price=line.line_price,
+                subtotal=line.line_subtotal,
+            )
+            for line in lines
+        ])
+        CartItem.objects.filter(cart=cart).delete()
+    return order
@@ -1,8 +1,14 @@
 from django.test import TestCase
 from decimal import Decimal
 from users.models import User, Address
-from catalog.models import Category, Product, Variant
+from catalog.models import Cart, CartItem, Category, InventoryMovement, Product, Variant
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from order.models import Order, OrderItem, Shipment
+from order.numbering import OrderNumberAllocator, next_order_number
+from rest_framework.test import APIClient
+from unittest import mock
+import json
 
 
 class OrderModelTests(TestCase):
@@ -108,3 +114,203 @@ class ShipmentModelTests(TestCase):
             carrier="UPS",
             status=Shipment.Status.SHIPPED
         )
+
+
+class OrderListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="mia", email="mia@example.com", password="password123")
+        self.address = Address.objects.create(
+            user=self.user,
+            street="1 Oak St",
+            city="Boston",
+            region="MA",
+            country="USA",
+            postal_code="02101"
+        )
+        for number, status in enumerate(["pending", "shipped", "pending"], start=1):
+            Order.objects.create(
+                user=self.user,
+                address=self.address,
+                order_number=number,
+                total_amount=10,
+                status=status,
+                payment_method="paypal"
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_filters_by_status_and_pages_by_cursor(self):
+        first = self.client.get("/api/order/", {"status": "pending", "page_size": 1, "cursor": ""}).json()
+        second = self.client.get(first["next"]).json()
+
+        numbers = [first["results"][0]["order_number"], second["results"][0]["order_number"]]
+        self.assertEqual(numbers, [3, 1])
+        self.assertIsNone(second["next"])
+
+    def test_admin_export_streams_every_order_with_items(self):
+        other = User.objects.create_user(username="ops", email="ops@example.com", password="x", role=User.Roles.ADMIN)
+        order = Order.objects.get(order_number=2)
+        category = Category.objects.create(name="Books")
+        product = Product.objects.create(category=category, name="Novel", price=5, sku="NOV", brand="Pub")
+        variant = Variant.objects.create(product=product, sku="NOV-1", stock=3)
+        OrderItem.objects.create(order=order, variant=variant, quantity=2, price=5, subtotal=10)
+
+        self.client.force_authenticate(other)
+        response = self.client.get("/api/order/export/", {"ordering": "id"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual([row["order_number"] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[1]["items"][0]["variant_id"], variant.id)
+        self.assertEqual(rows[0]["items"], [])
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="lea", email="lea@example.com", password="password123")
+        self.address = Address.objects.create(
+            user=self.user,
+            street="9 Pine St",
+            city="Denver",
+            region="CO",
+            country="USA",
+            postal_code="80201"
+        )
+        category = Category.objects.create(name="Garden")
+        product = Product.objects.create(category=category, name="Hose", price=20, sku="HOS", brand="Acme")
+        self.variants = [
+            Variant.objects.create(product=product, sku=f"HOS-{n}", price=Decimal("2.50") * n, stock=10)
+            for n in range(1, 6)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, variant=variant, quantity=2, price=variant.price)
+            for variant in self.variants[:count]
+        ])
+
+    def post_checkout(self):
+        return self.client.post(
+            "/api/order/checkout/",
+            {"address": self.address.id, "payment_method": "card"},
+            format="json",
+        )
+
+    def test_checkout_creates_order_with_items_and_empties_cart(self):
+        self.fill_cart(3)
+
+        response = self.post_checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()["id"])
+        self.assertEqual(order.total_amount, Decimal("30.00"))
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list("variant__sku", "subtotal")),
+            [("HOS-1", Decimal("5.00")), ("HOS-2", Decimal("10.00")), ("HOS-3", Decimal("15.00"))],
+        )
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual(Variant.objects.get(pk=self.variants[0].pk).stock, 8)
+        self.assertEqual(
+            InventoryMovement.objects.filter(kind=InventoryMovement.Kind.SALE).count(), 3
+        )
+
+    def test_checkout_query_count_does_not_grow_with_the_cart(self):
+        self.fill_cart(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post_checkout().status_code, 201)
+
+        self.fill_cart(5)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.post_checkout().status_code, 201)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_empty_cart_is_rejected(self):
+        response = self.post_checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_short_stock_answers_409_and_changes_nothing(self):
+        self.fill_cart(2)
+        Variant.objects.filter(pk=self.variants[1].pk).update(stock=1)
+
+        response = self.post_checkout()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["available"], {str(self.variants[1].pk): 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+        self.assertEqual(Variant.objects.get(pk=self.variants[0].pk).stock, 10)
+
+    def test_graphql_checkout_returns_order_with_items(self):
+        self.fill_cart(2)
+        query = """
+            mutation ($address: Int!) {
+                checkout(addressId: $address, paymentMethod: "card") {
+                    orderNumber totalAmount status items { variantId quantity subtotal }
+                }
+            }
+        """
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            "/graphql/", {"query": query, "variables": {"address": self.address.id}}, format="json"
+        )
+
+        order = response.json()["data"]["checkout"]
+        self.assertEqual(order["totalAmount"], 15.0)
+        self.assertEqual(order["status"], "pending")
+        self.assertEqual(len(order["items"]), 2)
+
+
+class OrderNumberTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="noa", email="noa@example.com", password="password123")
+        self.address = Address.objects.create(
+            user=self.user,
+            street="3 Bay Rd",
+            city="Miami",
+            region="FL",
+            country="USA",
+            postal_code="33101"
+        )
+
+    def create_order(self, number):
+        return Order.objects.create(
+            user=self.user, address=self.address, order_number=number,
+            total_amount=1, status="pending", payment_method="card",
+        )
+
+    def test_numbers_follow_the_highest_and_never_repeat(self):
+        self.create_order(41)
+
+        self.assertEqual(next_order_number(), 42)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_order(41)
+
+    def test_allocator_serves_a_leased_block_before_leasing_again(self):
+        allocator = OrderNumberAllocator()
+        blocks = iter([[7, 9, 12], [20, 21, 22]])
+
+        with mock.patch.object(allocator, "lease", side_effect=lambda size: next(blocks)) as lease, \
+                self.settings(ORDER_NUMBER_BLOCK_SIZE=3):
+            numbers = [allocator.allocate() for _ in range(4)]
+
+        self.assertEqual(numbers, [7, 9, 12, 20])
+        self.assertEqual(lease.call_count, 2)
+
+    def test_rest_create_allocates_the_number(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.create_order(5)
+
+        response = client.post("/api/order/", {
+            "user": self.user.id, "address": self.address.id, "order_number": 5,
+            "total_amount": "3.00", "status": "pending", "payment_method": "card",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["order_number"], 6)
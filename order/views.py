@@ -1,34 +1,88 @@
-from rest_framework import viewsets
-from .serializers import OrderItemSerializer, OrderSerializer, ShipmentSerializer
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from catalog.reservations import InsufficientStock
+from .serializers import CheckoutSerializer, OrderItemSerializer, OrderSerializer, ShipmentSerializer
 from .models import Order, OrderItem, Shipment
+from .numbering import next_order_number
+from .services import CheckoutError, checkout
 from rest_framework.permissions import IsAuthenticated
-from utils.mixins import AuthenticatedQuerysetMixin, CachedQuerysetMixin
-from utils.pagination import DefaultPagination
+from utils.mixins import (
+    AuthenticatedQuerysetMixin,
+    CachedQuerysetMixin,
+    SparseFieldsetMixin,
+    StreamingExportMixin,
+)
+from utils.pagination import DefaultPagination, OptionalKeysetPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
 
 
-class OrderViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
+class OrderViewSet(
+    SparseFieldsetMixin,
+    StreamingExportMixin,
+    CachedQuerysetMixin,
+    AuthenticatedQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     API endpoint for viewing and editing orders.
     Provides list, create, retrieve, update, and delete actions.
+    Lists are paged by number, or with ``?cursor=`` by keyset on the
+    requested ordering.
+    Admins can stream all orders with their items from export/.
+    checkout/ turns the user's cart into an order.
     """
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultPagination
+    pagination_class = OptionalKeysetPagination
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ["user", "payment_status", "order_date", "shipped_date"]
+    filterset_fields = ["user", "status", "order_date", "shipped_date"]
 
-    ordering_fields = ["order_date", "total_amount", "payment_status", "id"]
+    ordering_fields = ["order_date", "total_amount", "status", "id"]
     ordering = ["-order_date"]
 
+    export_fields = [
+        "id", "order_number", "user_id", "address_id", "status",
+        "total_amount", "payment_method", "order_date", "shipped_date",
+    ]
+    export_children = ("items", "orderitem_set", ["id", "variant_id", "quantity", "price", "subtotal"])
+
     cache_prefix = "order"
+    cache_vary_on_user = True
     cache_timeout = 60 * 10
 
-
-class OrderItemViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        serializer.save(order_number=next_order_number())
+
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        """
+        Place an order for everything in the user's cart. Answers 409 with
+        the units still available when something runs short.
+        """
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = checkout(
+                request.user,
+                serializer.validated_data["address"],
+                serializer.validated_data["payment_method"],
+            )
+        except InsufficientStock as exc:
+            return Response(
+                {"detail": "Not enough stock.", "available": exc.shortages},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except CheckoutError as exc:
+            raise ValidationError({"detail": str(exc)})
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderItemViewSet(SparseFieldsetMixin, CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing order items.
     Includes related product variant and parent order details.
@@ -37,6 +91,7 @@ class OrderItemViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = DefaultPagination
+    user_field = "order__user"
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["order", "variant", "quantity", "price"]
@@ -45,10 +100,11 @@ class OrderItemViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets
     ordering = ["-id"]
 
     cache_prefix = "order_item"
+    cache_vary_on_user = True
     cache_timeout = 60 * 15
 
 
-class ShipmentViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
+class ShipmentViewSet(SparseFieldsetMixin, CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing shipments.
     Includes shipment status, tracking number, and related order info.
@@ -58,6 +114,7 @@ class ShipmentViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.
     serializer_class = ShipmentSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = DefaultPagination
+    user_field = "order__user"
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["order", "carrier", "status", "shipped_at", "delivered_at"]
@@ -66,5 +123,6 @@ class ShipmentViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.
     ordering = ["-shipped_at"]
 
     cache_prefix = "shipment"
+    cache_vary_on_user = True
     cache_timeout = 60 * 20 
 
@@ -12,4 +12,5 @@ class PaymentViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
 
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+    user_field = "order__user"
@@ -4,7 +4,7 @@ from rest_framework.exceptions import ValidationError
 from .models import Review
 from .serializers import ReviewSerializer
 from utils.mixins import AuthenticatedQuerysetMixin
-from utils.pagination import DefaultPagination
+from utils.pagination import OptionalKeysetPagination
 
 
 class ReviewViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
@@ -15,7 +15,8 @@ class ReviewViewSet(AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultPagination
+    pagination_class = OptionalKeysetPagination
+    ordering = ["-created_at"]
 
     user_field = "user"
 
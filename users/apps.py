@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from utils.cache import register_cache_invalidation
+
+        register_cache_invalidation(
+            self.get_model("User"),
+            self.get_model("Address"),
+        )
@@ -1,5 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
+from utils.cache import CacheInvalidatingQuerySet
+
+
+class UserManager(BaseUserManager.from_queryset(CacheInvalidatingQuerySet)):
+    """Default user manager whose bulk writes invalidate the user list cache."""
 
 
 class User(AbstractUser):
@@ -25,6 +31,9 @@ class User(AbstractUser):
         max_length=20, choices=Roles.choices, default=Roles.CUSTOMER
     )
 
+    objects = UserManager()
+    cache_prefixes = ("user",)
+
     @property
     def is_admin(self):
         return self.role == self.Roles.ADMIN or self.is_superuser
@@ -62,5 +71,8 @@ class Address(models.Model):
         max_length=50, choices=AddressType.choices, default=AddressType.SHIPPING
     )
 
+    objects = CacheInvalidatingQuerySet.as_manager()
+    cache_prefixes = ("address",)
+
     def __str__(self):
         return f"{self.user.username} - {self.address_type}"
@@ -3,13 +3,17 @@ from .serializers import UserSerializer, AddressSerializer
 from rest_framework.permissions import IsAuthenticated
 from .models import User, Address
 from .permissions import IsAdmin, IsAdminOrVendor
-from utils.mixins import AuthenticatedQuerysetMixin, CachedQuerysetMixin
-from utils.pagination import DefaultPagination
+from utils.mixins import (
+    AuthenticatedQuerysetMixin,
+    CachedQuerysetMixin,
+    SparseFieldsetMixin,
+)
+from utils.pagination import ApproximateCountPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import JsonResponse
 
 
-class UserViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetMixin, CachedQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing role based data access:
     -Admin : Full access
@@ -18,7 +22,7 @@ class UserViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
     """
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultPagination
+    pagination_class = ApproximateCountPagination
 
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["role", "email", "username"]
@@ -26,6 +30,7 @@ class UserViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
     ordering = ["-date_joined"]
 
     cache_prefix = "user"
+    cache_vary_on_user = True
     cache_timeout = 60 * 10
 
     def get_queryset(self):
@@ -58,7 +63,7 @@ class UserViewSet(CachedQuerysetMixin, viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class AddressViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
+class AddressViewSet(SparseFieldsetMixin, CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.ModelViewSet):
     """
     Viewsets for managing addresses with role-based restrictions
     """
@@ -73,6 +78,7 @@ class AddressViewSet(CachedQuerysetMixin, AuthenticatedQuerysetMixin, viewsets.M
     ordering = ["id"]
 
     cache_prefix = "address"
+    cache_vary_on_user = True
     cache_timeout = 60 * 20
 
 
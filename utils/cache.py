@@ -0,0 +1,229 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+import time
+import uuid
+
+# Delete KEYS[1] only while it still holds ARGV[1], atomically.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def generation_key(prefix):
+    return f"{prefix}:generation"
+
+
+def _seed_generation():
+    # Millisecond clock, so a counter that was evicted from the cache
+    # restarts above any value it could have reached before.
+    return int(time.time() * 1000)
+
+
+def get_generation(prefix):
+    """
+    Return the current generation of a cache prefix, creating it if needed.
+    """
+    key = generation_key(prefix)
+    generation = cache.get(key)
+
+    if generation is None:
+        generation = _seed_generation()
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+
+    return generation
+
+
+def bump_generation(*prefixes):
+    """
+    Move each prefix to a new generation so its existing keys are never read again.
+    """
+    for prefix in prefixes:
+        key = generation_key(prefix)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed_generation(), None)
+
+
+def invalidate_prefixes(prefixes):
+    """
+    Bump the given prefixes now and, inside a transaction, once more on commit.
+
+    The second bump discards entries rebuilt from the old rows by other
+    workers between the write and the commit.
+    """
+    prefixes = tuple(prefixes)
+    if not prefixes:
+        return
+
+    bump_generation(*prefixes)
+
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_generation(*prefixes))
+
+
+def acquire_lock(key, timeout):
+    """
+    Take ``key`` as a lock for ``timeout`` seconds. Returns the token to
+    release it with, or None if someone else holds it.
+    """
+    token = uuid.uuid4().hex
+    return token if cache.add(key, token, timeout) else None
+
+
+def release_lock(key, token):
+    """
+    Delete the lock only if it still holds ``token``. A holder that outlived
+    the timeout must not drop the lock another worker has taken since.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        made = backend.make_and_validate_key(key)
+        client = backend._cache.get_client(made, write=True)
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, made, backend._cache._serializer.dumps(token))
+    elif backend.get(key) == token:
+        # Not atomic, but only wrong if the lock expires in between.
+        backend.delete(key)
+
+
+def detail_key(prefix, value):
+    return f"{prefix}:detail:{value}"
+
+
+def _evict(keys):
+    cache.delete_many(keys)
+
+
+def evict_details(keys):
+    """
+    Delete per-object entries now and, inside a transaction, again on commit.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    _evict(keys)
+
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _evict(keys))
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row.get(field)
+    return getattr(row, field, None)
+
+
+def detail_keys_for(model, rows):
+    """
+    Build the detail keys named by ``model.cache_detail_fields`` for each row.
+
+    ``cache_detail_fields`` maps a cache prefix to the attribute holding the
+    lookup value, e.g. ``{"variants": "sku", "products": "product_id"}``.
+    Rows may be model instances or ``values()`` dicts.
+    """
+    keys = set()
+    for prefix, field in getattr(model, "cache_detail_fields", {}).items():
+        for row in rows:
+            value = _row_value(row, field)
+            if value is not None:
+                keys.add(detail_key(prefix, value))
+    return keys
+
+
+def invalidate_model(model, rows=()):
+    invalidate_prefixes(getattr(model, "cache_prefixes", ()))
+    evict_details(detail_keys_for(model, rows))
+
+
+class CacheInvalidatingQuerySet(models.QuerySet):
+    """
+    QuerySet whose bulk writes invalidate the model's ``cache_prefixes``
+    and evict the detail entries of the rows they touch.
+
+    ``update()``, ``bulk_create()`` and ``bulk_update()`` bypass model signals,
+    so they invalidate by themselves. ``update()`` reads the lookup values of
+    the affected rows first, which costs one extra query on models that
+    declare ``cache_detail_fields``.
+    """
+
+    def _detail_rows(self):
+        fields = set(getattr(self.model, "cache_detail_fields", {}).values())
+        if not fields:
+            return []
+        return list(self.values(*fields))
+
+    def update(self, **kwargs):
+        affected = self._detail_rows()
+        rows = super().update(**kwargs)
+        if rows:
+            invalidate_model(self.model, affected)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            invalidate_model(self.model, created)
+        return created
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if rows:
+            invalidate_model(self.model, objs)
+        return rows
+
+    def delete(self):
+        deleted = super().delete()
+        if deleted[0]:
+            invalidate_model(self.model)
+        return deleted
+
+
+def _remember_detail_values(sender, instance, update_fields=None, **kwargs):
+    # A save can change a lookup value such as Variant.sku; keep the old one
+    # so the entry cached under it is evicted as well.
+    pk_name = sender._meta.pk.attname
+    fields = [
+        field
+        for field in getattr(sender, "cache_detail_fields", {}).values()
+        if field != pk_name
+    ]
+    if instance.pk is None or not fields:
+        return
+
+    if update_fields is not None:
+        names = {sender._meta.get_field(field).name for field in fields}
+        if not names.intersection(update_fields):
+            return
+
+    instance._cache_detail_before = (
+        sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+    )
+
+
+def _invalidate_instance(sender, instance, **kwargs):
+    rows = [instance]
+    before = instance.__dict__.pop("_cache_detail_before", None)
+    if before:
+        rows.append(before)
+    invalidate_model(sender, rows)
+
+
+def register_cache_invalidation(*model_classes):
+    """
+    Connect save/delete signals so writes bump each model's ``cache_prefixes``
+    and evict its ``cache_detail_fields`` entries.
+    """
+    for model in model_classes:
+        uid = f"cache-invalidation:{model._meta.label}"
+        if getattr(model, "cache_detail_fields", None):
+            pre_save.connect(_remember_detail_values, sender=model, dispatch_uid=uid)
+        post_save.connect(_invalidate_instance, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_instance, sender=model, dispatch_uid=uid)
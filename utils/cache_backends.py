@@ -0,0 +1,271 @@
+from collections import OrderedDict
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """
+    Small thread-safe LRU of pickled values, each kept for at most ``timeout`` seconds.
+    """
+
+    def __init__(self, max_entries=256, timeout=30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            expires, payload = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalTier:
+    """
+    Per-process front tier shared by every TwoTierRedisCache instance of a process.
+
+    A daemon thread subscribes to the invalidation channel and drops keys
+    that other processes changed. Until the subscription is live (and after
+    it drops) the tier is bypassed, since it could miss invalidations.
+    """
+
+    def __init__(self, channel, max_entries, timeout):
+        self.channel = channel
+        self.lru = LocalLRU(max_entries, timeout)
+        self.ready = threading.Event()
+        self.epoch = 0
+        self.node = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_listener(self, get_client):
+        # Checked per process so gunicorn workers forked from a preloaded
+        # master start their own listener instead of sharing a dead one.
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self.node = uuid.uuid4().hex
+            self.ready.clear()
+            self.lru.clear()
+            threading.Thread(
+                target=self._listen,
+                args=(get_client,),
+                name="cache-invalidation-listener",
+                daemon=True,
+            ).start()
+
+    def _listen(self, get_client):
+        while True:
+            try:
+                pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.ready.set()
+                for message in pubsub.listen():
+                    self.handle(message["data"])
+            except Exception:
+                logger.warning("Cache invalidation listener disconnected", exc_info=True)
+
+            self.ready.clear()
+            self.lru.clear()
+            time.sleep(1)
+
+    def handle(self, data):
+        message = json.loads(data)
+        if message.get("origin") == self.node:
+            return
+
+        self.epoch += 1
+        if message.get("clear"):
+            self.lru.clear()
+        else:
+            self.lru.delete_many(message.get("keys", ()))
+
+    def store(self, key, value, epoch):
+        # Skip values read before an invalidation arrived; they may be stale.
+        if epoch == self.epoch:
+            self.lru.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def message(self, keys=(), clear=False):
+        return json.dumps({"origin": self.node, "keys": list(keys), "clear": clear})
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    Redis cache with a bounded in-process LRU in front of it for hot keys.
+
+    Extra OPTIONS (all optional):
+
+    - LOCAL_PREFIXES: key prefixes kept in the local tier (default: all keys)
+    - LOCAL_MAX_ENTRIES: size of the local LRU (default 256)
+    - LOCAL_TIMEOUT: seconds a local copy may live, a safety net for lost
+      invalidation messages (default 30)
+    - INVALIDATION_CHANNEL: Redis pub/sub channel (default "cache-invalidation")
+
+    Every write to a local-tier key drops it locally and is broadcast on the
+    channel so other processes drop their copies too. Stampede locks
+    (``<key>:lock``, see utils.mixins) always go straight to Redis.
+    """
+
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get("OPTIONS", {}))
+        self.local_prefixes = tuple(options.pop("LOCAL_PREFIXES", ()))
+        max_entries = options.pop("LOCAL_MAX_ENTRIES", 256)
+        local_timeout = options.pop("LOCAL_TIMEOUT", 30)
+        channel = options.pop("INVALIDATION_CHANNEL", "cache-invalidation")
+        params["OPTIONS"] = options
+        super().__init__(server, params)
+
+        # Django builds one cache instance per thread; the tier is per process.
+        with _tiers_lock:
+            tier_key = (tuple(self._servers), channel)
+            if tier_key not in _tiers:
+                _tiers[tier_key] = LocalTier(channel, max_entries, local_timeout)
+            self._tier = _tiers[tier_key]
+
+    def _is_local(self, key):
+        if key.endswith(":lock"):
+            return False
+        return not self.local_prefixes or key.startswith(self.local_prefixes)
+
+    def _tier_ready(self):
+        self._tier.ensure_listener(lambda: self._cache.get_client(write=True))
+        return self._tier.ready.is_set()
+
+    def _invalidate(self, keys=(), clear=False):
+        keys = [key for key, raw in keys if self._is_local(raw)]
+        if not keys and not clear:
+            return
+
+        if clear:
+            self._tier.lru.clear()
+        else:
+            self._tier.lru.delete_many(keys)
+
+        client = self._cache.get_client(write=True)
+        client.publish(self._tier.channel, self._tier.message(keys, clear))
+
+    def _keys(self, keys, version):
+        return [(self.make_and_validate_key(key, version=version), key) for key in keys]
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key) or not self._tier_ready():
+            return super().get(key, default, version)
+
+        made = self.make_and_validate_key(key, version=version)
+        payload = self._tier.lru.get(made)
+        if payload is not None:
+            return pickle.loads(payload)
+
+        epoch = self._tier.epoch
+        value = self._cache.get(made, _MISSING)
+        if value is _MISSING:
+            return default
+
+        self._tier.store(made, value, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        if not self._tier_ready():
+            return super().get_many(keys, version)
+
+        found = {}
+        remaining = []
+        for made, key in self._keys(keys, version):
+            payload = self._tier.lru.get(made) if self._is_local(key) else None
+            if payload is None:
+                remaining.append(key)
+            else:
+                found[key] = pickle.loads(payload)
+
+        if remaining:
+            epoch = self._tier.epoch
+            fetched = super().get_many(remaining, version)
+            for made, key in self._keys(fetched, version):
+                if self._is_local(key):
+                    self._tier.store(made, fetched[key], epoch)
+            found.update(fetched)
+
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+        if added:
+            self._invalidate(self._keys([key], version))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._invalidate(self._keys([key], version))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version)
+        self._invalidate(self._keys(data, version))
+        return failed
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._invalidate(self._keys([key], version))
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        super().delete_many(keys, version)
+        self._invalidate(self._keys(keys, version))
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._invalidate(self._keys([key], version))
+        return value
+
+    def clear(self):
+        cleared = super().clear()
+        self._invalidate(clear=True)
+        return cleared
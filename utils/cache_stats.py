@@ -0,0 +1,123 @@
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+import json
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Pagination params are not recorded: warming follows "next" links instead.
+PAGINATION_PARAMS = ("page", "cursor")
+WARM_HEADER = "HTTP_X_CACHE_WARM"
+
+# Fallback store when the default cache is not Redis (tests, local dev).
+_local_stats = {}
+
+
+def stats_key(prefix, kind):
+    return f"cachestats:{prefix}:{kind}"
+
+
+def _redis_client():
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def increment_scores(key, counts):
+    """
+    Add ``counts`` (``{member: amount}``) to the ranking stored at ``key``.
+    """
+    client = _redis_client()
+    if client is None:
+        _local_stats.setdefault(key, Counter()).update(counts)
+        return
+    pipeline = client.pipeline()
+    for member, amount in counts.items():
+        pipeline.zincrby(key, amount, member)
+    pipeline.execute()
+
+
+def top_scores(key, limit):
+    """
+    Return ``[(member, score), ...]`` from the ranking at ``key``, highest first.
+    """
+    client = _redis_client()
+    if client is None:
+        return _local_stats.get(key, Counter()).most_common(limit)
+    return [
+        (member.decode(), int(score))
+        for member, score in client.zrevrange(key, 0, limit - 1, withscores=True)
+    ]
+
+
+def get_scores(key, members):
+    """
+    Return ``{member: score}`` for ``members`` of the ranking at ``key``.
+    """
+    members = [str(member) for member in members]
+    client = _redis_client()
+    if client is None:
+        counter = _local_stats.get(key, Counter())
+        return {member: counter[member] for member in members}
+    pipeline = client.pipeline()
+    for member in members:
+        pipeline.zscore(key, member)
+    return {
+        member: int(score or 0) for member, score in zip(members, pipeline.execute())
+    }
+
+
+def record_hit(prefix, kind, member):
+    """
+    Count one request for a list params set or a detail lookup value.
+
+    Only a ``CACHE_STATS_SAMPLE_RATE`` fraction of calls is recorded, which
+    keeps the ranking while sparing most requests a Redis round trip.
+    """
+    if random.random() >= getattr(settings, "CACHE_STATS_SAMPLE_RATE", 0.05):
+        return
+
+    if isinstance(member, dict):
+        member = {k: v for k, v in member.items() if k not in PAGINATION_PARAMS}
+        member = json.dumps(member, sort_keys=True)
+
+    key = stats_key(prefix, kind)
+    try:
+        increment_scores(key, {member: 1})
+    except Exception:
+        logger.warning("Could not record cache hit for %s", key, exc_info=True)
+
+
+def top_hits(prefix, kind, limit):
+    """
+    Return the most requested members, most popular first.
+    """
+    members = [member for member, _ in top_scores(stats_key(prefix, kind), limit)]
+    if kind == "list":
+        return [json.loads(member) for member in members]
+    return members
+
+
+def decay_hits(prefix, kind, keep=1000):
+    """
+    Halve every score and drop the long tail, so rankings follow recent traffic.
+    """
+    key = stats_key(prefix, kind)
+    client = _redis_client()
+    if client is None:
+        counter = _local_stats.get(key)
+        if counter:
+            _local_stats[key] = Counter(
+                {m: n // 2 for m, n in counter.most_common(keep) if n // 2}
+            )
+        return
+
+    pipeline = client.pipeline()
+    pipeline.zunionstore(key, {key: 0.5})
+    pipeline.zremrangebyrank(key, 0, -(keep + 1))
+    pipeline.zremrangebyscore(key, "-inf", 0.5)
+    pipeline.execute()
@@ -1,49 +1,486 @@
 from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from .cache import acquire_lock, detail_key, get_generation, release_lock
+from .cache_stats import WARM_HEADER, record_hit
+from users.permissions import IsAdmin
+import csv
 import hashlib
 import json
+import math
+import random
+import time
 
 
 class CachedQuerysetMixin:
     """
     Centralized caching + filtering + ordering for DRF viewsets.
     Works for all list endpoints.
+
+    Keys include the generation of ``cache_prefix``; writes to the models
+    listing that prefix in their ``cache_prefixes`` bump it (see utils.cache).
+    Set ``cache_vary_on_user`` when the queryset depends on request.user.
+
+    Entries hold the rendered JSON bytes and a strong ETag, so hits skip
+    re-rendering and matching ``If-None-Match`` requests get a 304.
+
+    Rebuilds are single-flight: one worker takes a short lock and recomputes
+    while the others serve the expired entry (for up to ``cache_stale_grace``
+    seconds) or wait briefly for the new one. Hot entries are also refreshed
+    early with probability rising towards expiry, scaled by how long they
+    took to build (``cache_early_refresh_beta``, 0 disables it).
+
+    Requests to shared (not per-user) entries are sampled into hit
+    statistics, which the cache warmer uses to pick what to rebuild.
     """
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     cache_timeout = 60 * 5 
     cache_prefix = None   
+    cache_vary_on_user = False
+    cache_stale_grace = 60
+    cache_lock_timeout = 10
+    cache_lock_wait = 2.0
+    cache_early_refresh_beta = 1.0
     filterset_fields = []   
     ordering_fields = "__all__" 
     ordering = None
 
+    def get_cache_prefix(self):
+        return self.cache_prefix or self.__class__.__name__.lower()
+
+    def get_cache_params(self, request):
+        return request.query_params.dict()
+
     def generate_cache_key(self, request):
-        params = request.query_params.dict()
+        params = self.get_cache_params(request)
+        if getattr(self, "action", "list") != "list":
+            params["_action"] = [self.action, self.kwargs]
+        if self.cache_vary_on_user:
+            params["_user"] = getattr(request.user, "pk", None)
         raw = json.dumps(params, sort_keys=True)
         hashed = hashlib.md5(raw.encode()).hexdigest()
 
-        prefix = self.cache_prefix or self.__class__.__name__.lower()
-        return f"{prefix}:{hashed}"
+        prefix = self.get_cache_prefix()
+        return f"{prefix}:{get_generation(prefix)}:{hashed}"
+
+    def render_cache_entry(self, data, build_time=0.0):
+        """
+        Render serialized data once and pair the bytes with their ETag.
+        """
+        content = self.request.accepted_renderer.render(
+            data,
+            self.request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        return {
+            "content": content,
+            "etag": etag,
+            "expires": time.time() + self.cache_timeout,
+            "delta": build_time,
+        }
+
+    def store_cache_entry(self, cache_key, entry):
+        cache.set(cache_key, entry, self.cache_timeout + self.cache_stale_grace)
+
+    def is_entry_fresh(self, entry, now):
+        """
+        Probabilistic early expiration: returns False a little before
+        ``expires``, more often for entries that are slow to rebuild.
+        """
+        expires = entry.get("expires", 0)
+        jitter = entry.get("delta", 0) * self.cache_early_refresh_beta
+        return now - jitter * math.log(1.0 - random.random()) < expires
+
+    def _rebuild_entry(self, cache_key, build):
+        started = time.monotonic()
+        data, cacheable = build()
+        entry = self.render_cache_entry(data, time.monotonic() - started)
+        if cacheable:
+            self.store_cache_entry(cache_key, entry)
+        return entry
+
+    def _wait_for_entry(self, cache_key):
+        deadline = time.monotonic() + self.cache_lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return entry
+        return None
+
+    def get_cached_entry(self, cache_key, build):
+        """
+        Return ``(entry, status)`` for a key, rebuilding it at most once at a time.
+
+        ``build`` returns ``(data, cacheable)``; status is "hit", "stale"
+        or "miss".
+        """
+        now = time.time()
+        entry = cache.get(cache_key)
+        if entry is not None and self.is_entry_fresh(entry, now):
+            return entry, "hit"
+
+        lock_key = f"{cache_key}:lock"
+        token = acquire_lock(lock_key, self.cache_lock_timeout)
+        if token is not None:
+            try:
+                return self._rebuild_entry(cache_key, build), "miss"
+            finally:
+                release_lock(lock_key, token)
+
+        if entry is not None:
+            return entry, "hit" if now < entry.get("expires", 0) else "stale"
+
+        entry = self._wait_for_entry(cache_key)
+        if entry is not None:
+            return entry, "hit"
+        return self._rebuild_entry(cache_key, build), "miss"
+
+    def record_cache_hit(self, kind, member):
+        if self.cache_vary_on_user or WARM_HEADER in self.request.META:
+            return
+        record_hit(self.get_cache_prefix(), kind, member)
+
+    def cached_response(self, request, entry, status="hit"):
+        """
+        Serve a cache entry as raw bytes, or 304 if the client already has it.
+        """
+        response = get_conditional_response(request, etag=entry["etag"])
+        if response is None:
+            response = HttpResponse(entry["content"], content_type="application/json")
+
+        response["ETag"] = entry["etag"]
+        response["X-Cache"] = status.upper()
+        if self.cache_vary_on_user:
+            patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def cached_action_response(self, request, build):
+        """
+        Serve a read-only custom action through the same cache as list().
+
+        ``build`` returns the response data; the key covers the action, its
+        URL kwargs and the query string.
+        """
+        entry, status = self.get_cached_entry(
+            self.generate_cache_key(request), lambda: (build(), True)
+        )
+        return self.cached_response(request, entry, status)
 
     def list(self, request, *args, **kwargs):
         """
         Override list() to apply caching automatically.
         """
-        cache_key = self.generate_cache_key(request)
-        cached = cache.get(cache_key)
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+
+        def build():
+            return super(CachedQuerysetMixin, self).list(request, *args, **kwargs).data, True
 
-        if cached is not None:
-            return Response(cached)
+        entry, status = self.get_cached_entry(self.generate_cache_key(request), build)
+        self.record_cache_hit("list", request.query_params.dict())
+        return self.cached_response(request, entry, status)
 
 
-        response = super().list(request, *args, **kwargs)
+class CachedDetailMixin(CachedQuerysetMixin):
+    """
+    Adds read-through caching of retrieve() to CachedQuerysetMixin.
+
+    Entries live under ``<cache_prefix>:detail:<lookup value>`` and are
+    evicted by the model's ``cache_detail_fields`` (see utils.cache), so a
+    write only drops the objects it touched. ``GET <list>/bulk/?<lookup>=a,b``
+    fetches many objects with a single cache round trip. Only use this on
+    viewsets whose objects look the same to every user.
+    """
+
+    bulk_max_size = 100
+
+    def get_detail_cache_key(self, value):
+        return detail_key(self.get_cache_prefix(), value)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().retrieve(request, *args, **kwargs)
 
-        cache.set(cache_key, response.data, self.cache_timeout)
+        value = kwargs[self.lookup_url_kwarg or self.lookup_field]
+
+        def build():
+            instance = self.get_object()
+            # Only cache under the canonical value ("5", not "05"), which is
+            # the one eviction knows about.
+            canonical = str(getattr(instance, self.lookup_field)) == value
+            return self.get_serializer(instance).data, canonical
+
+        entry, status = self.get_cached_entry(self.get_detail_cache_key(value), build)
+        self.record_cache_hit("detail", value)
+        return self.cached_response(request, entry, status)
+
+    @action(detail=False, methods=["get"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Return many objects by lookup value, in the order they were requested.
+        """
+        raw = request.query_params.get(self.lookup_field, "")
+        values = [value for value in raw.split(",") if value][: self.bulk_max_size]
+        # Key by the canonical value ("5", not "05"), which is the one fresh
+        # entries are stored and evicted under.
+        field = self.get_queryset().model._meta.get_field(self.lookup_field)
+        try:
+            values = [field.to_python(value) for value in values]
+        except DjangoValidationError:
+            raise ValidationError({self.lookup_field: "Invalid lookup value."})
+        keys = {self.get_detail_cache_key(value): value for value in values}
 
+        now = time.time()
+        entries = {
+            key: entry
+            for key, entry in cache.get_many(list(keys)).items()
+            if now < entry.get("expires", 0)
+        }
+
+        missing = [value for key, value in keys.items() if key not in entries]
+        if missing:
+            try:
+                instances = list(
+                    self.get_queryset().filter(**{f"{self.lookup_field}__in": missing})
+                )
+            except (TypeError, ValueError):
+                raise ValidationError({self.lookup_field: "Invalid lookup value."})
+
+            fresh = {
+                self.get_detail_cache_key(getattr(instance, self.lookup_field)):
+                    self.render_cache_entry(self.get_serializer(instance).data)
+                for instance in instances
+            }
+            cache.set_many(fresh, self.cache_timeout + self.cache_stale_grace)
+            entries.update(fresh)
+
+        content = b"[" + b",".join(
+            entries[key]["content"] for key in keys if key in entries
+        ) + b"]"
+        return HttpResponse(content, content_type="application/json")
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for read requests: ``?fields=id,name`` keeps only the
+    listed serializer fields and ``?omit=description`` drops some.
+
+    The queryset is narrowed with ``only()`` to the columns behind the
+    remaining fields, plus the primary key, the lookup field,
+    ``select_related`` relations, the ordering columns and
+    ``sparse_required_fields``. Unknown names
+    are ignored. Cache keys use the normalized field set; sparse detail
+    entries follow the prefix generation, since eviction only knows the
+    full ones.
+    """
+
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+    sparse_required_fields = ()
+
+    def _param_set(self, name):
+        raw = self.request.query_params.get(name, "")
+        return {field.strip() for field in raw.split(",") if field.strip()}
+
+    def get_sparse_fieldset(self):
+        """
+        Return ``(fields, omit)`` as sorted tuples, or None for the full
+        representation.
+        """
+        request = getattr(self, "request", None)
+        if request is None or request.method not in ("GET", "HEAD"):
+            return None
+
+        fields = self._param_set(self.fields_query_param)
+        omit = self._param_set(self.omit_query_param)
+        if not fields and not omit:
+            return None
+        return tuple(sorted(fields)), tuple(sorted(omit))
+
+    def prune_fields(self, fields):
+        sparse = self.get_sparse_fieldset()
+        if sparse is None:
+            return fields
+
+        wanted, omit = sparse
+        for name in list(fields):
+            if (wanted and name not in wanted) or name in omit:
+                fields.pop(name)
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        self.prune_fields(getattr(serializer, "child", serializer).fields)
+        return serializer
+
+    def sparse_columns(self, queryset):
+        model = queryset.model
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        names = {model._meta.pk.name, getattr(self, "lookup_field", "pk")}
+        names.update(self.sparse_required_fields)
+
+        for field in self.prune_fields(serializer.fields).values():
+            if field.source != "*":
+                names.add(field.source.split(".")[0])
+        for term in queryset.query.order_by:
+            if isinstance(term, str):
+                names.add(term.lstrip("-").split("__")[0])
+        if isinstance(queryset.query.select_related, dict):
+            names.update(queryset.query.select_related)
+
+        columns = []
+        for name in names:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.append(field.name)
+        return columns
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_sparse_fieldset() is None or queryset.query.select_related is True:
+            return queryset
+        return queryset.only(*self.sparse_columns(queryset))
+
+    def get_cache_params(self, request):
+        params = super().get_cache_params(request)
+        for name in (self.fields_query_param, self.omit_query_param):
+            if name in params:
+                params[name] = ",".join(sorted(self._param_set(name)))
+        return params
+
+    def get_detail_cache_key(self, value):
+        key = super().get_detail_cache_key(value)
+        sparse = self.get_sparse_fieldset()
+        if sparse is None:
+            return key
+
+        digest = hashlib.md5(json.dumps(sparse).encode()).hexdigest()
+        prefix = self.get_cache_prefix()
+        return f"{key}:{get_generation(prefix)}:{digest}"
+
+
+class _Echo:
+    # csv.writer wants a file; hand back each line instead of storing it.
+    def write(self, value):
+        return value
+
+
+class StreamingExportMixin:
+    """
+    Admin-only ``GET <list>/export/`` streaming every row that matches the
+    viewset's filters, as NDJSON or CSV (``?export_format=csv``).
+
+    Rows come from a server-side cursor in chunks of ``export_chunk_size``
+    (children are prefetched per chunk) and are written as they are read,
+    so memory stays flat however big the table is and output starts right
+    away. ``export_fields`` are the columns, ``__`` following relations;
+    ``export_children`` is ``(name, accessor, fields)`` for nested rows,
+    which CSV flattens to one line per child. Nothing is counted, paginated
+    or cached, and rows are not scoped to the requesting user.
+    """
+
+    export_format_query_param = "export_format"
+    export_chunk_size = 2000
+    export_flush_rows = 200
+    export_fields = ()
+    export_children = None
+
+    def get_export_queryset(self):
+        queryset = self.queryset.all()
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        if self.export_children:
+            accessor = self.export_children[1]
+            if accessor not in queryset._prefetch_related_lookups:
+                queryset = queryset.prefetch_related(accessor)
+        return queryset
+
+    def export_row(self, instance, fields):
+        row = {}
+        for path in fields:
+            value = instance
+            for part in path.split("__"):
+                value = getattr(value, part, None)
+            row[path] = value
+        return row
+
+    def export_records(self, queryset):
+        for instance in queryset.iterator(chunk_size=self.export_chunk_size):
+            row = self.export_row(instance, self.export_fields)
+            if self.export_children:
+                name, accessor, fields = self.export_children
+                row[name] = [
+                    self.export_row(child, fields)
+                    for child in getattr(instance, accessor).all()
+                ]
+            yield row
+
+    def ndjson_lines(self, records):
+        for row in records:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    def csv_lines(self, records):
+        writer = csv.writer(_Echo())
+        columns = list(self.export_fields)
+        child_fields = []
+        if self.export_children:
+            name, _, child_fields = self.export_children
+            columns += [f"{name}.{field}" for field in child_fields]
+        yield writer.writerow(columns)
+
+        for row in records:
+            parent = [row[field] for field in self.export_fields]
+            children = row.pop(self.export_children[0]) if self.export_children else []
+            if not children:
+                yield writer.writerow(parent + [None] * len(child_fields))
+            for child in children:
+                yield writer.writerow(parent + [child[field] for field in child_fields])
+
+    def _buffered(self, lines):
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= self.export_flush_rows:
+                yield "".join(buffer)
+                buffer = []
+        if buffer:
+            yield "".join(buffer)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated, IsAdmin])
+    def export(self, request):
+        fmt = request.query_params.get(self.export_format_query_param, "ndjson").lower()
+        if fmt == "csv":
+            lines, content_type = self.csv_lines, "text/csv"
+        elif fmt == "ndjson":
+            lines, content_type = self.ndjson_lines, "application/x-ndjson"
+        else:
+            raise ValidationError({self.export_format_query_param: "Use ndjson or csv."})
+
+        records = self.export_records(self.get_export_queryset())
+        response = StreamingHttpResponse(
+            self._buffered(lines(records)), content_type=content_type
+        )
+        name = self.basename or self.queryset.model._meta.model_name
+        response["Content-Disposition"] = f'attachment; filename="{name}-export.{fmt}"'
+        # Let nginx pass chunks through instead of buffering the whole file.
+        response["X-Accel-Buffering"] = "no"
         return response
-    
+
+
 class AuthenticatedQuerysetMixin:
     """
     Mixin to safely filter querysets by the authenticated user
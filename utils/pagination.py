@@ -1,6 +1,407 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+import binascii
+import hashlib
+import json
 
 class DefaultPagination(PageNumberPagination):
     page_size = 12
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator that avoids ``COUNT(*)`` over large tables.
+
+    Unfiltered querysets on PostgreSQL use the planner's ``reltuples``
+    estimate. Filtered ones are counted up to ``cap`` rows and the result
+    is cached for ``cache_timeout`` seconds. ``count_exact`` tells callers
+    whether ``count`` is the real number of rows.
+    """
+
+    def __init__(self, object_list, per_page, exact=False, cap=1000, cache_timeout=60, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.exact = exact
+        self.cap = cap
+        self.cache_timeout = cache_timeout
+        self._count_exact = True
+
+    @cached_property
+    def count(self):
+        if self.exact:
+            return super().count
+
+        estimate = self._estimate()
+        if estimate is not None and estimate > self.cap:
+            self._count_exact = False
+            return estimate
+
+        key = self._count_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            count, self._count_exact = cached
+            return count
+
+        # COUNT over a LIMITed subquery stops scanning after cap + 1 rows.
+        count = self.object_list[: self.cap + 1].count()
+        if count > self.cap:
+            self._count_exact = False
+            count = self.cap
+        cache.set(key, (count, self._count_exact), self.cache_timeout)
+        return count
+
+    @property
+    def count_exact(self):
+        self.count
+        return self._count_exact
+
+    def _estimate(self):
+        query = self.object_list.query
+        if query.where or query.distinct or query.combinator:
+            return None
+
+        connection = connections[self.object_list.db]
+        if connection.vendor != "postgresql":
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(self.object_list.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        # -1 (or 0) until the table has been vacuumed or analyzed.
+        return row[0] if row and row[0] > 0 else None
+
+    def _count_cache_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        raw = f"{self.object_list.db}:{sql}:{params}"
+        # v2 entries are (count, exact) pairs.
+        return f"pagination:count:v2:{hashlib.md5(raw.encode()).hexdigest()}"
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+
+        # The count is only a guess, so ask for one row past the page to
+        # know whether another page exists.
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+
+        page = ApproximatePage(rows[: self.per_page], number, self)
+        page.more = len(rows) > self.per_page
+        if not page.more:
+            # Reached the end: now the count is known.
+            self.count = bottom + len(page.object_list)
+            self._count_exact = True
+        return page
+
+
+class ApproximatePage(Page):
+    more = False
+
+    def has_next(self):
+        return self.more
+
+
+class ApproximateCountPagination(DefaultPagination):
+    """
+    Page-number pagination whose ``count`` may be an estimate; the response
+    says so in ``count_exact``. ``?exact_count=true`` forces a real count.
+    """
+
+    exact_count_query_param = "exact_count"
+    count_cap = 1000
+    count_cache_timeout = 60
+
+    def django_paginator_class(self, queryset, page_size):
+        exact = self.request.query_params.get(self.exact_count_query_param, "")
+        return ApproximateCountPaginator(
+            queryset,
+            page_size,
+            exact=exact.lower() in ("1", "true", "yes"),
+            cap=self.count_cap,
+            cache_timeout=self.count_cache_timeout,
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_exact"] = self.page.paginator.count_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_exact"] = {"type": "boolean", "example": True}
+        return response_schema
+
+
+def _encode_value(value):
+    # Full precision on purpose: DjangoJSONEncoder drops microseconds past
+    # milliseconds, which would make the cursor skip or repeat rows.
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on the view's ordering, with the primary key as a
+    tie-breaker. Pages are fetched with keyset filters instead of OFFSET,
+    and nothing is counted.
+
+    The ordering comes from the view's OrderingFilter (so ``?ordering=``
+    keeps working), ``view.ordering`` or the paginator's own ``ordering``. NULLs always sort last. The cursor
+    is an opaque token holding the boundary row's values, so it stays part
+    of the query string and of the list cache key.
+    """
+
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = {
+            field for field, _ in self.ordering if self._is_nullable(queryset.model, field)
+        }
+        position, self.reverse = self.decode_cursor(request)
+        self.has_cursor = position is not None
+
+        queryset = queryset.order_by(*[
+            self._order_by(field, descending != self.reverse)
+            for field, descending in self.ordering
+        ])
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+
+        try:
+            results = list(queryset[: self.page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            # A cursor value that does not fit its column.
+            raise NotFound(self.invalid_cursor_message)
+        self.has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                pass
+            else:
+                if size > 0:
+                    return min(size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return ``[(field, descending), ...]`` ending with the primary key.
+        """
+        ordering = getattr(view, "ordering", None) or self.ordering
+        for backend in getattr(view, "filter_backends", ()):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view) or ordering
+                break
+
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        pk = queryset.model._meta.pk.name
+        fields = []
+        for term in ordering or ():
+            descending = term.startswith("-")
+            field = term.lstrip("-")
+            if field == "pk":
+                field = pk
+            if field != "?" and field not in dict(fields):
+                fields.append((field, descending))
+
+        if pk not in dict(fields):
+            fields.append((pk, fields[-1][1] if fields else True))
+        return fields
+
+    def _order_by(self, field, descending):
+        # Only spell out NULL placement where it matters, so orderings on
+        # NOT NULL columns can still walk a plain index in either direction.
+        nulls = {}
+        if field in self.nullable:
+            nulls = {"nulls_first": True} if self.reverse else {"nulls_last": True}
+        return F(field).desc(**nulls) if descending else F(field).asc(**nulls)
+
+    def _is_nullable(self, model, field):
+        try:
+            return model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            # Related lookups and annotations; assume the worst.
+            return True
+
+    def keyset_filter(self, position):
+        """
+        Rows strictly beyond ``position`` in the direction being read:
+        ``a beyond x OR (a = x AND b beyond y) OR ...``, ANDed with a
+        redundant ``a >= x`` (or ``<=``) on the leading column. The database
+        cannot bound an index range with the OR expansion alone, so without
+        it deep pages would still scan.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, position):
+            beyond = self._beyond(field, descending != self.reverse, value)
+            if beyond is not None:
+                condition |= equal & beyond
+            equal &= Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+
+        leading = self._leading_bound(*self.ordering[0], position[0])
+        return condition if leading is None else leading & condition
+
+    def _leading_bound(self, field, descending, value):
+        descending = descending != self.reverse
+        if value is None:
+            # Past a NULL reading forwards there are only NULLs; reading
+            # back, every other row is ahead.
+            return None if self.reverse else Q(**{f"{field}__isnull": True})
+
+        bound = Q(**{f"{field}__{'lte' if descending else 'gte'}": value})
+        if not self.reverse and field in self.nullable:
+            bound |= Q(**{f"{field}__isnull": True})
+        return bound
+
+    def _beyond(self, field, descending, value):
+        # NULLs come last when reading forwards and first when reading back.
+        nulls_ahead = not self.reverse and field in self.nullable
+        if value is None:
+            if not self.reverse:
+                return None
+            return Q(**{f"{field}__isnull": False})
+
+        lookup = "lt" if descending else "gt"
+        beyond = Q(**{f"{field}__{lookup}": value})
+        if nulls_ahead:
+            beyond |= Q(**{f"{field}__isnull": True})
+        return beyond
+
+    def _position(self, instance):
+        values = []
+        for field, _ in self.ordering:
+            value = instance
+            for part in field.split("__"):
+                value = getattr(value, part, None)
+            values.append(value)
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            cursor = json.loads(urlsafe_b64decode(padded.encode("ascii")))
+            position, reverse = cursor["p"], bool(cursor.get("r"))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {"p": self._position(instance)}
+        if reverse:
+            cursor["r"] = 1
+        raw = json.dumps(cursor, default=_encode_value, separators=(",", ":"))
+        encoded = urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        if self.reverse or self.has_more:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if self.reverse and self.has_more:
+            return self.encode_cursor(self.page[0], reverse=True)
+        if not self.reverse and self.has_cursor:
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(DefaultPagination):
+    """
+    Page-number pagination, with ``count`` and ``?page=``, unless the client
+    opts into KeysetPagination by sending ``?cursor=`` (empty for the first
+    page). Keyset links carry the cursor, so the client stays on it.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
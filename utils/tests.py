@@ -0,0 +1,168 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from unittest import mock, skipUnless
+from utils.cache import acquire_lock, release_lock
+from utils.cache_backends import LocalLRU, LocalTier, TwoTierRedisCache
+import fakeredis
+import importlib.util
+import json
+import pickle
+import time
+import uuid
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRU(max_entries=2, timeout=30)
+        lru.set("a", b"1")
+        lru.set("b", b"2")
+        lru.get("a")
+        lru.set("c", b"3")
+
+        self.assertEqual(lru.get("a"), b"1")
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(len(lru), 2)
+
+    def test_entries_expire(self):
+        lru = LocalLRU(max_entries=2, timeout=0)
+        lru.set("a", b"1")
+        self.assertIsNone(lru.get("a"))
+
+
+class LocalTierTests(SimpleTestCase):
+    def setUp(self):
+        self.tier = LocalTier("cache-invalidation", max_entries=10, timeout=30)
+        self.tier.node = "self"
+
+    def test_remote_invalidation_drops_keys(self):
+        self.tier.store("k", {"v": 1}, self.tier.epoch)
+        self.tier.handle(json.dumps({"origin": "other", "keys": ["k"]}))
+        self.assertIsNone(self.tier.lru.get("k"))
+
+    def test_own_messages_are_ignored(self):
+        self.tier.store("k", {"v": 1}, self.tier.epoch)
+        self.tier.handle(self.tier.message(["k"]))
+        self.assertEqual(pickle.loads(self.tier.lru.get("k")), {"v": 1})
+
+    def test_value_read_before_invalidation_is_not_stored(self):
+        epoch = self.tier.epoch
+        self.tier.handle(json.dumps({"origin": "other", "keys": ["k"]}))
+        self.tier.store("k", {"v": 1}, epoch)
+        self.assertIsNone(self.tier.lru.get("k"))
+
+
+class CacheLockTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def assertReleasesOnlyItsOwnLock(self):
+        token = acquire_lock("rebuild:lock", 10)
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lock("rebuild:lock", 10))
+
+        # The lock timed out and another worker took it.
+        cache.delete("rebuild:lock")
+        other = acquire_lock("rebuild:lock", 10)
+        release_lock("rebuild:lock", token)
+        self.assertEqual(cache.get("rebuild:lock"), other)
+
+        release_lock("rebuild:lock", other)
+        self.assertIsNone(cache.get("rebuild:lock"))
+
+    def test_release_only_deletes_its_own_lock(self):
+        self.assertReleasesOnlyItsOwnLock()
+
+    # fakeredis needs lupa to run Lua scripts.
+    @skipUnless(importlib.util.find_spec("lupa"), "lupa is not installed")
+    def test_redis_release_only_deletes_its_own_lock(self):
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": f"redis://{uuid.uuid4().hex}:6379/0",
+                "OPTIONS": {"connection_class": fakeredis.FakeConnection},
+            }
+        }
+        with override_settings(CACHES=caches):
+            self.assertReleasesOnlyItsOwnLock()
+
+
+class TwoTierRedisCacheTests(SimpleTestCase):
+    def setUp(self):
+        # Every cache built here talks to the same in-memory Redis server.
+        self.location = f"redis://{uuid.uuid4().hex}:6379/0"
+        self.channel = f"invalidation-{uuid.uuid4().hex}"
+
+    def make_cache(self):
+        # Each cache gets its own local tier, like a separate process would.
+        with mock.patch.dict("utils.cache_backends._tiers", clear=True):
+            backend = TwoTierRedisCache(self.location, {
+                "OPTIONS": {
+                    "connection_class": fakeredis.FakeConnection,
+                    "LOCAL_PREFIXES": ["products:"],
+                    "INVALIDATION_CHANNEL": self.channel,
+                },
+            })
+        backend._tier_ready()
+        self.assertTrue(backend._tier.ready.wait(5))
+        return backend
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "invalidation never arrived")
+            time.sleep(0.01)
+
+    def test_get_set_incr_delete(self):
+        backend = self.make_cache()
+        backend.set("products:detail:1", {"name": "Laptop"})
+        backend.set("other", 1)
+
+        self.assertEqual(backend.get("products:detail:1"), {"name": "Laptop"})
+        self.assertIsNotNone(backend._tier.lru.get(backend.make_key("products:detail:1")))
+        self.assertEqual(backend.get_many(["products:detail:1", "other", "missing"]), {
+            "products:detail:1": {"name": "Laptop"},
+            "other": 1,
+        })
+        self.assertIsNone(backend._tier.lru.get(backend.make_key("other")))
+
+        backend.set("products:generation", 1)
+        backend.get("products:generation")
+        self.assertEqual(backend.incr("products:generation"), 2)
+        self.assertEqual(backend.get("products:generation"), 2)
+
+        self.assertTrue(backend.delete("products:detail:1"))
+        self.assertIsNone(backend.get("products:detail:1"))
+
+    def test_writes_evict_local_copies_in_other_processes(self):
+        first, second = self.make_cache(), self.make_cache()
+        key = "products:detail:1"
+        made = first.make_key(key)
+        first.set(key, "old")
+        self.assertEqual(second.get(key), "old")
+        self.assertIsNotNone(second._tier.lru.get(made))
+
+        first.set(key, "new")
+        self.wait_for(lambda: second._tier.lru.get(made) is None)
+        self.assertEqual(second.get(key), "new")
+
+        second.get(key)
+        first.delete(key)
+        self.wait_for(lambda: second._tier.lru.get(made) is None)
+        self.assertIsNone(second.get(key))
+
+    def test_locks_are_not_broadcast(self):
+        backend = self.make_cache()
+        pubsub = backend._cache.get_client().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        self.assertTrue(backend.add("products:detail:1:lock", 1))
+        self.assertEqual(backend.get("products:detail:1:lock"), 1)
+        self.assertIsNone(backend._tier.lru.get(backend.make_key("products:detail:1:lock")))
+        backend.delete("products:detail:1:lock")
+        backend.set("products:detail:1", "value")
+
+        message = None
+        deadline = time.monotonic() + 5
+        while message is None and time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=0.1)
+        self.assertEqual(json.loads(message["data"])["keys"], [backend.make_key("products:detail:1")])